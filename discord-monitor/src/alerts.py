@@ -1,5 +1,9 @@
 from __future__ import annotations
-from .models import IncubatorStatus
+import time
+from collections import deque
+from .models import StatusRecord
+from .history import epoch
+from .metrics import Histogram
 from typing import List, Optional
 
 class Thresholds:
@@ -9,7 +13,7 @@ class Thresholds:
         self.co2_max = co2_max
         self.o2_min = o2_min
 
-    def check(self, s: IncubatorStatus) -> List[str]:
+    def check(self, s: StatusRecord) -> List[str]:
         msgs: List[str] = []
         if self.t_min is not None and s.temp_c < self.t_min:
             msgs.append(f"Temp LOW: {s.temp_c:.2f}°C < {self.t_min:.2f}°C")
@@ -19,4 +23,243 @@ class Thresholds:
             msgs.append(f"CO₂ HIGH: {s.co2_pct:.2f}% > {self.co2_max:.2f}%")
         if self.o2_min is not None and s.o2_pct is not None and s.o2_pct < self.o2_min:
             msgs.append(f"O₂ LOW: {s.o2_pct:.2f}% < {self.o2_min:.2f}%")
-        return msgs
\ No newline at end of file
+        return msgs
+
+
+# ---------- Rule engine ----------
+SIGNALS = {"temp_c": ("Temp", "°C"), "co2_pct": ("CO₂", "%"), "o2_pct": ("O₂", "%")}
+
+class Rule:
+    """One alert condition, from ALERT_RULES (JSON list) or the global thresholds.
+
+    {"signal": "temp_c", "above": 39, "clear": 38.8, "for_s": 30}
+    {"signal": "o2_pct", "below": 1.0}
+    {"signal": "co2_pct", "rate_above": 0.05, "window_s": 60}     # %/s over the window
+    {"stale_s": 120}                                              # no sample for 2 min
+    Any rule may add "device": "<name>" to apply to one incubator only, and
+    "name" to change how it is shown. State, cooldown and snapshot are kept
+    under `key`: the name when one is given, else the kind, signal, limit
+    and device, so two rules on the same signal never share state.
+    """
+    def __init__(self, signal: str | None = None, above: float | None = None, below: float | None = None,
+                 clear: float | None = None, rate_above: float | None = None, rate_below: float | None = None,
+                 window_s: float = 60.0, for_s: float = 0.0, stale_s: float | None = None,
+                 device: str | None = None, name: str | None = None, key: str | None = None):
+        kinds = [k for k, v in (("above", above), ("below", below), ("rate_above", rate_above),
+                                ("rate_below", rate_below), ("stale", stale_s)) if v is not None]
+        if len(kinds) != 1:
+            raise ValueError(f"alert rule needs exactly one of above/below/rate_above/rate_below/stale_s, got {kinds}")
+        self.kind = kinds[0]
+        if self.kind != "stale" and signal not in SIGNALS:
+            raise ValueError(f"alert rule signal must be one of {', '.join(SIGNALS)}")
+        self.signal = signal
+        self.limit = {"above": above, "below": below, "rate_above": rate_above,
+                      "rate_below": rate_below, "stale": stale_s}[self.kind]
+        self.limit = float(self.limit)
+        # hysteresis: a firing rule resolves only once past `clear` (default: the limit)
+        self.clear = float(clear) if clear is not None else self.limit
+        self.window_s = float(window_s)
+        self.for_s = float(for_s)
+        self.device = device
+        self.name = name or self._default_name()
+        self.key = key or name or self._condition_key()
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "Rule":
+        return cls(**d)
+
+    def _default_name(self) -> str:
+        if self.kind == "stale":
+            return "No data"
+        label = SIGNALS[self.signal][0]
+        return {"above": f"{label} HIGH", "below": f"{label} LOW",
+                "rate_above": f"{label} RISING", "rate_below": f"{label} FALLING"}[self.kind]
+
+    def _condition_key(self) -> str:
+        where = f"@{self.device}" if self.device is not None else ""
+        return f"{self.kind}:{self.signal or ''}:{self.limit:g}{where}"
+
+    def breached(self, v: float) -> bool:
+        if self.kind in ("above", "rate_above"):
+            return v > self.limit
+        return v < self.limit
+
+    def cleared(self, v: float) -> bool:
+        if self.kind in ("above", "rate_above"):
+            return v <= self.clear
+        return v >= self.clear
+
+    def describe(self, v: float, firing: bool) -> str:
+        if self.kind == "stale":
+            return (f"{self.name}: nothing for {v:.0f}s" if firing else f"{self.name} resolved: data is back")
+        unit = SIGNALS[self.signal][1]
+        if self.kind.startswith("rate"):
+            shown, limit, unit = v * 60, self.limit * 60, unit + "/min"
+        else:
+            shown, limit = v, self.limit
+        if not firing:
+            return f"{self.name} resolved: {shown:.2f}{unit}"
+        op = ">" if self.kind in ("above", "rate_above") else "<"
+        held = f" for {self.for_s:.0f}s" if self.for_s else ""
+        return f"{self.name}: {shown:.2f}{unit} {op} {limit:.2f}{unit}{held}"
+
+class RuleState:
+    """Running state of one rule on one device; O(1) work per sample."""
+    __slots__ = ("active", "since", "notified", "window")
+
+    def __init__(self):
+        self.active = False
+        self.since: float | None = None   # first sample of the current breach
+        self.notified = False             # the firing was posted (so post the resolve)
+        self.window: deque | None = None  # (t, v) pairs for rate rules
+
+class AlertTransition:
+    __slots__ = ("rule", "device", "firing", "value", "state")
+
+    def __init__(self, rule: Rule, device: str, firing: bool, value: float, state: RuleState):
+        self.rule = rule; self.device = device; self.firing = firing
+        self.value = value; self.state = state
+
+    @property
+    def text(self) -> str:
+        return self.rule.describe(self.value, self.firing)
+
+class RuleEngine:
+    """Evaluates rules incrementally, returning explicit firing/resolved transitions.
+
+    Rules from the global Thresholds (also changed by /set_thresholds) are
+    rebuilt whenever those values change, with `for_s` and per-signal
+    `hysteresis` applied. Stale-data rules are time-driven: wait until
+    next_deadline() and call check_stale().
+    """
+    def __init__(self, rules: list[Rule], thresholds: Thresholds | None = None,
+                 for_s: float = 0.0, hysteresis: dict[str, float] | None = None):
+        self.custom = list(rules)
+        keys = [r.key for r in self.custom]
+        dupes = sorted({k for k in keys if keys.count(k) > 1})
+        if dupes:
+            raise ValueError(f"duplicate alert rules {dupes}; give them distinct names")
+        self.thresholds = thresholds
+        self.for_s = for_s
+        self.hysteresis = hysteresis or {}
+        self._thr_sig = None
+        self.rules: list[Rule] = []
+        self.states: dict[tuple[str, str], RuleState] = {}   # (device, rule key) -> state
+        self.last_seen: dict[str, float] = {}                 # device -> arrival (time.time())
+        self.counts = {"samples": 0, "fired": 0, "resolved": 0}
+        self.hists = {"eval": Histogram()}
+        self._rebuild()
+
+    def _threshold_rules(self) -> list[Rule]:
+        th, h = self.thresholds, self.hysteresis
+        if th is None:
+            return []
+        out = []
+        for signal, kind, limit in (("temp_c", "below", th.t_min), ("temp_c", "above", th.t_max),
+                                    ("co2_pct", "above", th.co2_max), ("o2_pct", "below", th.o2_min)):
+            if limit is None:
+                continue
+            margin = float(h.get(signal, 0.0))
+            clear = limit - margin if kind == "above" else limit + margin
+            # keyed by what it watches, not its limit: /set_thresholds keeps a firing alert
+            out.append(Rule(signal=signal, clear=clear, for_s=self.for_s,
+                            key=f"threshold:{kind}:{signal}", **{kind: limit}))
+        return out
+
+    def _rebuild(self):
+        th = self.thresholds
+        self._thr_sig = None if th is None else (th.t_min, th.t_max, th.co2_max, th.o2_min)
+        self.rules = self._threshold_rules() + self.custom
+        keys = {r.key for r in self.rules}
+        self.states = {k: s for k, s in self.states.items() if k[1] in keys}
+
+    def _state(self, device: str, rule: Rule) -> RuleState:
+        st = self.states.get((device, rule.key))
+        if st is None:
+            st = self.states[(device, rule.key)] = RuleState()
+        return st
+
+    def observe(self, s: StatusRecord) -> list[AlertTransition]:
+        t0 = time.perf_counter()
+        out = self._observe(s)
+        self.hists["eval"].observe(time.perf_counter() - t0)
+        self.counts["samples"] += 1
+        self._count(out)
+        return out
+
+    def _count(self, transitions: list[AlertTransition]):
+        for tr in transitions:
+            self.counts["fired" if tr.firing else "resolved"] += 1
+
+    def _observe(self, s: StatusRecord) -> list[AlertTransition]:
+        th = self.thresholds
+        if th is not None and (th.t_min, th.t_max, th.co2_max, th.o2_min) != self._thr_sig:
+            self._rebuild()
+        device, t = s.device, epoch(s.timestamp)
+        self.last_seen[device] = time.time()
+        out: list[AlertTransition] = []
+        for rule in self.rules:
+            if rule.device is not None and rule.device != device:
+                continue
+            st = self._state(device, rule)
+            if rule.kind == "stale":
+                if st.active:
+                    st.active, st.since = False, None
+                    out.append(AlertTransition(rule, device, False, 0.0, st))
+                continue
+            v = getattr(s, rule.signal)
+            if v is None:
+                continue
+            if rule.kind.startswith("rate"):
+                win = st.window
+                if win is None:
+                    win = st.window = deque()
+                win.append((t, v))
+                while len(win) > 2 and t - win[1][0] >= rule.window_s:
+                    win.popleft()   # keep the oldest sample still spanning the window
+                t0, v0 = win[0]
+                if t - t0 < rule.window_s / 2:
+                    continue        # not enough span for a rate yet
+                v = (v - v0) / (t - t0)
+            if rule.breached(v):
+                if st.since is None:
+                    st.since = t
+                if not st.active and t - st.since >= rule.for_s:
+                    st.active = True
+                    out.append(AlertTransition(rule, device, True, v, st))
+            else:
+                st.since = None
+                if st.active and rule.cleared(v):
+                    st.active = False
+                    out.append(AlertTransition(rule, device, False, v, st))
+        return out
+
+    def _stale_rules(self, device: str):
+        return [r for r in self.rules if r.kind == "stale" and (r.device is None or r.device == device)]
+
+    def next_deadline(self) -> float | None:
+        """Earliest time.time() at which a stale rule could fire."""
+        best = None
+        for device, seen in self.last_seen.items():
+            for rule in self._stale_rules(device):
+                if self._state(device, rule).active:
+                    continue
+                due = seen + rule.limit
+                best = due if best is None or due < best else best
+        return best
+
+    def check_stale(self, now: float | None = None) -> list[AlertTransition]:
+        now = time.time() if now is None else now
+        out = []
+        for device, seen in self.last_seen.items():
+            for rule in self._stale_rules(device):
+                st = self._state(device, rule)
+                if not st.active and now - seen >= rule.limit:
+                    st.active = True
+                    out.append(AlertTransition(rule, device, True, now - seen, st))
+        self._count(out)
+        return out
+
+    def active(self, device: str | None = None) -> list[tuple[str, str]]:
+        """(device, rule key) of every firing rule."""
+        return [k for k, st in self.states.items() if st.active and (device is None or k[0] == device)]
@@ -0,0 +1,147 @@
+from __future__ import annotations
+import asyncio, logging, time
+from collections import deque
+
+import discord
+from .metrics import Histogram
+
+log = logging.getLogger(__name__)
+
+class ChannelOutbox:
+    """Pending deliveries for one channel: alerts in order, status latest-wins."""
+    __slots__ = ("channel_id", "alerts", "status", "status_at", "live", "wake", "task", "last_sent")
+
+    def __init__(self, channel_id: int):
+        self.channel_id = channel_id
+        self.alerts: deque[tuple[str, float]] = deque()
+        self.status: dict | None = None     # newest status message not yet delivered
+        self.status_at = 0.0                # when it was submitted (for latency)
+        self.live: discord.Message | None = None   # the status message edited in place
+        self.wake = asyncio.Event()
+        self.task: asyncio.Task | None = None
+        self.last_sent = float("-inf")
+
+    @property
+    def depth(self) -> int:
+        return len(self.alerts) + (self.status is not None)
+
+class Delivery:
+    """Fans messages out to watched channels concurrently.
+
+    One worker per channel sends that channel's messages in order, so each
+    channel's route bucket sees one request at a time while channels proceed
+    in parallel (discord.py waits out 429s per bucket); `max_concurrency`
+    caps requests in flight overall. Status updates are coalesced (only the
+    newest pending one is sent) and edit a single live message per channel,
+    at most once per `min_interval`; alerts are always new messages.
+    """
+    def __init__(self, client: discord.Client, max_concurrency: int = 8, min_interval: float = 2.0):
+        self.client = client
+        self.min_interval = min_interval
+        self._sem = asyncio.Semaphore(max_concurrency)
+        self.outboxes: dict[int, ChannelOutbox] = {}
+        self.hists = {"delivery": Histogram(),   # submit -> delivered, including queueing
+                      "request": Histogram()}    # one Discord API call
+        self.counts = {"sent": 0, "edited": 0, "coalesced": 0, "failed": 0}
+
+    # ---------- producers ----------
+    def _outbox(self, channel_id: int) -> ChannelOutbox:
+        box = self.outboxes.get(channel_id)
+        if box is None:
+            box = self.outboxes[channel_id] = ChannelOutbox(channel_id)
+        if box.task is None or box.task.done():
+            box.task = asyncio.create_task(self._worker(box), name=f"deliver-{channel_id}")
+        return box
+
+    def submit_status(self, channel_id: int, msg: dict):
+        box = self._outbox(channel_id)
+        if box.status is not None:
+            self.counts["coalesced"] += 1
+        else:
+            box.status_at = time.monotonic()
+        box.status = msg
+        box.wake.set()
+
+    def submit_alert(self, channel_id: int, text: str):
+        box = self._outbox(channel_id)
+        box.alerts.append((text, time.monotonic()))
+        box.wake.set()
+
+    def forget(self, channel_id: int):
+        box = self.outboxes.pop(channel_id, None)
+        if box is not None and box.task is not None:
+            box.task.cancel()
+
+    # ---------- metrics ----------
+    @property
+    def queue_depth(self) -> int:
+        return sum(box.depth for box in self.outboxes.values())
+
+    def latency_ms(self) -> dict[str, float | None]:
+        s = self.hists["delivery"].summary()
+        return {"p50": s["p50"], "p95": s["p95"], "max": s["max"]}
+
+    # ---------- worker ----------
+    async def _worker(self, box: ChannelOutbox):
+        loop = asyncio.get_running_loop()
+        while True:
+            await box.wake.wait()
+            box.wake.clear()
+            ch = self.client.get_channel(box.channel_id)
+            if ch is None:
+                self.counts["failed"] += box.depth
+                box.alerts.clear(); box.status = None
+                log.warning("Channel %s not available; dropped pending messages", box.channel_id)
+                continue
+            while box.alerts:
+                text, queued = box.alerts.popleft()
+                if await self._call(box, ch.send(text)):
+                    self.counts["sent"] += 1
+                    self.hists["delivery"].observe(time.monotonic() - queued)
+            if box.status is None:
+                continue
+            # rate-limit edits per channel; anything newer arriving meanwhile replaces it
+            wait = box.last_sent + self.min_interval - loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+                if box.alerts:
+                    box.wake.set()   # alerts that arrived while waiting go first
+                    continue
+            msg, queued = box.status, box.status_at
+            box.status = None
+            box.last_sent = loop.time()
+            await self._deliver_status(ch, box, msg, queued)
+
+    async def _deliver_status(self, ch, box: ChannelOutbox, msg: dict, queued: float):
+        if box.live is not None:
+            try:
+                async with self._sem:
+                    t0 = time.monotonic()
+                    await box.live.edit(content=msg["content"], embed=msg["embed"])
+                    self.hists["request"].observe(time.monotonic() - t0)
+                self.counts["edited"] += 1
+                self.hists["delivery"].observe(time.monotonic() - queued)
+                return
+            except discord.NotFound:
+                box.live = None   # deleted by someone: post a new one
+            except Exception:
+                self.counts["failed"] += 1
+                log.warning("Failed to edit status in channel %s", box.channel_id)
+                return
+        sent = await self._call(box, ch.send(content=msg["content"], embed=msg["embed"]))
+        if sent is not None:
+            box.live = sent
+            self.counts["sent"] += 1
+            self.hists["delivery"].observe(time.monotonic() - queued)
+
+    async def _call(self, box: ChannelOutbox, coro):
+        try:
+            async with self._sem:
+                t0 = time.monotonic()
+                result = await coro
+                self.hists["request"].observe(time.monotonic() - t0)
+                return result
+        except Exception:
+            self.counts["failed"] += 1
+            log.warning("Failed to post to channel %s", box.channel_id)
+            return None
@@ -1,11 +1,7 @@
-## src/discord_bot.py
-
-```python
 from __future__ import annotations
-import asyncio, logging, os
+import asyncio, hashlib, json, logging, math, os, time
 import discord
 from discord import app_commands
-from discord.ext import tasks
 
 try:
     import psutil  # optional; used for system line
@@ -14,17 +10,42 @@ except Exception:  # pragma: no cover
 
 from .state_cache import StateCache
 from .alerts import Thresholds
-from .models import IncubatorStatus
+from .models import IncubatorStatus, StatusRecord
+from .history import epoch, RETENTION_SEC
+from .delivery import Delivery
+from .metrics import Metrics
 
 log = logging.getLogger(__name__)
 
-
-
-
+SUMMARY_MAX_DEVICES = 40   # lines in the all-devices summary before "…and N more"
+HISTORY_POINTS = 48        # sparkline width for /history
+SPARKS = "▁▂▃▄▅▆▇█"
+WINDOW_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+def sparkline(values: list[float | None]) -> str:
+    """One block character per value, scaled to their range; gaps are blank."""
+    xs = [v for v in values if v is not None]
+    if not xs:
+        return " " * len(values)
+    lo, hi = min(xs), max(xs)
+    top = len(SPARKS) - 1
+    if hi - lo <= 1e-4 * max(1.0, abs(hi)):   # flat (float32 noise)
+        return "".join(" " if v is None else SPARKS[top // 2] for v in values)
+    return "".join(" " if v is None else SPARKS[round((v - lo) / (hi - lo) * top)] for v in values)
+
+def parse_window(text: str) -> float | None:
+    """"90m", "6h", "1.5d" -> seconds; None unless a finite number."""
+    text = text.strip().lower()
+    try:
+        seconds = float(text[:-1]) * WINDOW_UNITS[text[-1]] if text[-1:] in WINDOW_UNITS else float(text) * 3600
+    except ValueError:
+        return None
+    return seconds if math.isfinite(seconds) else None
 
 
 class IncubatorDiscord(discord.Client):
-    def __init__(self, *, cache: StateCache, thresholds: Thresholds, guild_id: int | None, allow_control: bool, units: str):
+    def __init__(self, *, cache: StateCache, thresholds: Thresholds, guild_id: int | None, allow_control: bool, units: str,
+                 metrics: Metrics | None = None):
         intents = discord.Intents.none()  # read-only
         super().__init__(intents=intents)
         self.tree = app_commands.CommandTree(self)
@@ -37,19 +58,101 @@ class IncubatorDiscord(discord.Client):
         # Presentation flags (read from env so we don't need to touch config.py)
         self.use_embeds = os.getenv("USE_EMBEDS", "true").lower() in {"1","true","yes","y","on"}
         self.show_system = os.getenv("SHOW_SYSTEM_LINE", "true").lower() in {"1","true","yes","y","on"}
+        # Heartbeat shows this device only; by default one device in full, several as a summary
+        self.heartbeat_device = os.getenv("HEARTBEAT_DEVICE") or None
+        # Heartbeat posts on change, at most every MIN and at least every MAX seconds
+        self.heartbeat_min = float(os.getenv("HEARTBEAT_MIN_SEC", "10"))
+        self.heartbeat_max = float(os.getenv("HEARTBEAT_MAX_SEC", "600"))
+        self._heartbeat_task: asyncio.Task | None = None
+        # Concurrent per-channel delivery; the status message is edited in place
+        self.delivery = Delivery(self, min_interval=float(os.getenv("STATUS_EDIT_MIN_SEC", "2")))
+        # System line is sampled on its own clock, not per render
+        self.system_every = float(os.getenv("SYSTEM_LINE_SEC", "30"))
+        self._sys_line: str | None = None
+        self._sys_at = float("-inf")
+        # Rendered messages per target (device name, None = summary): (key, message)
+        self._rendered: dict[str | None, tuple[tuple, dict]] = {}
+        self.render_counts = {"hits": 0, "misses": 0}
+        # Commands are methods here, so bind them to this client and put them on the tree.
+        # Command._copy_with is private discord.py API (2.x; checked on 2.7): it is
+        # what Cog uses to bind its commands, and there is no public equivalent for
+        # commands defined on a Client. Re-check it when upgrading discord.py.
+        for cmd in type(self).__dict__.values():
+            if isinstance(cmd, app_commands.Command):
+                self.tree.add_command(cmd._copy_with(parent=None, binding=self))
+        # Slash commands are only synced when their definitions change (see setup_hook)
+        self.command_hash_path = os.getenv("COMMAND_HASH_PATH", "command_tree.json")
+        self.force_sync = os.getenv("FORCE_COMMAND_SYNC", "false").lower() in {"1","true","yes","y","on"}
+        self._t0 = time.monotonic()
+        self.startup_ms: dict[str, float] = {}
+        self.metrics = metrics
+        if metrics is not None:
+            metrics.register("discord", self.delivery.counts, self.delivery.hists)
+            metrics.register("render", self.render_counts)
+            metrics.gauge("discord_queue_depth", lambda: self.delivery.queue_depth)
 
     async def setup_hook(self):
+        self._phase("login")
+        guild = None
         if self.guild_id:
             guild = discord.Object(id=self.guild_id)
             self.tree.copy_global_to(guild=guild)
+        await self._sync_commands(guild)
+        self._phase("command_sync")
+
+    def _phase(self, name: str):
+        """Milliseconds from construction to the end of each startup phase."""
+        ms = self.startup_ms[name] = round(1000 * (time.monotonic() - self._t0), 1)
+        if self.metrics is not None:
+            self.metrics.gauge(f"startup_{name}_ms", lambda: ms)
+
+    def _command_hash(self, guild) -> str:
+        cmds = sorted((c.to_dict(self.tree) for c in self.tree.get_commands(guild=guild)), key=lambda d: d["name"])
+        blob = json.dumps({"app": self.application_id, "commands": cmds}, sort_keys=True, default=str)
+        return hashlib.sha256(blob.encode()).hexdigest()
+
+    async def _sync_commands(self, guild):
+        """tree.sync() is a slow, tightly rate-limited call; skip it when the
+        definitions hash to what was last synced for this scope."""
+        scope = f"guild:{guild.id}" if guild else "global"
+        digest = self._command_hash(guild)
+        try:
+            with open(self.command_hash_path) as f:
+                synced = json.load(f)
+        except (OSError, ValueError):
+            synced = {}
+        if synced.get(scope) == digest and not self.force_sync:
+            log.info("Slash commands unchanged (%s); not syncing", scope)
+            return
+        try:
             await self.tree.sync(guild=guild)
-        else:
-            await self.tree.sync()
+        except discord.HTTPException as e:
+            # keep serving with whatever Discord already has; retried next start
+            log.warning("Slash command sync failed (%s); continuing", e)
+            return
+        log.info("Slash commands synced (%s)", scope)
+        synced[scope] = digest
+        tmp = self.command_hash_path + ".tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump(synced, f)
+            os.replace(tmp, self.command_hash_path)
+        except OSError as e:
+            # read-only working dir (ProtectSystem, container layer): sync again next start
+            log.warning("Could not save %s (%s); set COMMAND_HASH_PATH to a writable file",
+                        self.command_hash_path, e)
 
     # ---------- Helpers ----------
     def _system_line(self) -> str | None:
         if not self.show_system:
             return None
+        now = time.monotonic()
+        if now - self._sys_at >= self.system_every:
+            self._sys_at = now
+            self._sys_line = self._sample_system()
+        return self._sys_line
+
+    def _sample_system(self) -> str:
         try:
             if psutil is None:
                 return "System: psutil not installed"
@@ -68,22 +171,79 @@ class IncubatorDiscord(discord.Client):
             lines.append(sysln)
         return lines
 
-    def _status_title_and_color(self, s: IncubatorStatus) -> tuple[str, int]:
+    def _status_title_and_color(self, s: StatusRecord) -> tuple[str, int]:
         # Color code embeds based on threshold checks
+        title = "Incubator Status" if len(self.cache.devices) <= 1 else f"Incubator Status — {s.device}"
         issues = self.thresholds.check(s)
         if issues:
-            return ("Incubator Status — ALERT", 0xD83A3A)  # red
-        return ("Incubator Status", 0x1F8B4C)  # greenish
+            return (f"{title} — ALERT", 0xD83A3A)  # red
+        return (title, 0x1F8B4C)  # greenish
+
+    def _summary_line(self, s: StatusRecord, alerting: bool) -> str:
+        t = s.temp_c if self.units == "C" else (s.temp_c * 9/5 + 32)
+        parts = [f"{t:.2f}°{self.units}"]
+        if s.co2_pct is not None:
+            parts.append(f"CO₂ {s.co2_pct:.2f}%")
+        if s.o2_pct is not None:
+            parts.append(f"O₂ {s.o2_pct:.2f}%")
+        icon = "⚠️" if alerting else "✅"
+        # Discord renders the age client-side, so the text stays valid while cached
+        return f"{icon} **{s.device}** " + " · ".join(parts) + f" · <t:{int(epoch(s.timestamp))}:R>"
+
+    def build_summary(self):
+        """One compact line per device, alerting devices first."""
+        flagged = [(bool(self.thresholds.check(d.latest)), d.latest)
+                   for d in self.cache.devices.values() if d.latest is not None]
+        flagged.sort(key=lambda f: (not f[0], f[1].device))
+        lines = [self._summary_line(s, a) for a, s in flagged[:SUMMARY_MAX_DEVICES]]
+        if len(flagged) > SUMMARY_MAX_DEVICES:
+            lines.append(f"…and {len(flagged) - SUMMARY_MAX_DEVICES} more")
+        alerting = sum(1 for a, _ in flagged if a)
+        title = f"Incubators — {len(flagged)} devices" + (f", {alerting} ALERT" if alerting else "")
+        sysln = self._system_line()
+        if sysln:
+            lines.append(sysln)
+        if self.use_embeds:
+            emb = discord.Embed(title=title, description="\n".join(lines),
+                                color=0xD83A3A if alerting else 0x1F8B4C)
+            return {"content": None, "embed": emb}
+        return {"content": f"**{title}**\n" + "\n".join(lines), "embed": None}
+
+    def message_for(self, device: str | None = None):
+        """Full status for one device, or the summary when several report and none is named."""
+        if device is None and len(self.cache.devices) > 1:
+            return self._memo(None, self.cache.version, self.build_summary)
+        dev = self.cache.device(device)
+        if dev is None or dev.latest is None:
+            return None
+        return self._memo(dev.name, dev.version, lambda: self.build_message(dev.latest))
+
+    def _memo(self, target: str | None, version: int, render):
+        """Render once per (sample, display settings); every channel and every
+        /status for the same sample reuses the message."""
+        th = self.thresholds
+        key = (version, len(self.cache.devices) > 1, th.t_min, th.t_max, th.co2_max, th.o2_min,
+               self._system_line(), self.units, self.use_embeds)
+        hit = self._rendered.get(target)
+        if hit is not None and hit[0] == key:
+            self.render_counts["hits"] += 1
+            return hit[1]
+        self.render_counts["misses"] += 1
+        msg = render()
+        self._rendered[target] = (key, msg)
+        return msg
 
 
     # ---------- Slash commands ----------
     @app_commands.command(name="status", description="Show latest incubator status")
-    async def status_cmd(self, interaction: discord.Interaction):
-        st = self.cache.latest
-        if not st:
-            await interaction.response.send_message("No status yet.")
+    @app_commands.describe(device="Incubator to show (default: all, as a summary)")
+    async def status_cmd(self, interaction: discord.Interaction, device: str | None = None):
+        msg = self.message_for(device)
+        if msg is None:
+            known = ", ".join(sorted(self.cache.devices)) or "none yet"
+            await interaction.response.send_message(
+                "No status yet." if device is None else f"Unknown device {device!r} (known: {known}).")
             return
-        msg = self.build_message(st)
         await interaction.response.send_message(content=msg["content"], embed=msg["embed"])  # type: ignore[arg-type]
 
     @app_commands.command(name="watch", description="Post status updates into this channel (start/stop)")
@@ -94,8 +254,12 @@ class IncubatorDiscord(discord.Client):
         if action == "start":
             self._watch_channels.add(ch_id)
             await interaction.response.send_message("Watching this channel for updates.")
+            msg = self.message_for(self.heartbeat_device)
+            if msg is not None:
+                self.delivery.submit_status(ch_id, msg)   # create the live status message now
         elif action == "stop":
             self._watch_channels.discard(ch_id)
+            self.delivery.forget(ch_id)
             await interaction.response.send_message("Stopped watching this channel.")
         else:
             await interaction.response.send_message("Use 'start' or 'stop'.")
@@ -108,8 +272,67 @@ class IncubatorDiscord(discord.Client):
         self.thresholds.o2_min = o2_min_pct
         await interaction.response.send_message("Thresholds updated.")
 
+    @app_commands.command(name="history", description="Temperature, CO₂ and O₂ over a time window")
+    @app_commands.describe(window="e.g. 30m, 6h, 24h, 7d (default 24h)", device="Incubator (default: the only one)")
+    async def history_cmd(self, interaction: discord.Interaction, window: str = "24h", device: str | None = None):
+        seconds = parse_window(window)
+        if seconds is None or seconds <= 0:
+            await interaction.response.send_message("Window must look like 30m, 6h, 24h or 7d.")
+            return
+        if seconds > RETENTION_SEC:
+            await interaction.response.send_message(f"History goes back at most {RETENTION_SEC / 86400:g}d.")
+            return
+        dev = self.cache.device(device)
+        if dev is None or not len(dev.history):
+            known = ", ".join(sorted(self.cache.devices)) or "none yet"
+            await interaction.response.send_message(
+                f"No history for {device!r} (known: {known})." if device else f"Pick a device (known: {known}).")
+            return
+        await interaction.response.send_message(self.history_text(dev, seconds, window))
+
+    def history_text(self, dev, seconds: float, label: str, now: float | None = None) -> str:
+        """Sparkline per signal from the history rollups (no raw-sample scan for long windows)."""
+        ring = dev.history
+        t1 = ring.time_at(len(ring) - 1) + 1e-3 if now is None else now
+        t0 = t1 - seconds
+        step = seconds / HISTORY_POINTS
+        step_txt = f"{step / 3600:g}h" if step >= 3600 else f"{step / 60:g}m" if step >= 60 else f"{step:.0f}s"
+        lines = [f"{dev.name} · last {label} · 1 char = {step_txt}"]
+        f = (lambda v: v) if self.units == "C" else (lambda v: v * 9/5 + 32)
+        for name, title, unit, conv in (("temp_c", "Temp", f"°{self.units}", f),
+                                        ("co2_pct", "CO₂ ", "%", None), ("o2_pct", "O₂  ", "%", None)):
+            pts = ring.series(name, t0, t1, HISTORY_POINTS)
+            if not any(pts):
+                continue
+            conv = conv or (lambda v: v)
+            means = [conv(p[3]) if p else None for p in pts]
+            lo = conv(min(p[1] for p in pts if p)); hi = conv(max(p[2] for p in pts if p))
+            last = next(m for m in reversed(means) if m is not None)
+            lines.append(f"{title} {sparkline(means)} {lo:.2f}–{hi:.2f}{unit} · now {last:.2f}")
+        return "```\n" + "\n".join(lines) + "\n```"
+
+    @app_commands.command(name="perf", description="Pipeline counters and latencies")
+    async def perf_cmd(self, interaction: discord.Interaction):
+        if self.metrics is None:
+            await interaction.response.send_message("Metrics are not enabled.")
+            return
+        await interaction.response.send_message(self._perf_text())
+
+    def _perf_text(self) -> str:
+        snap = self.metrics.snapshot()
+        lines = [f"uptime {snap.pop('uptime_s'):.0f}s · "
+                 + " · ".join(f"{k} {v}" for k, v in snap.pop("gauges").items())]
+        for stage, d in snap.items():
+            lines.append(f"{stage}: " + ", ".join(f"{k} {v}" for k, v in d["counts"].items()))
+            for k, h in d["latency_ms"].items():
+                if h["count"]:
+                    lines.append(f"  {k:<11} p50 {h['p50']:g} · p95 {h['p95']:g} · max {h['max']:g} ms  (n={h['count']})")
+        return "```\n" + "\n".join(lines)[:1900] + "\n```"
+
     @app_commands.command(name="control", description="(Optional) send control intent via MQTT (admin only)")
-    async def control_cmd(self, interaction: discord.Interaction, command: str, value: str | None = None):
+    @app_commands.describe(device="Incubator to control (needed when several report)")
+    async def control_cmd(self, interaction: discord.Interaction, command: str, value: str | None = None,
+                          device: str | None = None):
         if not self.allow_control:
             await interaction.response.send_message("Control is disabled.")
             return
@@ -117,44 +340,61 @@ class IncubatorDiscord(discord.Client):
         if 'IncubatorAdmin' not in roles:
             await interaction.response.send_message("Insufficient role.")
             return
+        # the incubator needs a chamber name as soon as it runs more than one
+        dev = self.cache.device(device)
+        chamber = dev.name if dev is not None else device
+        if chamber is None and len(self.cache.devices) > 1:
+            known = ", ".join(sorted(self.cache.devices))
+            await interaction.response.send_message(f"Pick a device (known: {known}).")
+            return
         await interaction.response.defer(thinking=True)
         put = self.__class__.publish_queue.put_nowait  # type: ignore[attr-defined]
-        put((command, value))
-        await interaction.followup.send(f"Queued control: {command} {value or ''}")
+        put((command, value, chamber))
+        await interaction.followup.send(f"Queued control: {command} {value or ''}" + (f" → {chamber}" if chamber else ""))
 
     # ---------- Background loops ----------
-    @tasks.loop(seconds=10)
     async def heartbeat(self):
-        st = self.cache.latest
-        if not st:
+        """Post when a new sample arrives (rate-limited to heartbeat_min), or
+        after heartbeat_max without one; sleeps in between, no polling."""
+        changes = self.cache.subscribe(coalesce=True)
+        loop = asyncio.get_running_loop()
+        last_post = float("-inf")
+        try:
+            while True:
+                timeout = max(0.0, last_post + self.heartbeat_max - loop.time())
+                try:
+                    await asyncio.wait_for(changes.get(), timeout=timeout)
+                    # a burst of samples becomes one post with the latest values
+                    await asyncio.sleep(max(0.0, last_post + self.heartbeat_min - loop.time()))
+                    while not changes.queue.empty():
+                        changes.queue.get_nowait()
+                except asyncio.TimeoutError:
+                    pass
+                last_post = loop.time()
+                await self.post_status()
+        finally:
+            self.cache.unsubscribe(changes)
+
+    async def post_status(self):
+        msg = self.message_for(self.heartbeat_device)
+        if msg is None:
             return
-        msg = self.build_message(st)
         for ch_id in list(self._watch_channels):
-            ch = self.get_channel(ch_id)
-            if ch is None:
-                continue
-            try:
-                await ch.send(content=msg["content"], embed=msg["embed"])  # type: ignore[arg-type]
-            except Exception:
-                log.warning("Failed to post to channel %s", ch_id)
-
-    @heartbeat.before_loop
-    async def before_heartbeat(self):
-        await self.wait_until_ready()
+            self.delivery.submit_status(ch_id, msg)
 
-    async def broadcast_alert(self, text: str):
+    async def broadcast_alert(self, text: str, resolved: bool = False):
         # Alerts are simple text so they stand out even with embeds
+        icon = "✅" if resolved else "⚠️"
         for ch_id in list(self._watch_channels):
-            ch = self.get_channel(ch_id)
-            if ch:
-                try:
-                    await ch.send(f"⚠️ {text}")
-                except Exception:
-                    log.warning("Failed to alert channel %s", ch_id)
+            self.delivery.submit_alert(ch_id, f"{icon} {text}")
 
     async def on_ready(self):
+        if "ready" not in self.startup_ms:
+            self._phase("ready")
+            log.info("Startup (ms since start): %s", ", ".join(f"{k} {v:g}" for k, v in self.startup_ms.items()))
         log.info("Discord bot ready as %s", self.user)
-        self.heartbeat.start()
+        if self._heartbeat_task is None or self._heartbeat_task.done():   # on_ready repeats on reconnect
+            self._heartbeat_task = asyncio.create_task(self.heartbeat(), name="heartbeat")
 
 
 
@@ -169,7 +409,8 @@ class IncubatorDiscord(discord.Client):
 
 
 
-    def build_message(self, s: IncubatorStatus):
+    def build_message(self, st: StatusRecord):
+        s = st.to_model()   # pydantic model only for rendering (memoized per sample)
         lines = self._status_lines(s)
         timestamp = s.timestamp.isoformat(timespec='seconds') + 'Z'
 
@@ -183,8 +424,9 @@ class IncubatorDiscord(discord.Client):
             emb.set_footer(text=timestamp)
             return {"content": None, "embed": emb}
         else:
+            name = "" if len(self.cache.devices) <= 1 else f" — {s.device}"
             formatted = (
-                "**Incubator Status**\n"
+                f"**Incubator Status{name}**\n"
                 + "\n".join(lines)
                 + f"\n`{timestamp}`"
             )
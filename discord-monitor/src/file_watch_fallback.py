@@ -1,64 +1,122 @@
 from __future__ import annotations
-import asyncio, json, logging
-from datetime import datetime
-from .models import IncubatorStatus
+import asyncio, logging, os, time
+from .payload import PayloadExtractor
 from .state_cache import StateCache
-from .mqtt_bus import resolve, to_percent
+from .metrics import Histogram
+
+try:
+    from inotify_simple import INotify, flags  # optional; falls back to stat polling
+except Exception:  # pragma: no cover
+    INotify = None
 
 log = logging.getLogger(__name__)
 
+RESCAN_SEC = 60.0   # inotify mode: stat anyway this often, in case an event was missed
+SETTLE_SEC = 0.05   # stat mode: a changed file must look the same this long later
+
 class FileWatch:
-    def __init__(self, path: str, poll_sec: float, cache: StateCache, field_map: dict, scales: dict):
+    """Follows the status file and feeds the cache only when it changed.
+
+    With inotify the directory is watched for the file being closed after a
+    write or renamed into place (an atomic replace), so updates land within
+    milliseconds and an idle file costs nothing. Without it, (mtime, size,
+    inode) is polled every `poll_sec` and the file is parsed only when that
+    signature changes and has settled.
+    """
+    def __init__(self, path: str, poll_sec: float, cache: StateCache, extractor: PayloadExtractor):
         self.path = path
         self.poll = poll_sec
         self.cache = cache
-        self.field_map = field_map
-        self.scales = scales
+        self.extractor = extractor
+        self._sig: tuple | None = None   # signature of the last file parsed
+        self._last_ts = None
+        self._missing = False
+        self.counts = {"events": 0, "parsed": 0, "skipped": 0, "errors": 0}
+        self.hists = {"parse": Histogram()}   # read + decode + extract
 
     async def run(self):
         log.info(f"Watching status file: {self.path}")
-        last = None
-        while True:
+        self._ingest()
+        if INotify is not None:
             try:
-                with open(self.path, 'r') as f:
-                    payload = json.load(f)
-                ts = payload.get("timestamp")
-                if ts != last:
-                    last = ts
-                    temp_key = self.field_map.get("temp_c")
-                    co2_key = self.field_map.get("co2_pct")
-                    o2_key  = self.field_map.get("o2_pct")
-                    states_key = self.field_map.get("states")
+                await self._run_inotify()
+                return
+            except OSError as e:
+                log.warning("inotify unavailable (%s); polling every %.1fs", e, self.poll)
+        await self._run_stat()
 
-                    temp_v = resolve(payload, temp_key)
-                    if temp_v is None:
-                        raise ValueError("Missing temp value; map temp_c in SENSOR_FIELD_MAP")
-                    temp_c = float(temp_v) * float(self.scales.get("temp_c", 1.0))
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            if not self._missing:
+                log.warning("Status file not found yet…")
+                self._missing = True
+            return None
+        self._missing = False
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
 
-                    co2_raw = resolve(payload, co2_key)
-                    o2_raw  = resolve(payload, o2_key)
-                    co2_pct = to_percent(co2_raw) if co2_raw is not None else None
-                    o2_pct  = to_percent(o2_raw) if o2_raw is not None else None
-                    if co2_pct is not None:
-                        co2_pct *= float(self.scales.get("co2_pct", 1.0))
-                    if o2_pct is not None:
-                        o2_pct *= float(self.scales.get("o2_pct", 1.0))
+    def _ingest(self):
+        sig = self._stat()
+        if sig is None:
+            return
+        if sig == self._sig:
+            self.counts["skipped"] += 1
+            return
+        t0 = time.perf_counter()
+        try:
+            with open(self.path, 'rb') as f:
+                payload = self.extractor.decode(f.read())
+            self._sig = sig
+            ts = payload.get("timestamp")
+            if ts == self._last_ts:
+                self.counts["skipped"] += 1   # rewritten with the same sample
+                return
+            self._last_ts = ts
+            st = self.extractor.extract(payload)
+            self.hists["parse"].observe(time.perf_counter() - t0)
+            self.cache.update(st)
+            self.counts["parsed"] += 1
+        except FileNotFoundError:
+            pass   # replaced between stat and open; the rename will trigger again
+        except Exception as e:
+            # signature not recorded, so the next change (or rescan) retries
+            self.counts["errors"] += 1
+            log.warning(f"Status file parse error: {e}")
 
-                    states = resolve(payload, states_key) or {}
-                    if not isinstance(states, dict):
-                        states = {}
+    async def _run_inotify(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        name = os.path.basename(self.path)
+        ino = INotify()
+        ino.add_watch(directory, flags.CLOSE_WRITE | flags.MOVED_TO)
+        loop = asyncio.get_running_loop()
+        ready = asyncio.Event()
+        loop.add_reader(ino.fileno(), ready.set)
+        log.info("Status file watch: inotify on %s", directory)
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(ready.wait(), timeout=RESCAN_SEC)
+                except asyncio.TimeoutError:
+                    self._ingest()
+                    continue
+                ready.clear()
+                if any(ev.name == name for ev in ino.read(timeout=0)):
+                    self.counts["events"] += 1
+                    self._ingest()
+        finally:
+            loop.remove_reader(ino.fileno())
+            ino.close()
 
-                    st = IncubatorStatus(
-                        timestamp = datetime.fromisoformat(ts) if isinstance(ts,str) else datetime.utcnow(),
-                        temp_c = temp_c,
-                        co2_pct = co2_pct,
-                        o2_pct = o2_pct,
-                        states = {str(k): bool(v) for k,v in states.items()},
-                        extra = {k:v for k,v in payload.items() if k not in {temp_key, co2_key, o2_key, states_key, 'timestamp'}}
-                    )
-                    self.cache.update(st)
-            except FileNotFoundError:
-                log.warning("Status file not found yet…")
-            except Exception as e:
-                log.warning(f"Status file parse error: {e}")
-            await asyncio.sleep(self.poll)
\ No newline at end of file
+    async def _run_stat(self):
+        log.info("Status file watch: stat polling every %.1fs", self.poll)
+        while True:
+            await asyncio.sleep(self.poll)
+            sig = self._stat()
+            if sig is None or sig == self._sig:
+                continue
+            # a writer that does not replace atomically may still be mid-write
+            await asyncio.sleep(SETTLE_SEC)
+            if self._stat() == sig:
+                self.counts["events"] += 1
+                self._ingest()
@@ -0,0 +1,327 @@
+from __future__ import annotations
+import logging, math
+from array import array
+from datetime import datetime, timezone
+
+try:
+    import numpy as np  # optional; vectorised aggregates
+except Exception:  # pragma: no cover
+    np = None
+
+log = logging.getLogger(__name__)
+
+NAN = float("nan")
+COLUMNS = ("temp_c", "co2_pct", "o2_pct")
+MAX_STATES = 32   # distinct state names per device (one bit each)
+ROLLUPS = ((60, 2880), (900, 2976))   # (bucket seconds, buckets kept): 2 days by minute, 31 days by 15 min
+RETENTION_SEC = max(res * n for res, n in ROLLUPS)   # longest window the rollups can chart
+
+def epoch(ts: datetime) -> float:
+    """Status timestamps are naive UTC (datetime.utcnow() / sender isoformat)."""
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.timestamp()
+
+
+class Rollup:
+    """Per-column min/max/sum/count over fixed time buckets, updated on append.
+
+    Charts over long windows read a few thousand buckets instead of every
+    raw sample. Buckets are aligned to multiples of `res` seconds; the
+    oldest are trimmed in chunks once more than `capacity` are kept.
+    """
+    __slots__ = ("res", "capacity", "starts", "mins", "maxs", "sums", "counts")
+
+    def __init__(self, res: float, capacity: int):
+        self.res = res
+        self.capacity = capacity
+        self.clear()
+
+    def clear(self):
+        self.starts = array('d')
+        self.mins = {c: array('f') for c in COLUMNS}
+        self.maxs = {c: array('f') for c in COLUMNS}
+        self.sums = {c: array('d') for c in COLUMNS}
+        self.counts = {c: array('I') for c in COLUMNS}
+
+    def add(self, ts: float, row: tuple[float, ...]):
+        start = ts - ts % self.res
+        starts = self.starts
+        if not starts or start > starts[-1]:
+            starts.append(start)
+            for c in COLUMNS:
+                self.mins[c].append(math.inf); self.maxs[c].append(-math.inf)
+                self.sums[c].append(0.0); self.counts[c].append(0)
+            if len(starts) > 2 * self.capacity:
+                self._trim(len(starts) - self.capacity)
+        for c, v in zip(COLUMNS, row):
+            if v != v:   # NaN
+                continue
+            if v < self.mins[c][-1]:
+                self.mins[c][-1] = v
+            if v > self.maxs[c][-1]:
+                self.maxs[c][-1] = v
+            self.sums[c][-1] += v
+            self.counts[c][-1] += 1
+
+    def _trim(self, n: int):
+        del self.starts[:n]
+        for c in COLUMNS:
+            del self.mins[c][:n]; del self.maxs[c][:n]; del self.sums[c][:n]; del self.counts[c][:n]
+
+    def rebuild(self, ts: array, cols: dict[str, array]):
+        """Recompute from raw columns (after HistoryRing.load)."""
+        self.clear()
+        if np is None:
+            for i, t in enumerate(ts):
+                self.add(t, tuple(cols[c][i] for c in COLUMNS))
+            return
+        t = np.frombuffer(ts, dtype=np.float64)
+        if not len(t):
+            return
+        key = t - t % self.res
+        idx = np.flatnonzero(np.r_[True, key[1:] != key[:-1]])[-self.capacity:]
+        first = idx[0]
+        dtypes = {'d': np.float64, 'f': np.float32, 'I': np.uint32}
+        def arr(code, values):
+            a = array(code)
+            a.frombytes(values.astype(dtypes[code]).tobytes())
+            return a
+        self.starts = arr('d', key[idx])
+        idx = idx - first
+        for c in COLUMNS:
+            v = np.frombuffer(cols[c], dtype=np.float32)[first:]
+            ok = ~np.isnan(v)
+            n = np.add.reduceat(ok.astype(np.uint32), idx)
+            self.mins[c] = arr('f', np.where(n > 0, np.fmin.reduceat(v, idx), np.inf))
+            self.maxs[c] = arr('f', np.where(n > 0, np.fmax.reduceat(v, idx), -np.inf))
+            self.sums[c] = arr('d', np.add.reduceat(np.where(ok, v, 0).astype(np.float64), idx))
+            self.counts[c] = arr('I', n)
+
+    def buckets(self, name: str, t0: float, t1: float):
+        """(start, min, max, sum, count) of non-empty buckets starting in [t0, t1)."""
+        starts = self.starts
+        lo, hi = 0, len(starts)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if starts[mid] < t0:   # not the bucket straddling t0: it holds older samples
+                lo = mid + 1
+            else:
+                hi = mid
+        mins, maxs, sums, counts = self.mins[name], self.maxs[name], self.sums[name], self.counts[name]
+        for i in range(lo, len(starts)):
+            if starts[i] >= t1:
+                break
+            if counts[i]:
+                yield starts[i], mins[i], maxs[i], sums[i], counts[i]
+
+
+class HistoryRing:
+    """Fixed-capacity columnar ring of samples for one device.
+
+    Columns are arrays: float64 epoch seconds, float32 temp/CO₂/O₂ (NaN when
+    missing) and a uint32 bit mask of the on/off states, i.e. 24 bytes per
+    sample, so two days at 1 Hz take about 4 MB. They grow until `capacity`
+    and then wrap. Timestamps are kept non-decreasing, which makes time-range
+    lookups a binary search.
+    """
+    def __init__(self, capacity: int = 172800):
+        self.capacity = capacity
+        self.ts = array('d')
+        self.cols = {c: array('f') for c in COLUMNS}
+        self.states = array('I')
+        self.state_bits: dict[str, int] = {}
+        self.head = 0   # next physical slot
+        self.size = 0
+        self.rollups = [Rollup(res, n) for res, n in ROLLUPS]
+        self._rollups_stale = False   # rebuilt on first use after load()
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.ts) * (8 + 4 * len(COLUMNS) + 4)
+
+    # ---------- write ----------
+    def append(self, ts: float, temp_c: float | None, co2_pct: float | None,
+               o2_pct: float | None, states: dict[str, bool] | None = None):
+        if self.size and ts < self.ts[(self.head - 1) % self.capacity]:
+            ts = self.ts[(self.head - 1) % self.capacity]   # late sample: keep the order
+        row = (NAN if temp_c is None else temp_c,
+               NAN if co2_pct is None else co2_pct,
+               NAN if o2_pct is None else o2_pct)
+        mask = self._pack(states) if states else 0
+        i = self.head
+        if self.size < self.capacity:       # still growing
+            self.ts.append(ts)
+            for c, v in zip(COLUMNS, row):
+                self.cols[c].append(v)
+            self.states.append(mask)
+        else:
+            self.ts[i] = ts
+            for c, v in zip(COLUMNS, row):
+                self.cols[c][i] = v
+            self.states[i] = mask
+        self.head = (i + 1) % self.capacity
+        if self.size < self.capacity:
+            self.size += 1
+        if not self._rollups_stale:
+            for r in self.rollups:
+                r.add(ts, row)
+
+    def append_status(self, st):
+        self.append(epoch(st.timestamp), st.temp_c, st.co2_pct, st.o2_pct, st.states)
+
+    def _pack(self, states: dict[str, bool]) -> int:
+        mask, bits = 0, self.state_bits
+        for name, on in states.items():
+            b = bits.get(name)
+            if b is None:
+                if len(bits) >= MAX_STATES:
+                    continue
+                b = bits[name] = len(bits)
+                if len(bits) == MAX_STATES:
+                    log.warning("More than %d state names; extra states are not kept in history", MAX_STATES)
+            if on:
+                mask |= 1 << b
+        return mask
+
+    # ---------- read ----------
+    def _phys(self, i: int) -> int:
+        """Logical index (0 = oldest) -> physical slot."""
+        return (self.head - self.size + i) % self.capacity
+
+    def time_at(self, i: int) -> float:
+        return self.ts[self._phys(i)]
+
+    def bisect(self, t: float) -> int:
+        """First logical index with timestamp >= t (O(log n))."""
+        lo, hi = 0, self.size
+        ts, phys = self.ts, self._phys
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if ts[phys(mid)] < t:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def span(self, t0: float | None = None, t1: float | None = None) -> tuple[int, int]:
+        """Logical [i0, i1) covering t0 <= ts <= t1."""
+        i0 = 0 if t0 is None else self.bisect(t0)
+        i1 = self.size if t1 is None else self.bisect(math.nextafter(t1, math.inf))
+        return i0, max(i0, i1)
+
+    def _segments(self, i0: int, i1: int):
+        """Physical slices for a logical range (at most two, around the wrap)."""
+        if i0 >= i1:
+            return []
+        p0, p1 = self._phys(i0), self._phys(i1 - 1) + 1
+        if p0 < p1:
+            return [(p0, p1)]
+        return [(p0, self.capacity), (0, p1)]
+
+    def column(self, name: str, t0: float | None = None, t1: float | None = None) -> list[float]:
+        col = self.ts if name == "ts" else self.cols[name]
+        out: list[float] = []
+        for a, b in self._segments(*self.span(t0, t1)):
+            out.extend(col[a:b])
+        return out
+
+    def rows(self, t0: float | None = None, t1: float | None = None):
+        """(ts, temp_c, co2_pct, o2_pct, states dict) per sample in the range."""
+        names = {b: n for n, b in self.state_bits.items()}
+        i0, i1 = self.span(t0, t1)
+        for i in range(i0, i1):
+            p = self._phys(i)
+            mask = self.states[p]
+            yield (self.ts[p], *(self.cols[c][p] for c in COLUMNS),
+                   {n: bool(mask >> b & 1) for b, n in names.items()})
+
+    def export(self) -> tuple[array, dict[str, array], array]:
+        """Copies of the columns in logical order (oldest first)."""
+        segs = self._segments(0, self.size)
+        def lin(col):
+            out = col[:0]
+            for a, b in segs:
+                out.extend(col[a:b])
+            return out
+        return lin(self.ts), {c: lin(self.cols[c]) for c in COLUMNS}, lin(self.states)
+
+    def load(self, ts: array, cols: dict[str, array], states: array, state_bits: dict[str, int]):
+        """Replace the contents with columns from export() (newest kept if over capacity)."""
+        keep = min(len(ts), self.capacity)
+        cut = len(ts) - keep
+        self.ts = ts[cut:]
+        self.cols = {c: cols[c][cut:] for c in COLUMNS}
+        self.states = states[cut:]
+        self.state_bits = dict(state_bits)
+        self.size = keep
+        self.head = keep % self.capacity
+        self._rollups_stale = True
+
+    def aggregate(self, name: str, t0: float | None = None, t1: float | None = None) -> dict[str, float] | None:
+        """min/max/mean/count of a column over [t0, t1], NaNs skipped; None if empty."""
+        segs = self._segments(*self.span(t0, t1))
+        col = self.cols[name]
+        if np is not None:
+            view = np.frombuffer(col, dtype=np.float32)
+            vals = np.concatenate([view[a:b] for a, b in segs]) if segs else view[:0]
+            vals = vals[~np.isnan(vals)]
+            if not len(vals):
+                return None
+            return {"min": float(vals.min()), "max": float(vals.max()),
+                    "mean": float(vals.mean(dtype=np.float64)), "count": int(len(vals))}
+        lo, hi, total, n = math.inf, -math.inf, 0.0, 0
+        for a, b in segs:
+            for v in col[a:b]:
+                if v != v:   # NaN
+                    continue
+                lo = v if v < lo else lo
+                hi = v if v > hi else hi
+                total += v
+                n += 1
+        if not n:
+            return None
+        return {"min": lo, "max": hi, "mean": total / n, "count": n}
+
+    def series(self, name: str, t0: float, t1: float, points: int = 48) -> list[tuple[float, float, float, float] | None]:
+        """`points` equal slices of [t0, t1): (start, min, max, mean), None where empty.
+
+        Served from the coarsest rollup finer than a slice, so the cost
+        depends on `points` and the window, not on the sample rate; windows
+        too short for the finest rollup read raw samples.
+        """
+        if self._rollups_stale:
+            ts, cols, _ = self.export()
+            for r in self.rollups:
+                r.rebuild(ts, cols)
+            self._rollups_stale = False
+        width = (t1 - t0) / points
+        lo = [math.inf] * points; hi = [-math.inf] * points
+        total = [0.0] * points; n = [0] * points
+        roll = None
+        for r in self.rollups:
+            if r.res <= width:
+                roll = r
+        if roll is not None:
+            src = roll.buckets(name, t0, t1)
+        else:
+            i0, i1 = self.span(t0, t1)
+            ts, col = self.ts, self.cols[name]
+            src = ((ts[p], v, v, v, 1) for p in map(self._phys, range(i0, i1)) for v in (col[p],) if v == v)
+        for start, mn, mx, sm, ct in src:
+            i = min(points - 1, max(0, int((start - t0) / width)))
+            lo[i] = mn if mn < lo[i] else lo[i]
+            hi[i] = mx if mx > hi[i] else hi[i]
+            total[i] += sm
+            n[i] += ct
+        return [(t0 + i * width, lo[i], hi[i], total[i] / n[i]) if n[i] else None for i in range(points)]
+
+    def window(self, name: str, seconds: float, now: float | None = None) -> dict[str, float] | None:
+        """Aggregate over the last `seconds` (up to `now`, default: newest sample)."""
+        if not self.size:
+            return None
+        end = self.time_at(self.size - 1) if now is None else now
+        return self.aggregate(name, end - seconds, end)
@@ -0,0 +1,22 @@
+from __future__ import annotations
+import asyncio
+
+# Just enough HTTP/1.1 for the local endpoints (metrics, status API): GET only,
+# one request per connection, no keep-alive.
+
+async def read_request(reader: asyncio.StreamReader, timeout: float = 5.0) -> tuple[str, str]:
+    """(method, path) of the request; headers are read and ignored."""
+    request = await asyncio.wait_for(reader.readline(), timeout=timeout)
+    while (await asyncio.wait_for(reader.readline(), timeout=timeout)) not in (b"\r\n", b"\n", b""):
+        pass
+    parts = request.decode("latin-1").split()
+    return (parts[0] if parts else "", parts[1] if len(parts) > 1 else "/")
+
+def head(status: str, ctype: str, length: int | None = None, extra: str = "") -> bytes:
+    size = f"Content-Length: {length}\r\n" if length is not None else ""
+    return (f"HTTP/1.1 {status}\r\nContent-Type: {ctype}\r\n{size}{extra}"
+            "Access-Control-Allow-Origin: *\r\nConnection: close\r\n\r\n").encode()
+
+async def respond(writer: asyncio.StreamWriter, status: str, ctype: str, body: bytes):
+    writer.write(head(status, ctype, len(body)) + body)
+    await writer.drain()
@@ -0,0 +1,78 @@
+from __future__ import annotations
+import asyncio, logging, time
+from collections import deque
+from .payload import PayloadExtractor
+from .state_cache import StateCache
+from .history import epoch
+from .metrics import Histogram
+
+log = logging.getLogger(__name__)
+
+class IngestQueue:
+    """Bounded hand-off between receiving messages and applying them.
+
+    The receive side only appends the raw payload (never blocks, never
+    parses). The processing side parses in batches of `batch`, hands each
+    batch to StateCache.update_batch (every sample to history and alerts,
+    only the newest per device to the display) and yields to the event loop
+    between batches, so a burst cannot starve the Discord tasks. When more
+    than `maxsize` messages are waiting the oldest is dropped and counted.
+    """
+    def __init__(self, cache: StateCache, extractor: PayloadExtractor, maxsize: int = 5000, batch: int = 256):
+        self.cache = cache
+        self.extractor = extractor
+        self.maxsize = maxsize
+        self.batch = batch
+        self._q: deque[tuple[bytes, str | None, float]] = deque()
+        self._ready = asyncio.Event()
+        self.hists = {"queue_wait": Histogram(),   # received -> parsed
+                      "parse": Histogram(),
+                      "sample_age": Histogram()}   # sample timestamp -> applied (publish lag + wait)
+        self.counts = {"received": 0, "processed": 0, "coalesced": 0, "dropped": 0, "errors": 0, "restarts": 0}
+
+    # ---------- receive stage ----------
+    def submit(self, raw: bytes, device: str | None = None):
+        if len(self._q) >= self.maxsize:
+            self._q.popleft()
+            self.counts["dropped"] += 1
+            if self.counts["dropped"] % 1000 == 1:
+                log.warning("Ingest queue full (%d); dropped %d message(s) so far", self.maxsize, self.counts["dropped"])
+        self._q.append((raw, device, time.monotonic()))
+        self.counts["received"] += 1
+        self._ready.set()
+
+    # ---------- metrics ----------
+    @property
+    def depth(self) -> int:
+        return len(self._q)
+
+    def lag_ms(self) -> dict[str, float | None]:
+        s = self.hists["queue_wait"].summary()
+        return {"p50": s["p50"], "p95": s["p95"], "max": s["max"]}
+
+    # ---------- processing stage ----------
+    async def run(self):
+        q, parse = self._q, self.extractor.parse
+        wait, parse_t, age = self.hists["queue_wait"].observe, self.hists["parse"].observe, self.hists["sample_age"].observe
+        clock = time.perf_counter
+        while True:
+            await self._ready.wait()
+            self._ready.clear()
+            while q:
+                records = []
+                for _ in range(min(self.batch, len(q))):
+                    raw, device, received = q.popleft()
+                    wait(time.monotonic() - received)
+                    t0 = clock()
+                    try:
+                        records.append(parse(raw, device))
+                    except Exception as e:
+                        self.counts["errors"] += 1
+                        log.warning(f"Bad MQTT payload: {e}")
+                    parse_t(clock() - t0)
+                self.counts["coalesced"] += self.cache.update_batch(records)
+                self.counts["processed"] += len(records)
+                now = time.time()
+                for rec in records:
+                    age(max(0.0, now - epoch(rec.timestamp)))   # clamped: sender clocks may run ahead
+                await asyncio.sleep(0)   # let the other tasks in before the next batch
@@ -0,0 +1,329 @@
+"""Offline end-to-end load test: python -m src.loadtest [options]
+
+Runs the real MQTTBus (receive loop + ingest queue), StateCache, alert_pump,
+RuleEngine, IncubatorDiscord heartbeat and Delivery against an in-process
+broker and fake Discord channels; no network, broker or guild needed.
+Synthetic chambers publish at --rate Hz with optional faults:
+
+  spike    temperature above the limit for --spike-sec (expects an alert)
+  dropout  a chamber goes silent for 2 x --stale-sec (expects a No data alert)
+  garbage  a fraction of payloads are not JSON
+  burst    every --burst-every s one chamber replays --burst-n messages at once
+
+Reports ingest throughput, sample-to-alert latency, Discord posts/min and
+memory growth; exits 1 when --max-alert-ms is exceeded or a spike went
+unreported, so it can gate CI.
+"""
+from __future__ import annotations
+import argparse, asyncio, gc, json, logging, os, random, resource, sys, time
+from collections import deque
+from datetime import datetime
+
+from .state_cache import StateCache
+from .alerts import Thresholds, Rule, RuleEngine
+from .payload import PayloadExtractor
+from .mqtt_bus import MQTTBus
+from .discord_bot import IncubatorDiscord
+from .main import alert_pump
+
+try:
+    import psutil  # optional; resident memory
+except Exception:  # pragma: no cover
+    psutil = None
+
+T_MAX = 38.0
+
+# ---------- in-process MQTT ----------
+def topic_matches(pattern: str, topic: str) -> bool:
+    p, t = pattern.split('/'), topic.split('/')
+    for i, part in enumerate(p):
+        if part == '#':
+            return True
+        if i >= len(t) or (part != '+' and part != t[i]):
+            return False
+    return len(p) == len(t)
+
+class LocalMessage:
+    __slots__ = ("topic", "payload")
+
+    def __init__(self, topic: str, payload: bytes):
+        self.topic = topic
+        self.payload = payload
+
+class LocalBroker:
+    """Delivers publish() to subscribed LocalClients; stands in for asyncio_mqtt.Client."""
+    def __init__(self):
+        self.subs: list[tuple[str, asyncio.Queue]] = []
+        self.published = 0
+
+    def publish(self, topic: str, payload: bytes):
+        self.published += 1
+        for pattern, q in self.subs:
+            if topic_matches(pattern, topic):
+                q.put_nowait(LocalMessage(topic, payload))
+
+    def client(self, host, port, client_id=None, **auth) -> "LocalClient":
+        return LocalClient(self)
+
+class LocalClient:
+    def __init__(self, broker: LocalBroker):
+        self.broker = broker
+        self.queue: asyncio.Queue = asyncio.Queue()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.broker.subs = [s for s in self.broker.subs if s[1] is not self.queue]
+
+    def messages(self):
+        return self
+
+    async def subscribe(self, topic: str):
+        self.broker.subs.append((topic, self.queue))
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.queue.get()
+
+# ---------- fake Discord ----------
+class FakeMessage:
+    def __init__(self, channel: "FakeChannel", content, embed):
+        self.channel = channel
+        self.content, self.embed = content, embed
+
+    async def edit(self, content=None, embed=None):
+        await self.channel._request("edit")
+        self.content, self.embed = content, embed
+        return self
+
+class FakeChannel:
+    """Records what the bot posts; each request takes `latency` seconds."""
+    def __init__(self, channel_id: int, report: "Report", latency: float):
+        self.id = channel_id
+        self.report = report
+        self.latency = latency
+
+    async def _request(self, kind: str):
+        await asyncio.sleep(self.latency)
+        self.report.posts.append((time.monotonic(), kind))
+
+    async def send(self, content=None, embed=None):
+        await self._request("send")
+        if isinstance(content, str) and content.startswith(("⚠️", "✅")):
+            self.report.on_alert(content, self.id)
+        return FakeMessage(self, content, embed)
+
+# ---------- synthetic chambers ----------
+class Chamber:
+    def __init__(self, name: str, rng: random.Random):
+        self.name = name
+        self.rng = rng
+        self.temp = 37.0 + rng.uniform(-0.2, 0.2)
+        self.spike_until = 0.0
+        self.spike_seen = False   # first breaching sample of the current spike published
+        self.silent_until = 0.0
+
+    def payload(self, now: float, garbage: float) -> bytes:
+        rng = self.rng
+        if garbage and rng.random() < garbage:
+            return b"{not json"
+        target = T_MAX + 1.0 if now < self.spike_until else 37.0
+        self.temp += 0.3 * (target - self.temp) + rng.gauss(0, 0.02)
+        return json.dumps({
+            "timestamp": datetime.utcnow().isoformat(),
+            "temp_c": round(self.temp, 3),
+            "co2_pct": round(5.0 + rng.gauss(0, 0.05), 3),
+            "o2_pct": round(5.0 + rng.gauss(0, 0.05), 3),
+            "states": {"heater": self.temp < 37.0, "o2": False, "co2": False},
+        }).encode()
+
+# ---------- report ----------
+class Report:
+    def __init__(self, single: str | None, primary: int = 1):
+        self.single = single            # device name when only one chamber (no alert prefix)
+        self.primary = primary          # alerts are counted and timed on this channel only
+        self.posts: deque = deque()
+        self.fault_start: dict[tuple[str, str], float] = {}   # (device, kind) -> first faulty publish
+        self.hot: set[str] = set()      # devices whose temperature alert has not resolved yet
+        self.alert_latency: list[float] = []
+        self.alerts = {"fired": 0, "resolved": 0, "spikes": 0, "dropouts": 0}
+        self.memory: list[tuple[float, int]] = []
+
+    def on_alert(self, text: str, channel_id: int):
+        if channel_id != self.primary:
+            return   # the same alert posted to another watched channel
+        body = text.split(" ", 1)[1]
+        device = self.single
+        if body.startswith("["):
+            device, body = body[1:].split("] ", 1)
+        if text.startswith("✅"):
+            self.alerts["resolved"] += 1
+            if "data is back" not in body:
+                self.hot.discard(device)
+            return
+        self.alerts["fired"] += 1
+        kind = "stale" if body.startswith("No data") else "spike"
+        if kind == "spike":
+            self.hot.add(device)
+        started = self.fault_start.pop((device, kind), None)
+        if started is not None:
+            self.alert_latency.append(time.monotonic() - started)
+
+def rss_bytes() -> int:
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024   # peak, Linux reports KiB
+
+def percentiles(xs: list[float]) -> dict[str, float | None]:
+    xs = sorted(xs)
+    if not xs:
+        return {"p50": None, "p95": None, "max": None}
+    pick = lambda q: round(1000 * xs[min(len(xs) - 1, int(q * len(xs)))], 1)
+    return {"p50": pick(0.50), "p95": pick(0.95), "max": round(1000 * xs[-1], 1)}
+
+# ---------- run ----------
+async def run(args) -> dict:
+    rng = random.Random(args.seed)
+    faults = set(filter(None, args.faults.split(",")))
+    broker = LocalBroker()
+    cache = StateCache(cooldown_sec=0, history_samples=args.history)
+    thresholds = Thresholds(None, T_MAX, None, None)
+    rules = [Rule(stale_s=args.stale_sec)] if "dropout" in faults else []
+    engine = RuleEngine(rules, thresholds)
+    extractor = PayloadExtractor({"temp_c": "temp_c", "co2_pct": "co2_pct", "o2_pct": "o2_pct", "states": "states"}, {})
+    bus = MQTTBus("local", 1883, "incubator/status/#", "loadtest", None, None, cache, extractor,
+                  client_factory=broker.client)
+    bot = IncubatorDiscord(cache=cache, thresholds=thresholds, guild_id=None, allow_control=False, units="C")
+    chambers = [Chamber(f"c{i:03d}", rng) for i in range(args.chambers)]
+    report = Report(chambers[0].name if len(chambers) == 1 else None)
+    channels = {i: FakeChannel(i, report, args.send_ms / 1000) for i in range(1, args.channels + 1)}
+    bot.get_channel = channels.get          # Delivery looks channels up through the client
+    bot._watch_channels.update(channels)
+
+    tasks = [asyncio.create_task(bus.run(), name="mqtt-run"),
+             asyncio.create_task(alert_pump(cache, engine, bot), name="alerts"),
+             asyncio.create_task(bot.heartbeat(), name="heartbeat")]
+    await asyncio.sleep(0)   # let the bus subscribe
+
+    gc.collect()
+    start = time.monotonic()
+    report.memory.append((0.0, rss_bytes()))
+    next_mem = start + args.mem_every
+    next_burst = start + args.burst_every
+    interval = 1.0 / args.rate
+    next_due = [start + i * interval / len(chambers) for i in range(len(chambers))]   # staggered
+    garbage = args.garbage if "garbage" in faults else 0.0
+    end = start + args.duration
+    while True:
+        now = time.monotonic()
+        if now >= end:
+            break
+        for i, ch in enumerate(chambers):
+            if next_due[i] > now:
+                continue
+            next_due[i] += interval
+            # a new spike only once the last one has cooled and its alert resolved,
+            # otherwise the rule is still firing and no new alert is due
+            calm = ch.temp < T_MAX and ch.name not in report.hot and (ch.name, "spike") not in report.fault_start
+            if "spike" in faults and now >= ch.spike_until and calm and rng.random() < args.spike_prob * interval:
+                ch.spike_until = now + args.spike_sec
+                ch.spike_seen = False
+                report.alerts["spikes"] += 1
+            if "dropout" in faults and now >= ch.silent_until and rng.random() < args.dropout_prob * interval:
+                ch.silent_until = now + 2 * args.stale_sec
+                report.alerts["dropouts"] += 1
+                report.fault_start[(ch.name, "stale")] = now + args.stale_sec   # due once stale
+            if now < ch.silent_until:
+                continue
+            payload = ch.payload(now, garbage)
+            if now < ch.spike_until and ch.temp > T_MAX and not ch.spike_seen:
+                ch.spike_seen = True
+                report.fault_start[(ch.name, "spike")] = now
+            broker.publish(f"incubator/status/{ch.name}", payload)
+        if "burst" in faults and now >= next_burst:
+            next_burst += args.burst_every
+            ch = rng.choice(chambers)
+            for _ in range(args.burst_n):   # a reconnecting publisher replaying its queue
+                broker.publish(f"incubator/status/{ch.name}", ch.payload(now, 0.0))
+        if now >= next_mem:
+            next_mem += args.mem_every
+            report.memory.append((now - start, rss_bytes()))
+        await asyncio.sleep(max(0.0, min(min(next_due), end) - time.monotonic()))
+
+    # drain: until every queued sample is applied and the posts stop (bounded),
+    # so a spike published in the last moments is not reported as missed
+    settle = max(0.05, 2 * args.send_ms / 1000)
+    deadline, posted = time.monotonic() + args.drain_sec, -1
+    while time.monotonic() < deadline:
+        busy = bus.ingest.depth or any(box.alerts for box in bot.delivery.outboxes.values())
+        if not busy and len(report.posts) == posted:
+            break
+        posted = len(report.posts)
+        await asyncio.sleep(settle)
+    elapsed = time.monotonic() - start
+    report.memory.append((elapsed, rss_bytes()))
+    for t in tasks:
+        t.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    for box in list(bot.delivery.outboxes):
+        bot.delivery.forget(box)
+
+    (t0, m0), (t1, m1) = report.memory[0], report.memory[-1]
+    posts = len(report.posts)
+    unreported = sum(1 for (_, kind) in report.fault_start if kind == "spike")
+    return {
+        "chambers": args.chambers, "rate_hz": args.rate, "seconds": round(elapsed, 1),
+        "published": broker.published,
+        "ingest": dict(bus.ingest.counts, per_sec=round(bus.ingest.counts["processed"] / elapsed, 1),
+                       lag_ms=bus.ingest.lag_ms()),
+        "alerts": dict(report.alerts, unreported_spikes=unreported),
+        "sample_to_alert_ms": percentiles(report.alert_latency),
+        "discord": {"posts": posts, "per_min": round(60 * posts / elapsed, 1),
+                    "delivery": bot.delivery.counts, "delivery_ms": bot.delivery.latency_ms()},
+        "memory": {"start_mb": round(m0 / 2**20, 1), "end_mb": round(m1 / 2**20, 1),
+                   "growth_mb_per_min": round((m1 - m0) / 2**20 / max(1e-9, (t1 - t0) / 60), 2),
+                   "history_mb": round(sum(d.history.nbytes for d in cache.devices.values()) / 2**20, 2)},
+    }
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m src.loadtest", description=__doc__.split("\n\n")[0])
+    ap.add_argument("--chambers", type=int, default=20)
+    ap.add_argument("--rate", type=float, default=1.0, help="messages/s per chamber")
+    ap.add_argument("--duration", type=float, default=30.0, help="seconds")
+    ap.add_argument("--channels", type=int, default=3, help="watched Discord channels")
+    ap.add_argument("--faults", default="spike,dropout,garbage,burst")
+    ap.add_argument("--spike-prob", type=float, default=0.02, help="per chamber per second")
+    ap.add_argument("--spike-sec", type=float, default=5.0)
+    ap.add_argument("--dropout-prob", type=float, default=0.005, help="per chamber per second")
+    ap.add_argument("--stale-sec", type=float, default=5.0)
+    ap.add_argument("--garbage", type=float, default=0.01, help="fraction of bad payloads")
+    ap.add_argument("--burst-every", type=float, default=10.0)
+    ap.add_argument("--burst-n", type=int, default=2000)
+    ap.add_argument("--send-ms", type=float, default=80.0, help="fake Discord request latency")
+    ap.add_argument("--history", type=int, default=172800, help="HISTORY_SAMPLES")
+    ap.add_argument("--mem-every", type=float, default=5.0)
+    ap.add_argument("--drain-sec", type=float, default=10.0, help="max wait for queued alerts after the run")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--max-alert-ms", type=float, default=None, help="fail if sample-to-alert p95 is above")
+    ap.add_argument("--json", action="store_true", help="print the report as JSON")
+    ap.add_argument("-v", "--verbose", action="store_true", help="show the bot's warnings (bad payloads, drops)")
+    args = ap.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING if args.verbose else logging.ERROR)
+    os.environ.setdefault("SHOW_SYSTEM_LINE", "false")
+
+    result = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        for section, values in result.items():
+            print(f"{section:>20}: {values}")
+    p95 = result["sample_to_alert_ms"]["p95"]
+    failed = result["alerts"]["unreported_spikes"] > 0 or (
+        args.max_alert_ms is not None and p95 is not None and p95 > args.max_alert_ms)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
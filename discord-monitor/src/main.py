@@ -1,14 +1,40 @@
 from __future__ import annotations
-import asyncio, logging, os, json
+import asyncio, logging, os, json, time
 from logging import INFO
 from datetime import datetime
 from src.config import Config
 from src.logging_setup import setup_logging
 from src.state_cache import StateCache
-from src.alerts import Thresholds
-from src.mqtt_bus import MQTTBus
+from src.alerts import Thresholds, Rule, RuleEngine
+from src.mqtt_bus import MQTTBus, CommandPublisher
+from src.payload import PayloadExtractor
 from src.file_watch_fallback import FileWatch
 from src.discord_bot import IncubatorDiscord
+from src import snapshot
+from src.metrics import Metrics, serve as serve_metrics
+from src.status_api import StatusAPI
+
+async def alert_pump(cache: StateCache, rule_engine: RuleEngine, bot: IncubatorDiscord):
+    # woken by StateCache.update: each sample is evaluated exactly once;
+    # the timeout only serves stale-data rules
+    samples = cache.subscribe()
+    while True:
+        deadline = rule_engine.next_deadline()
+        try:
+            st = await asyncio.wait_for(samples.get(), None if deadline is None else max(0.0, deadline - time.time()))
+            transitions = rule_engine.observe(st)
+        except asyncio.TimeoutError:
+            transitions = rule_engine.check_stale()
+        for tr in transitions:
+            prefix = f"[{tr.device}] " if len(cache.devices) > 1 else ""
+            if tr.firing:
+                # cooldown still guards against a rule that keeps re-firing
+                if cache.can_alert(tr.rule.key, tr.device):
+                    tr.state.notified = True
+                    await bot.broadcast_alert(prefix + tr.text)
+            elif tr.state.notified:
+                tr.state.notified = False
+                await bot.broadcast_alert(prefix + tr.text, resolved=True)
 
 async def run_async():
     setup_logging(INFO)
@@ -24,8 +50,17 @@ async def run_async():
         scales = json.loads(os.getenv("SENSOR_SCALES", "{}"))
     except json.JSONDecodeError:
         raise SystemExit("SENSOR_SCALES must be valid JSON")
+    # compiled once; shared by whichever source runs
+    extractor = PayloadExtractor(
+        field_map, scales,
+        device_field=os.getenv("DEVICE_ID_FIELD") or None,
+        default_device=os.getenv("DEFAULT_DEVICE") or "incubator",
+    )
 
-    cache = StateCache(cooldown_sec=cfg.DISCORD_ALERT_COOLDOWN_SEC)
+    cache = StateCache(
+        cooldown_sec=cfg.DISCORD_ALERT_COOLDOWN_SEC,
+        history_samples=int(os.getenv("HISTORY_SAMPLES", "172800")),  # per device; 2 days at 1 Hz
+    )
     thresholds = Thresholds(
         t_min=cfg.TEMP_MIN_C if os.getenv("TEMP_MIN_C") else None,
         t_max=cfg.TEMP_MAX_C if os.getenv("TEMP_MAX_C") else None,
@@ -33,6 +68,35 @@ async def run_async():
         o2_min=float(os.getenv("O2_MIN_PCT")) if os.getenv("O2_MIN_PCT") else None,
     )
 
+    # Alert rules: the thresholds above plus ALERT_RULES (JSON list, see alerts.Rule)
+    try:
+        rules = [Rule.from_dict(r) for r in json.loads(os.getenv("ALERT_RULES") or "[]")]
+        hysteresis = json.loads(os.getenv("ALERT_HYSTERESIS") or "{}")
+        rule_engine = RuleEngine(rules, thresholds,
+                                 for_s=float(os.getenv("ALERT_FOR_SEC") or 0),
+                                 hysteresis=hysteresis)
+    except (json.JSONDecodeError, TypeError, ValueError) as e:
+        raise SystemExit(f"ALERT_RULES / ALERT_HYSTERESIS invalid: {e}")
+
+    # Warm start: last snapshot (history, latest, cooldowns, firing alerts), then CSV rows since
+    snapshot_path = os.getenv("SNAPSHOT_PATH", "cache.snapshot")
+    if snapshot_path:
+        t0 = time.perf_counter()
+        if snapshot.restore(cache, snapshot_path, rule_engine):
+            log.info("Snapshot restore took %.1f ms", 1000 * (time.perf_counter() - t0))
+    for spec in filter(None, (os.getenv("BACKFILL_CSV") or "").split(",")):
+        device, _, path = spec.rpartition("=")
+        try:
+            snapshot.backfill_csv(cache, path.strip(), device.strip() or extractor.default_device,
+                                  max_age_sec=float(os.getenv("BACKFILL_MAX_SEC", "172800")))
+        except OSError as e:
+            log.warning("Backfill from %s failed: %s", path, e)
+
+    # Per-stage counters and latency histograms: /perf and METRICS_PORT
+    metrics = Metrics()
+    metrics.register("alerts", rule_engine.counts, rule_engine.hists)
+    metrics.gauge("devices", lambda: len(cache.devices))
+
     # Data source task (MQTT or file)
     tasks = []
     mqtt_bus: MQTTBus | None = None
@@ -45,13 +109,17 @@ async def run_async():
             username=cfg.MQTT_USERNAME,
             password=cfg.MQTT_PASSWORD,
             cache=cache,
-            field_map=field_map,
-            scales=scales,
+            extractor=extractor,
+            queue_max=int(os.getenv("MQTT_INGEST_QUEUE", "5000")),
+            batch=int(os.getenv("MQTT_INGEST_BATCH", "256")),
         )
+        metrics.register("ingest", mqtt_bus.ingest.counts, mqtt_bus.ingest.hists)
+        metrics.gauge("ingest_queue_depth", lambda: mqtt_bus.ingest.depth)
         tasks.append(asyncio.create_task(mqtt_bus.run(), name="mqtt-run"))
         log.info("MQTT mode enabled")
     else:
-        fw = FileWatch(cfg.STATUS_JSON_PATH, cfg.STATUS_FILE_POLL_SEC, cache, field_map, scales)
+        fw = FileWatch(cfg.STATUS_JSON_PATH, cfg.STATUS_FILE_POLL_SEC, cache, extractor)
+        metrics.register("file", fw.counts, fw.hists)
         tasks.append(asyncio.create_task(fw.run(), name="file-watch"))
         log.info("File-watch mode enabled")
 
@@ -62,38 +130,63 @@ async def run_async():
         guild_id=cfg.DISCORD_GUILD_ID,
         allow_control=cfg.DISCORD_ALLOW_CONTROL,
         units=cfg.DISPLAY_UNITS_TEMP,
+        metrics=metrics,
     )
 
-    async def alert_pump():
-        last_seen = None
-        while True:
-            st = cache.latest
-            if st and st is not last_seen:
-                last_seen = st
-                issues = thresholds.check(st)
-                for issue in issues:
-                    key = issue.split(':', 1)[0]
-                    if cache.can_alert(key):
-                        await bot.broadcast_alert(issue)
-            await asyncio.sleep(1)
-
-    tasks.append(asyncio.create_task(alert_pump(), name="alerts"))
+    tasks.append(asyncio.create_task(alert_pump(cache, rule_engine, bot), name="alerts"))
 
     # Optional control queue wiring (only active if control is enabled + MQTT)
     if cfg.DISCORD_ALLOW_CONTROL and mqtt_bus:
         IncubatorDiscord.publish_queue = asyncio.Queue()  # type: ignore[attr-defined]
+        # one persistent connection for all commands (no connect per command)
+        publisher = CommandPublisher(
+            host=cfg.MQTT_HOST,
+            port=cfg.MQTT_PORT,
+            client_id=cfg.MQTT_CLIENT_ID + "-pub",
+            username=cfg.MQTT_USERNAME,
+            password=cfg.MQTT_PASSWORD,
+            max_age=float(os.getenv("CONTROL_MAX_AGE_SEC", "60")),
+        )
+        metrics.register("control", publisher.counts)
+        tasks.append(asyncio.create_task(publisher.run(), name="mqtt-publish"))
 
         async def control_pump():
             while True:
-                cmd, val = await IncubatorDiscord.publish_queue.get()  # type: ignore[attr-defined]
+                cmd, val, chamber = await IncubatorDiscord.publish_queue.get()  # type: ignore[attr-defined]
                 payload = {"command": cmd, "value": val, "source": "discord", "ts": datetime.utcnow().isoformat()}
-                try:
-                    await mqtt_bus.publish_command(cfg.MQTT_COMMAND_TOPIC, payload)
-                except Exception as e:
-                    logging.getLogger("control").warning("Failed to publish control: %s", e)
+                if chamber is not None:
+                    payload["chamber"] = chamber
+                if not publisher.submit(cfg.MQTT_COMMAND_TOPIC, payload):
+                    logging.getLogger("control").warning("Failed to queue control: %s", cmd)
 
         tasks.append(asyncio.create_task(control_pump(), name="control"))
 
+    metrics_port = int(os.getenv("METRICS_PORT") or 0)
+    if metrics_port:
+        tasks.append(asyncio.create_task(
+            serve_metrics(metrics, os.getenv("METRICS_HOST", "127.0.0.1"), metrics_port), name="metrics"))
+
+    status_port = int(os.getenv("STATUS_API_PORT") or 0)
+    if status_port:
+        status_api = StatusAPI(cache, int(os.getenv("STATUS_API_MAX_CLIENTS", "64")),
+                               int(os.getenv("STATUS_API_MAX_BUFFER", str(256 * 1024))))
+        metrics.register("status_api", status_api.counts)
+        metrics.gauge("status_api_clients", lambda: len(status_api.clients))
+        tasks.append(asyncio.create_task(
+            status_api.run(os.getenv("STATUS_API_HOST", "127.0.0.1"), status_port), name="status-api"))
+
+    if snapshot_path:
+        async def snapshot_loop():
+            every = float(os.getenv("SNAPSHOT_SEC", "300"))
+            while True:
+                await asyncio.sleep(every)
+                try:
+                    await snapshot.save_async(cache, snapshot_path, rule_engine)
+                except OSError as e:
+                    log.warning("Snapshot failed: %s", e)
+
+        tasks.append(asyncio.create_task(snapshot_loop(), name="snapshot"))
+
     async def run_discord():
         await bot.start(os.environ["DISCORD_TOKEN"])  # token already validated by Config
 
@@ -104,6 +197,11 @@ async def run_async():
     finally:
         for t in tasks:
             t.cancel()
+        if snapshot_path:
+            try:
+                snapshot.save(cache, snapshot_path, rule_engine)   # so a redeploy resumes where we stopped
+            except OSError as e:
+                log.warning("Final snapshot failed: %s", e)
 
 if __name__ == "__main__":
     asyncio.run(run_async())
\ No newline at end of file
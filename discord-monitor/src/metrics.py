@@ -0,0 +1,104 @@
+from __future__ import annotations
+import asyncio, json, logging, time
+from bisect import bisect_left
+from .http_local import read_request, respond
+
+log = logging.getLogger(__name__)
+
+# Upper bounds in ms; one overflow bucket after the last
+BUCKETS_MS = (0.1, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000, 60000)
+
+class Histogram:
+    """Fixed-bucket latency histogram: O(1) observe, constant memory."""
+    __slots__ = ("buckets", "count", "total", "max")
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0   # ms
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        ms = seconds * 1000.0
+        self.buckets[bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def quantile(self, q: float) -> float | None:
+        """Upper bound of the bucket holding the q-th observation (ms)."""
+        if not self.count:
+            return None
+        rank, seen = q * self.count, 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank and n:
+                return round(min(BUCKETS_MS[i], self.max) if i < len(BUCKETS_MS) else self.max, 3)
+        return round(self.max, 3)
+
+    def summary(self) -> dict[str, float | None]:
+        if not self.count:
+            return {"count": 0, "mean": None, "p50": None, "p95": None, "max": None}
+        return {"count": self.count, "mean": round(self.total / self.count, 3),
+                "p50": self.quantile(0.50), "p95": self.quantile(0.95), "max": round(self.max, 3)}
+
+
+class Metrics:
+    """Registry of the pipeline stages' own `counts` and `hists` dicts (held by
+    reference, so stages just update them) plus gauges read on demand."""
+    def __init__(self):
+        self.started = time.time()
+        self.sources: dict[str, tuple[dict, dict]] = {}
+        self.gauges: dict[str, callable] = {}
+
+    def register(self, name: str, counts: dict | None = None, hists: dict[str, Histogram] | None = None):
+        self.sources[name] = (counts if counts is not None else {}, hists if hists is not None else {})
+
+    def gauge(self, name: str, fn):
+        self.gauges[name] = fn
+
+    def snapshot(self) -> dict:
+        out = {"uptime_s": round(time.time() - self.started, 1),
+               "gauges": {k: fn() for k, fn in self.gauges.items()}}
+        for name, (counts, hists) in self.sources.items():
+            out[name] = {"counts": dict(counts), "latency_ms": {k: h.summary() for k, h in hists.items()}}
+        return out
+
+    def prometheus(self) -> str:
+        lines = [f"incubator_uptime_seconds {time.time() - self.started:.1f}"]
+        for k, fn in self.gauges.items():
+            lines.append(f"incubator_{k} {fn()}")
+        for name, (counts, hists) in self.sources.items():
+            for k, v in counts.items():
+                lines.append(f"incubator_{name}_{k}_total {v}")
+            for k, h in hists.items():
+                base, seen = f"incubator_{name}_{k}_ms", 0
+                for le, n in zip(BUCKETS_MS + ("+Inf",), h.buckets):
+                    seen += n
+                    lines.append(f'{base}_bucket{{le="{le}"}} {seen}')
+                lines.append(f"{base}_sum {h.total:.3f}")
+                lines.append(f"{base}_count {h.count}")
+        return "\n".join(lines) + "\n"
+
+
+async def serve(metrics: Metrics, host: str = "127.0.0.1", port: int = 9108):
+    """GET /metrics (Prometheus text) or /metrics.json on a local port."""
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            _, path = await read_request(reader)
+            if path.startswith("/metrics.json"):
+                await respond(writer, "200 OK", "application/json", json.dumps(metrics.snapshot()).encode())
+            elif path.startswith("/metrics"):
+                await respond(writer, "200 OK", "text/plain; version=0.0.4", metrics.prometheus().encode())
+            else:
+                await respond(writer, "404 Not Found", "text/plain", b"try /metrics or /metrics.json\n")
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    log.info("Metrics on http://%s:%d/metrics", host, port)
+    async with server:
+        await server.serve_forever()
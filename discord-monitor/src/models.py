@@ -5,6 +5,8 @@ from datetime import datetime
 
 class IncubatorStatus(BaseModel):
     timestamp: datetime = Field(default_factory=datetime.utcnow)
+    # Which incubator sent it (topic suffix or DEVICE_ID_FIELD)
+    device: str = "incubator"
     # Core signals (humidity/fan removed)
     temp_c: float
     co2_pct: Optional[float] = None
@@ -25,4 +27,49 @@ class IncubatorStatus(BaseModel):
         if self.states:
             pretty = ", ".join(f"{k}:{'ON' if v else 'off'}" for k,v in self.states.items())
             lines.append(f"States: {pretty}")
-        return lines
\ No newline at end of file
+        usage = self.extra.get("usage")
+        if isinstance(usage, dict) and usage.get("summary"):
+            lines.append(f"Gas: {usage['summary']}")   # incubator usage ledger
+        return lines
+
+    def to_model(self) -> "IncubatorStatus":
+        return self
+
+
+class StatusRecord:
+    """Slotted status for the ingest path: what StateCache, history and alerts hold.
+
+    PayloadExtractor validates values as it reads them, so no per-message
+    model validation, `states` is kept as parsed and `extra` is only copied
+    out of the payload when asked for. to_model() builds the pydantic
+    IncubatorStatus when a status is rendered or saved.
+    """
+    __slots__ = ("timestamp", "device", "temp_c", "co2_pct", "o2_pct", "states", "_payload", "_exclude")
+
+    def __init__(self, timestamp: datetime, device: str, temp_c: float, co2_pct: Optional[float] = None,
+                 o2_pct: Optional[float] = None, states: Optional[dict] = None,
+                 payload: Optional[dict] = None, exclude: frozenset = frozenset()):
+        self.timestamp = timestamp
+        self.device = device
+        self.temp_c = temp_c
+        self.co2_pct = co2_pct
+        self.o2_pct = o2_pct
+        self.states = states if states is not None else {}
+        self._payload = payload
+        self._exclude = exclude
+
+    @property
+    def extra(self) -> Dict[str, Any]:
+        p = self._payload
+        return {} if p is None else {k: v for k, v in p.items() if k not in self._exclude}
+
+    def to_model(self) -> IncubatorStatus:
+        # values were checked by the extractor; skip validation
+        return IncubatorStatus.model_construct(
+            timestamp=self.timestamp, device=self.device, temp_c=self.temp_c,
+            co2_pct=self.co2_pct, o2_pct=self.o2_pct,
+            states={str(k): bool(v) for k, v in self.states.items()}, extra=self.extra)
+
+    @classmethod
+    def from_model(cls, m: IncubatorStatus) -> "StatusRecord":
+        return cls(m.timestamp, m.device, m.temp_c, m.co2_pct, m.o2_pct, m.states, m.extra)
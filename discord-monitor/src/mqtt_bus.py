@@ -1,96 +1,162 @@
 from __future__ import annotations
-import asyncio, json, logging
+import asyncio, json, logging, time
+from collections import deque
 from asyncio_mqtt import Client, MqttError
-from datetime import datetime
 from backoff import expo, on_exception
-from .models import IncubatorStatus
+from .payload import PayloadExtractor
 from .state_cache import StateCache
+from .ingest import IngestQueue
 
 log = logging.getLogger(__name__)
 
-# Helper: resolve a value from payload with mapping key (supports dotted paths)
-def resolve(payload: dict, key: str | None):
-    if not key:
-        return None
-    cur = payload
-    for part in key.split('.'):
-        if isinstance(cur, dict) and part in cur:
-            cur = cur[part]
-        else:
-            return None
-    return cur
-
-# Helper: convert possibly-fractional percentages to percent
-def to_percent(v):
-    try:
-        x = float(v)
-    except (TypeError, ValueError):
-        return None
-    # Auto-detect: if looks like fraction, scale
-    if 0 <= x <= 1.5:
-        return x * 100.0
-    return x
-
 class MQTTBus:
-    def __init__(self, host: str, port: int, topic: str, client_id: str, username: str|None, password: str|None, cache: StateCache, field_map: dict, scales: dict):
+    def __init__(self, host: str, port: int, topic: str, client_id: str, username: str|None, password: str|None, cache: StateCache, extractor: PayloadExtractor,
+                 queue_max: int = 5000, batch: int = 256, client_factory=Client):
         self.host=host; self.port=port; self.topic=topic; self.client_id=client_id
         self.username=username; self.password=password
         self.cache=cache
-        self.field_map = field_map
-        self.scales = scales
+        self.extractor = extractor
+        # the receive loop only enqueues; parsing and cache updates happen in batches
+        self.ingest = IngestQueue(cache, extractor, maxsize=queue_max, batch=batch)
+        self.client_factory = client_factory   # swapped for an in-process broker by src.loadtest
+        # device id = topic level(s) under the wildcard, e.g. incubator/status/<device>
+        self.prefix = topic.split('#', 1)[0].split('+', 1)[0]
+
+    def device_of(self, topic: str) -> str | None:
+        if self.prefix and topic.startswith(self.prefix):
+            return topic[len(self.prefix):] or None
+        return None
 
-    @on_exception(expo, (MqttError, ConnectionError), max_time=300)
     async def run(self):
+        self._start_worker()
+        try:
+            await self._receive()
+        finally:
+            self._worker.cancel()
+
+    def _start_worker(self):
+        self._worker = asyncio.create_task(self.ingest.run(), name="mqtt-ingest")
+        self._worker.add_done_callback(self._worker_done)
+
+    def _worker_done(self, task: asyncio.Task):
+        # a raising subscriber or history append must not stop ingest while
+        # _receive keeps filling (and dropping from) the queue
+        if task.cancelled():
+            return
+        self.ingest.counts["restarts"] += 1
+        log.error("MQTT ingest worker stopped; restarting it", exc_info=task.exception())
+        self._start_worker()
+
+    @on_exception(expo, (MqttError, ConnectionError), max_time=300)
+    async def _receive(self):
         auth = {}
         if self.username:
             auth = {"username": self.username, "password": self.password}
-        async with Client(self.host, self.port, client_id=self.client_id, **auth) as client:
+        async with self.client_factory(self.host, self.port, client_id=self.client_id, **auth) as client:
             log.info(f"MQTT connected to {self.host}:{self.port}, sub {self.topic}")
             async with client.messages() as messages:
                 await client.subscribe(self.topic)
                 async for message in messages:
-                    try:
-                        payload = json.loads(message.payload.decode())
-                        ts = payload.get("timestamp")
-                        temp_key = self.field_map.get("temp_c")
-                        co2_key = self.field_map.get("co2_pct")
-                        o2_key  = self.field_map.get("o2_pct")
-                        states_key = self.field_map.get("states")
-
-                        temp_v = resolve(payload, temp_key)
-                        if temp_v is None:
-                            raise ValueError("Missing temp value; map temp_c in SENSOR_FIELD_MAP")
-                        temp_c = float(temp_v) * float(self.scales.get("temp_c", 1.0))
-
-                        co2_raw = resolve(payload, co2_key)
-                        o2_raw  = resolve(payload, o2_key)
-                        co2_pct = to_percent(co2_raw) if co2_raw is not None else None
-                        o2_pct  = to_percent(o2_raw) if o2_raw is not None else None
-                        if co2_pct is not None:
-                            co2_pct *= float(self.scales.get("co2_pct", 1.0))
-                        if o2_pct is not None:
-                            o2_pct *= float(self.scales.get("o2_pct", 1.0))
-
-                        states = resolve(payload, states_key) or {}
-                        if not isinstance(states, dict):
-                            states = {}
-
-                        st = IncubatorStatus(
-                            timestamp = datetime.fromisoformat(ts) if isinstance(ts,str) else datetime.utcnow(),
-                            temp_c = temp_c,
-                            co2_pct = co2_pct,
-                            o2_pct = o2_pct,
-                            states = {str(k): bool(v) for k,v in states.items()},
-                            extra = {k:v for k,v in payload.items() if k not in {temp_key, co2_key, o2_key, states_key, 'timestamp'}}
-                        )
-                        self.cache.update(st)
-                    except Exception as e:
-                        log.warning(f"Bad MQTT payload: {e}")
-
-    @on_exception(expo, (MqttError, ConnectionError), max_time=120)
-    async def publish_command(self, topic: str, payload: dict):
+                    self.ingest.submit(message.payload, self.device_of(str(message.topic)))
+
+
+class CommandPublisher:
+    """One long-lived publisher connection for control commands.
+
+    Commands are queued (bounded) and sent over a persistent connection; a
+    burst is published as one pipelined batch of QoS 1 messages, with at most
+    `max_inflight` awaiting PUBACK. On a lost connection the unacknowledged
+    messages are kept and re-sent after a transparent reconnect (capped
+    exponential backoff). A command older than `max_age` seconds (queued or
+    waiting for a retry) is dropped instead: a purge or valve command must not
+    fire when the broker comes back hours later. Latency is measured from
+    submit() to PUBACK.
+    """
+    def __init__(self, host: str, port: int, client_id: str, username: str|None, password: str|None,
+                 max_queue: int = 100, max_inflight: int = 10, max_age: float = 60.0, client_factory=Client):
+        self.host=host; self.port=port; self.client_id=client_id
+        self.username=username; self.password=password
+        self.client_factory = client_factory   # an in-process stand-in in tests
+        self.max_inflight = max_inflight
+        self.max_age = max_age
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._retry: deque = deque()              # unacknowledged when the connection dropped
+        self.connected = False
+        self.latency: deque[float] = deque(maxlen=256)   # seconds, submit -> PUBACK
+        self.counts = {"sent": 0, "dropped": 0, "retried": 0, "expired": 0, "reconnects": 0}
+
+    def submit(self, topic: str, payload: dict) -> bool:
+        """Queue a message without waiting; False if the queue is full."""
+        try:
+            self.queue.put_nowait((topic, json.dumps(payload), time.monotonic()))
+            return True
+        except asyncio.QueueFull:
+            self.counts["dropped"] += 1
+            log.warning("Command queue full; dropped %s", payload.get("command"))
+            return False
+
+    def latency_ms(self) -> dict[str, float | None]:
+        xs = sorted(self.latency)
+        if not xs:
+            return {"p50": None, "p95": None, "max": None}
+        pick = lambda q: round(1000 * xs[min(len(xs) - 1, int(q * len(xs)))], 1)
+        return {"p50": pick(0.50), "p95": pick(0.95), "max": round(1000 * xs[-1], 1)}
+
+    async def run(self):
+        delay = 1.0
         auth = {}
         if self.username:
             auth = {"username": self.username, "password": self.password}
-        async with Client(self.host, self.port, client_id=self.client_id+"-pub", **auth) as client:
-            await client.publish(topic, json.dumps(payload), qos=1)
\ No newline at end of file
+        while True:
+            try:
+                async with self.client_factory(self.host, self.port, client_id=self.client_id, **auth) as client:
+                    self.connected, delay = True, 1.0
+                    log.info(f"MQTT publisher connected to {self.host}:{self.port}")
+                    while True:
+                        await self._send_batch(client)
+            except (MqttError, ConnectionError) as e:
+                if self.connected:
+                    self.counts["reconnects"] += 1
+                self.connected = False
+                log.warning("MQTT publisher disconnected (%s); retrying in %.0fs", e, delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 60.0)
+
+    def _fresh(self, item) -> bool:
+        if time.monotonic() - item[2] <= self.max_age:
+            return True
+        self.counts["expired"] += 1
+        log.warning("Dropped control command older than %.0fs: %s", self.max_age, item[1][:120])
+        return False
+
+    async def _send_batch(self, client):
+        # messages left over from a dropped connection go first, in order
+        batch = []
+        while self._retry and len(batch) < self.max_inflight:
+            item = self._retry.popleft()
+            if self._fresh(item):
+                batch.append(item)
+        while not batch:
+            item = await self.queue.get()
+            if self._fresh(item):
+                batch.append(item)
+        while len(batch) < self.max_inflight and not self.queue.empty():
+            item = self.queue.get_nowait()
+            if self._fresh(item):
+                batch.append(item)
+
+        results = await asyncio.gather(
+            *(client.publish(topic, data, qos=1) for topic, data, _ in batch),
+            return_exceptions=True)
+        now = time.monotonic()
+        failed = None
+        for item, res in zip(batch, results):
+            if isinstance(res, Exception):
+                self._retry.append(item)
+                self.counts["retried"] += 1
+                failed = failed or res
+            else:
+                self.counts["sent"] += 1
+                self.latency.append(now - item[2])
+        if failed is not None:
+            raise failed if isinstance(failed, (MqttError, ConnectionError)) else MqttError(str(failed))
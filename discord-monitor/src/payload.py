@@ -0,0 +1,195 @@
+from __future__ import annotations
+import json, time, logging
+from datetime import datetime, timezone
+from .models import IncubatorStatus, StatusRecord
+
+try:
+    import orjson  # optional; faster JSON decoding
+except Exception:  # pragma: no cover
+    orjson = None
+
+log = logging.getLogger(__name__)
+
+# Helper: resolve a value from payload with mapping key (supports dotted paths)
+def resolve(payload: dict, key: str | None):
+    if not key:
+        return None
+    return _walk(payload, tuple(key.split('.')))
+
+def _walk(payload: dict, path: tuple[str, ...]):
+    cur = payload
+    for part in path:
+        if isinstance(cur, dict) and part in cur:
+            cur = cur[part]
+        else:
+            return None
+    return cur
+
+# Helper: convert possibly-fractional percentages to percent
+def to_percent(v):
+    try:
+        x = float(v)
+    except (TypeError, ValueError):
+        return None
+    # Auto-detect: if looks like fraction, scale
+    if 0 <= x <= 1.5:
+        return x * 100.0
+    return x
+
+def _number(v):
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return None
+
+def _fraction(v):
+    x = _number(v)
+    return None if x is None else x * 100.0
+
+# A payload's "gas_units" field says how CO₂/O₂ are given; without it the
+# fraction heuristic above applies (it misreads real readings under 1.5 %,
+# e.g. low O₂, so senders that know their units should declare them).
+GAS_UNITS = {"percent": _number, "fraction": _fraction}
+
+
+class PayloadExtractor:
+    """SENSOR_FIELD_MAP / SENSOR_SCALES compiled once, shared by MQTTBus and FileWatch.
+
+    Paths are pre-split, scale factors pre-converted and the keys kept out of
+    `extra` frozen, so a message costs one decode plus a few dict lookups.
+    This is the validation edge: values are checked here and come out as a
+    StatusRecord, not a pydantic model.
+    """
+    __slots__ = ("temp_path", "co2_path", "o2_path", "states_path", "device_path", "default_device",
+                 "temp_scale", "co2_scale", "o2_scale", "exclude", "loads")
+
+    def __init__(self, field_map: dict, scales: dict, fast_json: bool = True,
+                 device_field: str | None = None, default_device: str = "incubator"):
+        def path(name):
+            key = field_map.get(name)
+            return tuple(key.split('.')) if key else None
+        self.temp_path = path("temp_c")
+        self.co2_path = path("co2_pct")
+        self.o2_path = path("o2_pct")
+        self.states_path = path("states")
+        self.device_path = tuple(device_field.split('.')) if device_field else None
+        self.default_device = default_device
+        self.temp_scale = float(scales.get("temp_c", 1.0))
+        self.co2_scale = float(scales.get("co2_pct", 1.0))
+        self.o2_scale = float(scales.get("o2_pct", 1.0))
+        self.exclude = frozenset(field_map.get(k) for k in ("temp_c", "co2_pct", "o2_pct", "states")) | {"timestamp", "gas_units", device_field}
+        self.loads = orjson.loads if (fast_json and orjson is not None) else json.loads
+
+    @staticmethod
+    def _get(payload: dict, path):
+        if path is None:
+            return None
+        if len(path) == 1:
+            return payload.get(path[0])
+        return _walk(payload, path)
+
+    def decode(self, raw: bytes | str) -> dict:
+        payload = self.loads(raw)
+        if not isinstance(payload, dict):
+            raise ValueError("payload is not a JSON object")
+        return payload
+
+    def extract(self, payload: dict, device: str | None = None) -> StatusRecord:
+        """device: id from the transport (MQTT topic suffix); a payload
+        DEVICE_ID_FIELD wins over it, the default applies without either."""
+        get = self._get
+        temp_v = get(payload, self.temp_path)
+        if temp_v is None:
+            raise ValueError("Missing temp value; map temp_c in SENSOR_FIELD_MAP")
+
+        co2_raw = get(payload, self.co2_path)
+        o2_raw = get(payload, self.o2_path)
+        units = payload.get("gas_units")
+        pct = GAS_UNITS.get(units, to_percent) if isinstance(units, str) else to_percent
+        co2_pct = pct(co2_raw) if co2_raw is not None else None
+        o2_pct = pct(o2_raw) if o2_raw is not None else None
+        if co2_pct is not None:
+            co2_pct *= self.co2_scale
+        if o2_pct is not None:
+            o2_pct *= self.o2_scale
+
+        states = get(payload, self.states_path) or {}
+        if not isinstance(states, dict):
+            states = {}
+
+        dev = get(payload, self.device_path)
+        ts = payload.get("timestamp")
+        if isinstance(ts, str):
+            ts = datetime.fromisoformat(ts)
+            if ts.tzinfo is not None:   # statuses are naive UTC throughout
+                ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+        else:
+            ts = datetime.utcnow()
+        return StatusRecord(ts, str(dev) if dev is not None else (device or self.default_device),
+                            float(temp_v) * self.temp_scale, co2_pct, o2_pct, states, payload, self.exclude)
+
+    def parse(self, raw: bytes | str, device: str | None = None) -> StatusRecord:
+        return self.extract(self.decode(raw), device)
+
+
+# ---------- micro-benchmark: python -m src.payload [messages] ----------
+def _legacy_parse(raw: bytes, field_map: dict, scales: dict) -> IncubatorStatus:
+    """The per-message parsing MQTTBus/FileWatch did before PayloadExtractor."""
+    payload = json.loads(raw.decode())
+    ts = payload.get("timestamp")
+    temp_key = field_map.get("temp_c"); co2_key = field_map.get("co2_pct")
+    o2_key = field_map.get("o2_pct"); states_key = field_map.get("states")
+    temp_c = float(resolve(payload, temp_key)) * float(scales.get("temp_c", 1.0))
+    co2_raw = resolve(payload, co2_key); o2_raw = resolve(payload, o2_key)
+    co2_pct = to_percent(co2_raw) if co2_raw is not None else None
+    o2_pct = to_percent(o2_raw) if o2_raw is not None else None
+    if co2_pct is not None:
+        co2_pct *= float(scales.get("co2_pct", 1.0))
+    if o2_pct is not None:
+        o2_pct *= float(scales.get("o2_pct", 1.0))
+    states = resolve(payload, states_key) or {}
+    return IncubatorStatus(
+        timestamp = datetime.fromisoformat(ts) if isinstance(ts, str) else datetime.utcnow(),
+        temp_c = temp_c, co2_pct = co2_pct, o2_pct = o2_pct,
+        states = {str(k): bool(v) for k, v in states.items()},
+        extra = {k: v for k, v in payload.items() if k not in {temp_key, co2_key, o2_key, states_key, 'timestamp'}},
+    )
+
+def benchmark(n: int = 50000) -> dict[str, float]:
+    field_map = {"temp_c": "sensors.temp", "co2_pct": "sensors.co2", "o2_pct": "sensors.o2", "states": "states"}
+    scales = {"temp_c": 1.0, "co2_pct": 1.0, "o2_pct": 1.0}
+    raw = json.dumps({
+        "timestamp": "2025-06-11T14:42:33.900000",
+        "sensors": {"temp": 37.02, "co2": 5.01, "o2": 4.98},
+        "states": {"heater": True, "o2": False, "co2": False},
+        "device": "incubator-1", "fw": "1.4.2",
+    }).encode()
+
+    def rate(fn):
+        start = time.perf_counter()
+        for _ in range(n):
+            fn(raw)
+        return n / (time.perf_counter() - start)
+
+    results = {"legacy": rate(lambda r: _legacy_parse(r, field_map, scales))}
+    ex = PayloadExtractor(field_map, scales)
+
+    def validated_model(r):
+        # what extract() returned before StatusRecord: a validated pydantic model per message
+        rec = ex.parse(r)
+        return IncubatorStatus(timestamp=rec.timestamp, device=rec.device, temp_c=rec.temp_c,
+                               co2_pct=rec.co2_pct, o2_pct=rec.o2_pct,
+                               states={str(k): bool(v) for k, v in rec.states.items()}, extra=rec.extra)
+
+    results["pydantic model"] = rate(validated_model)
+    results["record, json"] = rate(PayloadExtractor(field_map, scales, fast_json=False).parse)
+    if orjson is not None:
+        results["record, orjson"] = rate(ex.parse)
+    results["decode+lookup only"] = rate(lambda r: ex._get(ex.decode(r), ex.temp_path))
+    return results
+
+if __name__ == "__main__":
+    import sys
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    for name, per_sec in benchmark(n).items():
+        print(f"{name:>20}: {per_sec:10.0f} msg/s  ({1e6 / per_sec:6.1f} µs/msg)")
@@ -0,0 +1,201 @@
+from __future__ import annotations
+import asyncio, glob, json, logging, math, os, struct, sys, time
+from array import array
+from datetime import datetime, timezone
+from .models import IncubatorStatus, StatusRecord
+from .history import COLUMNS, epoch
+from .state_cache import StateCache
+from .alerts import RuleEngine, RuleState
+
+log = logging.getLogger(__name__)
+
+MAGIC = b"LXSNAP1\n"
+
+# ---------- snapshot file ----------
+# MAGIC, u32 header length, JSON header, then per device (header order) the raw
+# history columns oldest first: ts (d), temp_c/co2_pct/o2_pct (f), states (I).
+
+def _capture(cache: StateCache, engine: RuleEngine | None) -> tuple[bytes, list[bytes]]:
+    """Copy everything needed on the event loop; the write can then run in a thread."""
+    devices, blobs = [], []
+    for dev in cache.devices.values():
+        ts, cols, states = dev.history.export()
+        devices.append({
+            "name": dev.name,
+            "latest": dev.latest.to_model().model_dump(mode="json") if dev.latest is not None else None,
+            "last_alert_at": {k: v.isoformat() for k, v in dev.last_alert_at.items()},
+            "state_bits": dev.history.state_bits,
+            "size": len(ts),
+        })
+        blobs += [ts.tobytes(), *(cols[c].tobytes() for c in COLUMNS), states.tobytes()]
+    rules = []
+    if engine is not None:
+        rules = [[d, k, st.active, st.since, st.notified] for (d, k), st in engine.states.items()
+                 if st.active or st.notified]
+    header = json.dumps({"saved_at": time.time(), "byteorder": sys.byteorder,
+                         "itemsize": array('I').itemsize, "devices": devices, "rules": rules},
+                        separators=(",", ":")).encode()
+    return header, blobs
+
+def _write(path: str, header: bytes, blobs: list[bytes]):
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(header)))
+        f.write(header)
+        for b in blobs:
+            f.write(b)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)   # readers never see a half-written snapshot
+
+def save(cache: StateCache, path: str, engine: RuleEngine | None = None):
+    _write(path, *_capture(cache, engine))
+
+async def save_async(cache: StateCache, path: str, engine: RuleEngine | None = None):
+    header, blobs = _capture(cache, engine)
+    await asyncio.to_thread(_write, path, header, blobs)
+
+def restore(cache: StateCache, path: str, engine: RuleEngine | None = None) -> bool:
+    """Load a snapshot into an empty cache; False if there is none or it is unusable."""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return False
+    try:
+        if not data.startswith(MAGIC):
+            raise ValueError("not a snapshot file")
+        pos = len(MAGIC)
+        (n,) = struct.unpack_from("<I", data, pos)
+        pos += 4
+        header = json.loads(data[pos:pos + n])
+        pos += n
+        if header["itemsize"] != array('I').itemsize:
+            raise ValueError("snapshot from an incompatible platform")
+        swap = header["byteorder"] != sys.byteorder
+        view = memoryview(data)
+
+        def take(code: str, count: int) -> array:
+            nonlocal pos
+            a = array(code)
+            a.frombytes(view[pos:pos + count * a.itemsize])
+            pos += count * a.itemsize
+            if swap:
+                a.byteswap()
+            return a
+
+        for d in header["devices"]:
+            size = d["size"]
+            ts = take('d', size)
+            cols = {c: take('f', size) for c in COLUMNS}
+            states = take('I', size)
+            dev = cache.shard(d["name"])
+            dev.history.load(ts, cols, states, d["state_bits"])
+            dev.last_alert_at = {k: datetime.fromisoformat(v) for k, v in d["last_alert_at"].items()}
+            if d["latest"] is not None:
+                dev.latest = StatusRecord.from_model(IncubatorStatus.model_validate(d["latest"]))
+                dev.version += 1
+                if cache.latest is None or dev.latest.timestamp > cache.latest.timestamp:
+                    cache.latest = dev.latest
+        cache.version += 1
+    except Exception as e:
+        log.warning("Ignoring snapshot %s: %s", path, e)
+        cache.devices.clear(); cache.latest = None
+        return False
+
+    if engine is not None:
+        keys = {r.key for r in engine.rules}
+        now = time.time()
+        for device, key, active, since, notified in header["rules"]:
+            if key not in keys:
+                continue
+            st = engine.states[(device, key)] = RuleState()
+            st.active, st.since, st.notified = active, since, notified
+        for name in cache.devices:
+            engine.last_seen.setdefault(name, now)   # stale rules count from the restart
+    log.info("Restored %d device(s) from %s (saved %.0fs ago)",
+             len(header["devices"]), path, time.time() - header["saved_at"])
+    return True
+
+
+# ---------- backfill from the incubator's CSV data log ----------
+# <asctime>,temp_c,o2_pct,co2_pct,heater_state,o2_state,co2_state
+# e.g. 2025-06-11 14:42:33,900,37.00,5.00,5.00,ON,OFF,OFF  (local time, ms after the comma)
+
+def _csv_files(path: str) -> list[str]:
+    """Rotated logs (path.YYYY-MM-DD, oldest first) then the live file."""
+    return sorted(glob.glob(glob.escape(path) + ".*")) + ([path] if os.path.exists(path) else [])
+
+CSV_COLUMNS = 8   # the asctime column splits in two at the milliseconds comma
+
+def _parse_row(line: str):
+    """(t, temp, o2, co2, states), or None for the header or a partial line.
+    Raises ValueError (with the column count) if the row has a different layout."""
+    parts = line.rstrip("\n").split(",")
+    if parts[0] in ("", "timestamp"):
+        return None
+    if len(parts) != CSV_COLUMNS:
+        raise ValueError(len(parts))
+    try:
+        local = datetime.strptime(f"{parts[0]},{parts[1]}", "%Y-%m-%d %H:%M:%S,%f")
+        t = local.astimezone(timezone.utc).timestamp()
+        temp, o2, co2 = float(parts[2]), float(parts[3]), float(parts[4])   # failed reads log as nan
+    except ValueError:
+        return None   # header, partial line
+    states = {"heater": parts[5] == "ON", "o2": parts[6] == "ON", "co2": parts[7] == "ON"}
+    return t, temp, o2, co2, states
+
+def backfill_csv(cache: StateCache, path: str, device: str, max_age_sec: float | None = None) -> int:
+    """Append CSV rows newer than the device's history (and within max_age_sec) to it.
+
+    Rows go straight into the history ring; only the newest becomes `latest`,
+    so no record is built per row. Returns the number of rows added.
+    """
+    existed = device in cache.devices
+    dev = cache.shard(device)
+    ring = dev.history
+    since = ring.time_at(len(ring) - 1) if len(ring) else -math.inf
+    if max_age_sec is not None:
+        since = max(since, time.time() - max_age_sec)
+    cutoff_day = datetime.fromtimestamp(since).strftime("%Y-%m-%d") if since > 0 else ""
+    added, last = 0, None
+    for fn in _csv_files(path):
+        suffix = fn[len(path) + 1:]
+        if suffix and suffix < cutoff_day:
+            continue   # rotated file for a day entirely before what we need
+        skipped, columns = 0, set()
+        with open(fn, "r", errors="replace") as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    break     # the incubator is still writing this row
+                try:
+                    row = _parse_row(line)
+                except ValueError as e:
+                    skipped += 1
+                    columns.add(e.args[0])
+                    continue
+                if row is None or row[0] <= since:
+                    continue
+                t, temp, o2, co2, states = row
+                ring.append(t, temp, co2, o2, states)
+                last = row
+                added += 1
+        if skipped:
+            log.warning("Backfill skipped %d row(s) of %s with %s column(s) instead of %d; "
+                        "has the incubator's CSV format changed?", skipped, fn,
+                        "/".join(map(str, sorted(columns))), CSV_COLUMNS)
+    if not added and not existed:
+        del cache.devices[device]
+    if last is not None:
+        t, temp, o2, co2, states = last
+        nan = lambda x: None if x != x else x
+        if temp == temp and (dev.latest is None or epoch(dev.latest.timestamp) < t):
+            dev.latest = StatusRecord(datetime.fromtimestamp(t, timezone.utc).replace(tzinfo=None),
+                                      device, temp, nan(co2), nan(o2), states)
+            dev.version += 1
+            if cache.latest is None or dev.latest.timestamp > cache.latest.timestamp:
+                cache.latest = dev.latest
+        cache.version += 1
+        log.info("Backfilled %d sample(s) for %s from %s", added, device, path)
+    return added
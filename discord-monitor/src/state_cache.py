@@ -1,24 +1,112 @@
 from __future__ import annotations
-from collections import deque
+import asyncio
 from datetime import datetime, timedelta
 from typing import Optional
-from .models import IncubatorStatus
+from .models import StatusRecord
+from .history import HistoryRing
 
-class StateCache:
-    def __init__(self, cooldown_sec: int = 180):
-        self.latest: Optional[IncubatorStatus] = None
-        self.history: deque[IncubatorStatus] = deque(maxlen=500)
+class DeviceState:
+    """Latest sample, history and alert cooldowns of one incubator."""
+    __slots__ = ("name", "latest", "version", "history", "last_alert_at")
+
+    def __init__(self, name: str, history_samples: int):
+        self.name = name
+        self.latest: Optional[StatusRecord] = None
+        self.version = 0   # bumped per sample; keys rendered messages
+        self.history = HistoryRing(history_samples)
         self.last_alert_at: dict[str, datetime] = {}
+
+class Subscription:
+    """Broadcast channel from StateCache.update to one consumer.
+
+    Every sample is delivered in order (alert evaluation); with `coalesce`
+    only the newest is kept (display: "something changed, here is the latest").
+    """
+    def __init__(self, maxsize: int = 1000, coalesce: bool = False):
+        self.queue: asyncio.Queue[StatusRecord] = asyncio.Queue(maxsize=1 if coalesce else maxsize)
+        self.coalesce = coalesce
+        self.dropped = 0
+
+    def push(self, st: StatusRecord):
+        if self.queue.full():
+            self.queue.get_nowait()   # consumer is behind: drop the oldest
+            if not self.coalesce:
+                self.dropped += 1
+        self.queue.put_nowait(st)
+
+    async def get(self) -> StatusRecord:
+        return await self.queue.get()
+
+class StateCache:
+    """Per-device shards; one device's samples never overwrite another's."""
+    def __init__(self, cooldown_sec: int = 180, history_samples: int = 172800):
+        self.history_samples = history_samples
+        self.devices: dict[str, DeviceState] = {}
+        self.latest: Optional[StatusRecord] = None   # newest sample from any device
+        self.version = 0                                 # bumped per sample from any device
         self.cooldown = timedelta(seconds=cooldown_sec)
+        self._subs: list[Subscription] = []
+
+    def subscribe(self, maxsize: int = 1000, coalesce: bool = False) -> Subscription:
+        sub = Subscription(maxsize, coalesce)
+        self._subs.append(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        if sub in self._subs:
+            self._subs.remove(sub)
+
+    def shard(self, name: str) -> DeviceState:
+        dev = self.devices.get(name)
+        if dev is None:
+            dev = self.devices[name] = DeviceState(name, self.history_samples)
+        return dev
+
+    def update(self, st: StatusRecord):
+        self.update_batch((st,))
+
+    def update_batch(self, sts) -> int:
+        """Apply samples in arrival order. Every sample goes to history and to
+        the all-samples subscribers (alerts); `latest` and the coalescing
+        subscribers (display) see only the newest per device. Returns how
+        many display updates that saved."""
+        newest: dict[str, tuple[DeviceState, StatusRecord]] = {}
+        every = [sub for sub in self._subs if not sub.coalesce]
+        for st in sts:
+            dev = self.shard(st.device)
+            dev.history.append_status(st)
+            newest[st.device] = (dev, st)
+            for sub in every:
+                sub.push(st)
+        if not newest:
+            return 0
+        display = [sub for sub in self._subs if sub.coalesce]
+        for dev, st in newest.values():
+            dev.latest = st
+            dev.version += 1
+            self.latest = st
+            for sub in display:
+                sub.push(st)
+        self.version += 1
+        return len(sts) - len(newest)
 
-    def update(self, st: IncubatorStatus):
-        self.latest = st
-        self.history.append(st)
+    def device(self, name: str | None) -> DeviceState | None:
+        """Look up a device by name or unique prefix; None picks the only one."""
+        if name is None:
+            return next(iter(self.devices.values())) if len(self.devices) == 1 else None
+        dev = self.devices.get(name)
+        if dev is not None:
+            return dev
+        matches = [d for n, d in self.devices.items() if n.startswith(name)]
+        return matches[0] if len(matches) == 1 else None
 
-    def can_alert(self, key: str) -> bool:
+    def can_alert(self, key: str, device: str | None = None) -> bool:
+        dev = self.devices.get(device) if device is not None else self.device(None)
+        if dev is None:
+            return False
         now = datetime.utcnow()
-        last = self.last_alert_at.get(key)
+        last = dev.last_alert_at.get(key)
         if not last or (now - last) >= self.cooldown:
-            self.last_alert_at[key] = now
+            dev.last_alert_at[key] = now
             return True
-        return False
\ No newline at end of file
+        return False
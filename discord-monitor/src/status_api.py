@@ -0,0 +1,155 @@
+from __future__ import annotations
+import asyncio, json, logging
+from urllib.parse import unquote
+from .state_cache import StateCache
+from .models import StatusRecord
+from .history import epoch
+from .http_local import read_request, respond, head
+
+log = logging.getLogger(__name__)
+
+PING_SEC = 15.0       # SSE comment to keep idle connections (and proxies) open
+DRAIN_SEC = 10.0      # a client whose send buffer stays full this long is dropped
+
+def encode(st: StatusRecord) -> dict:
+    """Wire form of a status; values rounded so deltas only carry real changes."""
+    r = lambda v: None if v is None else round(v, 3)
+    return {"ts": round(epoch(st.timestamp), 3), "temp_c": r(st.temp_c), "co2_pct": r(st.co2_pct),
+            "o2_pct": r(st.o2_pct), "states": {str(k): bool(v) for k, v in st.states.items()}}
+
+def delta(prev: dict | None, cur: dict) -> dict:
+    """Fields of `cur` that differ from `prev`; states by key (null = removed)."""
+    if prev is None:
+        return cur
+    out = {k: v for k, v in cur.items() if k != "states" and prev.get(k) != v}
+    ps, cs = prev["states"], cur["states"]
+    if ps != cs:
+        out["states"] = {k: v for k, v in cs.items() if ps.get(k) != v}
+        out["states"].update({k: None for k in ps if k not in cs})
+    return out
+
+class StreamClient:
+    __slots__ = ("writer", "pending", "sent", "wake")
+
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.pending: dict[str, dict] = {}   # device -> newest encoded status not yet sent
+        self.sent: dict[str, dict] = {}      # device -> what this client has now
+        self.wake = asyncio.Event()
+
+class StatusAPI:
+    """Local HTTP status API backed by StateCache.
+
+    GET /status            latest status of every device (JSON)
+    GET /status/<device>   one device
+    GET /stream            Server-Sent Events: a `snapshot` event, then `delta`
+                           events with only the fields that changed per device
+
+    Each sample is encoded once and handed to every client's pending map,
+    which keeps only the newest per device, so a slow client gets fewer,
+    larger deltas instead of a growing backlog. Its send buffer is capped at
+    `max_buffer` bytes: once that is full, the client is disconnected if it
+    does not drain within DRAIN_SEC.
+    """
+    def __init__(self, cache: StateCache, max_clients: int = 64, max_buffer: int = 256 * 1024):
+        self.cache = cache
+        self.max_clients = max_clients
+        self.max_buffer = max_buffer
+        self.clients: set[StreamClient] = set()
+        self.counts = {"requests": 0, "streams": 0, "events": 0, "bytes": 0,
+                       "coalesced": 0, "rejected": 0, "slow_dropped": 0}
+
+    async def run(self, host: str = "127.0.0.1", port: int = 8765):
+        hub = asyncio.create_task(self._hub(), name="status-api-hub")
+        server = await asyncio.start_server(self._handle, host, port)
+        log.info("Status API on http://%s:%d/status (stream: /stream)", host, port)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            hub.cancel()
+
+    async def _hub(self):
+        samples = self.cache.subscribe(maxsize=10000)
+        try:
+            while True:
+                st = await samples.get()
+                if not self.clients:
+                    continue
+                enc = encode(st)
+                for c in self.clients:
+                    if st.device in c.pending:
+                        self.counts["coalesced"] += 1
+                    c.pending[st.device] = enc
+                    c.wake.set()
+        finally:
+            self.cache.unsubscribe(samples)
+
+    def _snapshot(self) -> dict[str, dict]:
+        return {name: encode(d.latest) for name, d in self.cache.devices.items() if d.latest is not None}
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.counts["requests"] += 1
+        try:
+            method, path = await read_request(reader)
+            path = unquote(path.split("?", 1)[0]).rstrip("/") or "/"
+            if method != "GET":
+                await respond(writer, "405 Method Not Allowed", "text/plain", b"GET only\n")
+            elif path == "/status":
+                await respond(writer, "200 OK", "application/json", json.dumps(self._snapshot()).encode())
+            elif path.startswith("/status/"):
+                dev = self.cache.devices.get(path[len("/status/"):])
+                if dev is None or dev.latest is None:
+                    await respond(writer, "404 Not Found", "application/json", b'{"error": "unknown device"}')
+                else:
+                    await respond(writer, "200 OK", "application/json", json.dumps(encode(dev.latest)).encode())
+            elif path == "/stream":
+                await self._stream(writer)
+            else:
+                await respond(writer, "404 Not Found", "text/plain", b"try /status, /status/<device> or /stream\n")
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _send(self, c: StreamClient, chunk: bytes):
+        c.writer.write(chunk)
+        self.counts["bytes"] += len(chunk)
+        await asyncio.wait_for(c.writer.drain(), timeout=DRAIN_SEC)
+
+    async def _stream(self, writer: asyncio.StreamWriter):
+        if len(self.clients) >= self.max_clients:
+            self.counts["rejected"] += 1
+            await respond(writer, "503 Service Unavailable", "text/plain", b"too many stream clients\n")
+            return
+        c = StreamClient(writer)
+        self.clients.add(c)
+        self.counts["streams"] += 1
+        writer.transport.set_write_buffer_limits(high=self.max_buffer)   # drain() waits past this
+        try:
+            writer.write(head("200 OK", "text/event-stream", extra="Cache-Control: no-cache\r\n"))
+            c.sent = self._snapshot()
+            c.pending.clear()   # the snapshot already covers anything queued meanwhile
+            await self._send(c, b"event: snapshot\ndata: " + json.dumps(c.sent).encode() + b"\n\n")
+            while True:
+                try:
+                    await asyncio.wait_for(c.wake.wait(), timeout=PING_SEC)
+                except asyncio.TimeoutError:
+                    await self._send(c, b": ping\n\n")
+                    continue
+                c.wake.clear()
+                batch, c.pending = c.pending, {}
+                out = {}
+                for device, enc in batch.items():
+                    d = delta(c.sent.get(device), enc)
+                    c.sent[device] = enc
+                    if d:
+                        out[device] = d
+                if out:
+                    self.counts["events"] += 1
+                    await self._send(c, b"event: delta\ndata: " + json.dumps(out, separators=(",", ":")).encode() + b"\n\n")
+        except asyncio.TimeoutError:
+            self.counts["slow_dropped"] += 1
+            log.info("Dropped a status stream client that stopped reading")
+        finally:
+            self.clients.discard(c)
@@ -0,0 +1,4 @@
+import os, sys
+
+# run from anywhere: the monitor is imported as the `src` package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
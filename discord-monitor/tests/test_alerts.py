@@ -0,0 +1,42 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.alerts import Rule, RuleEngine, Thresholds
+from src.models import StatusRecord
+
+T0 = datetime(2025, 1, 1)
+
+
+def sample(i: int, temp: float, device: str = "a") -> StatusRecord:
+    return StatusRecord(T0 + timedelta(seconds=i), device, temp, 5.0, 20.0, {})
+
+
+def test_threshold_and_custom_rule_on_same_signal_keep_separate_state():
+    engine = RuleEngine([Rule(signal="temp_c", above=38.0, device="a")],
+                        Thresholds(None, 39.0, None, None))
+    fired = engine.observe(sample(0, 38.5))
+    assert [(tr.rule.limit, tr.firing) for tr in fired] == [(38.0, True)]
+    # the threshold rule is not breached and must not resolve the custom one
+    for i in range(1, 5):
+        assert engine.observe(sample(i, 38.5)) == []
+    assert len(engine.active("a")) == 1
+
+    fired = engine.observe(sample(5, 39.5))
+    assert [(tr.rule.limit, tr.firing) for tr in fired] == [(39.0, True)]
+    assert len(engine.active("a")) == 2
+
+
+def test_threshold_rule_key_survives_a_limit_change():
+    th = Thresholds(None, 39.0, None, None)
+    engine = RuleEngine([], th)
+    assert engine.observe(sample(0, 39.5))[0].firing
+    th.t_max = 40.0
+    resolved = engine.observe(sample(1, 38.0))
+    assert [tr.firing for tr in resolved] == [False]
+
+
+def test_duplicate_rule_names_are_rejected():
+    with pytest.raises(ValueError):
+        RuleEngine([Rule(signal="o2_pct", below=1.0, name="O₂ LOW"),
+                    Rule(signal="o2_pct", below=2.0, name="O₂ LOW")])
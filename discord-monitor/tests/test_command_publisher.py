@@ -0,0 +1,60 @@
+import asyncio, json
+
+from asyncio_mqtt import MqttError
+
+from src.mqtt_bus import CommandPublisher
+
+
+class FlakyBroker:
+    """client_factory stand-in: the first connection fails every publish."""
+    def __init__(self):
+        self.connects = 0
+        self.delivered = []
+
+    def client(self, host, port, client_id=None, **auth):
+        self.connects += 1
+        return FlakyClient(self, fail=self.connects == 1)
+
+
+class FlakyClient:
+    def __init__(self, broker, fail):
+        self.broker, self.fail = broker, fail
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def publish(self, topic, payload, qos=0):
+        if self.fail:
+            raise MqttError("connection lost")
+        self.broker.delivered.append((topic, json.loads(payload)["command"]))
+
+
+async def publish_through(broker, commands, queued_for=0.0, **kw):
+    pub = CommandPublisher("broker", 1883, "test", None, None, client_factory=broker.client, **kw)
+    for cmd in commands:
+        assert pub.submit("incubator/command", {"command": cmd})
+    await asyncio.sleep(queued_for)   # e.g. the broker was unreachable
+    task = asyncio.create_task(pub.run())
+    for _ in range(100):
+        await asyncio.sleep(0.01)
+        if len(broker.delivered) + pub.counts["expired"] >= len(commands):
+            break
+    task.cancel()
+    return pub
+
+
+def test_resends_unacknowledged_commands_after_a_reconnect():
+    broker = FlakyBroker()
+    pub = asyncio.run(publish_through(broker, ["purge", "set_co2"]))
+    assert broker.connects == 2
+    assert broker.delivered == [("incubator/command", "purge"), ("incubator/command", "set_co2")]
+    assert (pub.counts["retried"], pub.counts["reconnects"], pub.counts["sent"]) == (2, 1, 2)
+
+
+def test_drops_commands_older_than_max_age():
+    broker = FlakyBroker()
+    pub = asyncio.run(publish_through(broker, ["purge"], queued_for=0.1, max_age=0.05))
+    assert broker.delivered == [] and pub.counts["expired"] == 1
@@ -0,0 +1,20 @@
+from src.discord_bot import parse_window
+from src.history import HistoryRing, RETENTION_SEC
+
+
+def test_series_does_not_pull_older_bucket_into_first_slice():
+    ring = HistoryRing(capacity=4000)
+    t0 = 1030.0   # inside the minute bucket starting at 960
+    for t in range(2000):
+        ring.append(float(t), 30.0 if t < t0 else 37.0, 5.0, 20.0)
+    pts = ring.series("temp_c", t0, t0 + 480, points=4)   # 2 min slices: served by the minute rollup
+    assert all(p is not None and p[1] == 37.0 for p in pts)
+
+
+def test_parse_window():
+    assert parse_window("90m") == 5400
+    assert parse_window("1.5d") == 1.5 * 86400
+    assert parse_window("6") == 6 * 3600
+    for bad in ("inf", "nanh", "-infd", "1e400s", "soon"):
+        assert parse_window(bad) is None
+    assert parse_window("31d") <= RETENTION_SEC < parse_window("32d")
@@ -0,0 +1,92 @@
+import logging, time
+from datetime import datetime, timedelta
+
+from src import snapshot
+from src.alerts import RuleEngine, Thresholds
+from src.history import epoch
+from src.models import StatusRecord
+from src.state_cache import StateCache
+
+# source/chamber.py: the header, the handler's formatter and the row format
+CSV_HEADER = "timestamp,temp_c,o2_pct,co2_pct,heater_state,o2_state,co2_state\n"
+CSV_FORMAT = logging.Formatter('%(asctime)s,%(message)s')
+ROW = "%.2f,%.2f,%.2f,%s,%s,%s"
+
+
+def write_chamber_csv(path, rows):
+    """rows: (unix time, temp, o2, co2, heater, o2 valve, co2 valve) as Chamber logs them."""
+    with open(path, "w") as f:
+        f.write(CSV_HEADER)
+        for t, temp, o2, co2, *states in rows:
+            rec = logging.LogRecord("incubator.data.main", logging.INFO, __file__, 0, ROW,
+                                    (temp, o2, co2, *("ON" if s else "OFF" for s in states)), None)
+            rec.created, rec.msecs = t, (t % 1) * 1000
+            f.write(CSV_FORMAT.format(rec) + "\n")
+
+
+def test_snapshot_round_trip(tmp_path):
+    cache = StateCache(history_samples=100)
+    t0 = datetime.utcnow().replace(microsecond=0) - timedelta(minutes=5)
+    for i in range(150):   # wraps the ring
+        cache.update(StatusRecord(t0 + timedelta(seconds=i), "a", 37.0 + i / 100, 5.0, 20.0,
+                                  {"heater": i % 2 == 0}))
+    cache.update(StatusRecord(t0, "b", 36.5, None, None, {}))
+    cache.can_alert("threshold:above:temp_c", "a")
+    engine = RuleEngine([], Thresholds(None, 38.0, None, None))
+    for d in cache.devices.values():
+        engine.observe(d.latest)
+    assert engine.active("a")
+
+    path = str(tmp_path / "cache.snapshot")
+    snapshot.save(cache, path, engine)
+
+    restored, engine2 = StateCache(history_samples=100), RuleEngine([], Thresholds(None, 38.0, None, None))
+    assert snapshot.restore(restored, path, engine2)
+    assert set(restored.devices) == {"a", "b"}
+    a, a2 = cache.devices["a"], restored.devices["a"]
+    assert list(a2.history.rows()) == list(a.history.rows())
+    assert len(a2.history) == 100
+    assert a2.latest.temp_c == a.latest.temp_c and a2.latest.timestamp == a.latest.timestamp
+    assert a2.latest.states == {"heater": False}
+    assert restored.devices["b"].latest.co2_pct is None
+    assert a2.last_alert_at == a.last_alert_at
+    assert engine2.active("a") == engine.active("a")
+    # already notified before the restart: the same sample does not fire again
+    assert engine2.observe(a2.latest) == []
+
+
+def test_restore_rejects_garbage(tmp_path):
+    path = tmp_path / "cache.snapshot"
+    path.write_bytes(b"not a snapshot")
+    cache = StateCache()
+    assert not snapshot.restore(cache, str(path))
+    assert not cache.devices
+
+
+def test_backfill_from_chamber_csv(tmp_path):
+    now = time.time()
+    path = tmp_path / "incubator_data.csv"
+    old = [(now - 7200 + i, 36.0, 5.0, 5.0, True, False, False) for i in range(3)]
+    recent = [(now - 60 + i, 37.0 + i / 10, 4.5, 5.5, i == 2, False, True) for i in range(3)]
+    write_chamber_csv(path, old + recent)
+
+    cache = StateCache()
+    assert snapshot.backfill_csv(cache, str(path), "main", max_age_sec=3600) == 3
+    dev = cache.devices["main"]
+    assert [round(r[1], 2) for r in dev.history.rows()] == [37.0, 37.1, 37.2]
+    assert abs(epoch(dev.latest.timestamp) - recent[-1][0]) < 0.01
+    assert (dev.latest.temp_c, dev.latest.o2_pct, dev.latest.co2_pct) == (37.2, 4.5, 5.5)
+    assert dev.latest.states == {"heater": True, "o2": False, "co2": True}
+    # nothing new: a second pass adds nothing
+    assert snapshot.backfill_csv(cache, str(path), "main", max_age_sec=3600) == 0
+
+
+def test_backfill_logs_rows_with_another_layout(tmp_path, caplog):
+    path = tmp_path / "incubator_data.csv"
+    write_chamber_csv(path, [(time.time() - 10, 37.0, 5.0, 5.0, True, False, False)])
+    with open(path, "a") as f:
+        f.write("2025-06-11 14:42:33,900,37.00,5.00,5.00,ON,OFF,OFF,12.5\n")
+    cache = StateCache()
+    with caplog.at_level(logging.WARNING, logger="src.snapshot"):
+        assert snapshot.backfill_csv(cache, str(path), "main") == 1
+    assert "9 column(s) instead of 8" in caplog.text
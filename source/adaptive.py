@@ -0,0 +1,87 @@
+# adaptive.py
+#
+# Adaptive acquisition: chooses how often a chamber polls its sensors and
+# writes log rows from how stable the filtered signals are. Control ticks
+# (heater PWM, valve micro-pulses) keep running every `read_interval`; only
+# sensor reads, display refreshes and log rows are thinned out.
+#
+#   disturbed (any |slope| over its limit, or a value out of band)
+#       -> fast periods immediately
+#   stable for `hold_s`
+#       -> periods double each `hold_s` until they reach the slow ceiling
+
+import logging
+
+logger = logging.getLogger("incubator.adaptive")
+
+# signal name -> setpoint key
+SETPOINT_KEYS = {'temp': 'temperature', 'o2': 'o2', 'co2': 'co2'}
+
+
+class AdaptiveRate:
+    def __init__(self, cfg, read_interval, label=""):
+        self.label      = label
+        self.fast_s     = float(cfg.get('fast_s', read_interval))
+        self.slow_s     = float(cfg.get('slow_s', 5.0))
+        self.log_fast_s = float(cfg.get('log_fast_s', self.fast_s))
+        self.log_slow_s = float(cfg.get('log_slow_s', 30.0))
+        self.hold_s     = float(cfg.get('hold_s', 300.0))
+        self.slope_max  = dict({'temp': 0.02, 'o2': 0.02, 'co2': 0.02}, **cfg.get('slope', {}))
+        self.band       = dict({'temp': 0.01, 'o2': 0.15, 'co2': 0.10}, **cfg.get('band', {}))
+        if not 0 < self.fast_s <= self.slow_s:
+            raise ValueError("adaptive: need 0 < fast_s <= slow_s")
+        if not 0 < self.log_fast_s <= self.log_slow_s:
+            raise ValueError("adaptive: need 0 < log_fast_s <= log_slow_s")
+
+        self.sample_period = self.fast_s
+        self.log_period    = self.log_fast_s
+        self.stable_since  = None
+        self.last_step     = None
+        self.reason        = "startup"
+
+    @property
+    def fast(self):
+        return self.sample_period <= self.fast_s
+
+    def disturbance(self, filters, setpoints):
+        """Return why the chamber is unsettled, or None if it is stable."""
+        for name, key in SETPOINT_KEYS.items():
+            f = filters[name]
+            if f.value is None:
+                return "no data"
+            if abs(f.slope) > self.slope_max[name]:
+                return f"{name} slope {f.slope:+.3f}/s"
+            # raw, not smoothed: a median would hide the first samples of a door opening
+            sp = setpoints[key]
+            if abs(f.raw - sp) > self.band[name] * sp:
+                return f"{name} {f.raw:.2f} out of band"
+        return None
+
+    def update(self, now, filters, setpoints):
+        """Re-evaluate after a new sample; returns True if the mode changed."""
+        reason = self.disturbance(filters, setpoints)
+        if reason is not None:
+            self.stable_since = None
+            self.reason = reason
+            if not self.fast:
+                logger.info("%sDisturbance (%s): sampling every %.1fs",
+                            self.label, reason, self.fast_s)
+                self.sample_period, self.log_period = self.fast_s, self.log_fast_s
+                return True
+            return False
+
+        if self.stable_since is None:
+            self.stable_since = self.last_step = now
+            self.reason = "settling"
+            return False
+        at_ceiling = self.sample_period >= self.slow_s and self.log_period >= self.log_slow_s
+        if at_ceiling or now - self.last_step < self.hold_s:
+            return False
+        # stable for another hold period: back off one step
+        self.last_step = now
+        self.reason = "stable"
+        self.sample_period = min(self.sample_period * 2, self.slow_s)
+        self.log_period    = min(self.log_period * 2, self.log_slow_s)
+        logger.info("%sStable for %.0fs: sampling every %.1fs, logging every %.1fs",
+                    self.label, now - self.stable_since, self.sample_period, self.log_period)
+        return True
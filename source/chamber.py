@@ -0,0 +1,349 @@
+# chamber.py
+#
+# One incubator: its sensors, controllers, GPIO pins, displays and data log.
+# The Engine (engine.py) ticks any number of these from one process.
+
+import os, logging
+from logging.handlers import TimedRotatingFileHandler
+import RPi.GPIO as GPIO
+
+from sensors import OneWireTemps, SerialGas, SensorSupervisor
+from controllers import HeaterController, GasController
+from display import DisplaySupervisor
+from filters import FilterBank
+from adaptive import AdaptiveRate
+from recovery import DoorRecovery
+from dosing import DoseEngine
+from usage import UsageLedger
+from config_watch import chamber_pins
+
+logger = logging.getLogger("incubator")
+
+CSV_HEADER = "timestamp,temp_c,o2_pct,co2_pct,heater_state,o2_state,co2_state\n"
+
+
+class Chamber:
+    def __init__(self, name, cfg, i2c=None, label=None):
+        self.name     = name
+        self.cfg      = cfg
+        self.label    = label if label is not None else f"[{name}] "
+        self.pins     = chamber_pins(cfg)
+        self.interval = cfg['read_interval']
+        self.reading  = None    # (temp, o2, co2) from the last tick, filtered
+        self.raw      = None    # same, straight from the sensors
+
+        # GPIO base mode & ensure everything off
+        for p in self.pins:
+            GPIO.setup(p, GPIO.OUT)
+            GPIO.output(p, GPIO.LOW)
+
+        self.sensors     = self._make_sensors(cfg)
+        self.controllers = self._make_controllers(cfg)
+        self.usage       = self._make_usage(cfg)
+        self.displays    = self._make_displays(cfg, i2c)
+        self.data_logger = self._make_data_logger(cfg)
+        # streaming filters between sensors and consumers (opt-in: they change
+        # the controllers' input). Without them, a pass-through bank still
+        # gives adaptive/recovery their slopes on raw readings.
+        fcfg = cfg.get('filters') or {}
+        self.filters     = FilterBank(fcfg) if fcfg.get('enabled') else None
+
+        # adaptive sensor/log rates; needs the filters' slopes
+        self.adaptive    = None
+        if (cfg.get('adaptive') or {}).get('enabled'):
+            if self.filters is None:
+                self.filters = FilterBank({'method': 'none'})
+            self.adaptive = AdaptiveRate(cfg['adaptive'], self.interval, self.label)
+
+        # door-open detection + recovery profile; also needs the slopes
+        self.recovery    = None
+        if (cfg.get('recovery') or {}).get('enabled'):
+            if self.filters is None:
+                self.filters = FilterBank({'method': 'none'})
+            self.recovery = DoorRecovery(cfg['recovery'],
+                                         os.path.dirname(cfg['log_file']) or ".", self.label)
+        self.next_read   = 0.0
+        self.next_log    = 0.0
+        self.last_bands  = None
+
+    # ---------- construction ----------
+    def _make_sensors(self, cfg):
+        baud = cfg['serial']['baud']
+        return {
+            'temp': OneWireTemps(cfg.get('onewire_ids')),
+            'o2': SensorSupervisor(
+                SerialGas,
+                max_failures=3,
+                port  = cfg['serial']['o2_port'],
+                cmd   = cfg['serial']['o2_cmd'],
+                scale = cfg['serial']['o2_scale'],
+                baud  = baud
+            ),
+            'co2': SensorSupervisor(
+                SerialGas,
+                max_failures=3,
+                port  = cfg['serial']['co2_port'],
+                cmd   = cfg['serial']['co2_cmd'],
+                scale = cfg['serial']['co2_scale'],
+                baud  = baud
+            )
+        }
+
+    def _make_controllers(self, cfg):
+        dosing = self._make_dosing(cfg)
+        return {
+            'heater': HeaterController(
+                cfg['gpio']['heaters'],
+                cfg['setpoints']['temperature'],
+                cfg['thresholds']['temperature'],
+                cfg['pid']['heater']
+            ),
+            'o2': GasController(
+                cfg['gpio']['o2_pin'],
+                cfg['setpoints']['o2'],
+                cfg['thresholds']['o2'],
+                invert=True,
+                dosing=dosing['o2']
+            ),
+            'co2': GasController(
+                cfg['gpio']['co2_pin'],
+                cfg['setpoints']['co2'],
+                cfg['thresholds']['co2'],
+                invert=False,
+                pulse_on_s=0.10,          # 100 ms micro-pulse
+                settle_s=6.0,             # 6 s wait before next pulse
+                startup_soft_secs=120,    # first 2 min = conservative
+                startup_pulse_on_s=0.06,  # 60 ms pulse at startup
+                startup_settle_s=8.0,     # 8 s wait at startup
+                rise_suppression=0.20,    # stop dosing if rising >0.2 %/s
+                dosing=dosing['co2']
+            )
+        }
+
+    def _make_dosing(self, cfg):
+        # model-based pulse timing per gas (off without `dosing: enabled`)
+        dcfg = cfg.get('dosing') or {}
+        engines = {'o2': None, 'co2': None}
+        if not dcfg.get('enabled'):
+            return engines
+        shared = {k: v for k, v in dcfg.items() if k not in ('enabled', 'o2', 'co2')}
+        flows  = (cfg.get('usage') or {}).get('flow_lpm') or {}
+        for gas in engines:
+            gcfg = dict(shared, **(dcfg.get(gas) or {}))
+            if 'flow_lpm' not in gcfg and gas in flows:
+                gcfg['flow_lpm'] = flows[gas]
+            engines[gas] = DoseEngine(gas, gcfg, invert=(gas == 'o2'), label=self.label)
+        return engines
+
+    def _make_usage(self, cfg):
+        # valve/heater duty ledger, persisted next to the chamber's logs
+        ucfg = cfg.get('usage') or {}
+        if not ucfg.get('enabled'):
+            return None
+        log_dir = os.path.dirname(cfg['log_file']) or "."
+        os.makedirs(log_dir, exist_ok=True)
+        channels = ['o2', 'co2'] + [f"heater_{p}" for p in cfg['gpio']['heaters']]
+        return UsageLedger(ucfg, channels, os.path.join(log_dir, "usage.json"), self.label)
+
+    def _make_displays(self, cfg, i2c):
+        displays = {'o2': None, 'co2': None, 'temp': None}
+        if i2c is None or not cfg.get('i2c'):
+            return displays
+        for key, addr_key in (('o2', 'disp_o2'), ('co2', 'disp_co2'), ('temp', 'disp_temp')):
+            addr = cfg['i2c'].get(addr_key)
+            if addr is None:
+                continue
+            try:
+                displays[key] = DisplaySupervisor(i2c, addr)
+            except Exception:
+                # one missing display must not take the other chambers down
+                logger.exception("%sdisplay %s @0x%x unavailable", self.label, key, addr)
+        return displays
+
+    def _make_data_logger(self, cfg):
+        # CSV data log (daily rotation), alongside the chamber's text log
+        log_dir = os.path.dirname(cfg['log_file']) or "."
+        os.makedirs(log_dir, exist_ok=True)
+        csv_path = os.path.join(log_dir, "incubator_data.csv")
+
+        csv_handler = TimedRotatingFileHandler(
+            csv_path, when="midnight", interval=1, backupCount=14
+        )
+        csv_handler.setFormatter(logging.Formatter('%(asctime)s,%(message)s'))
+        data_logger = logging.getLogger(f"incubator.data.{self.name}")
+        data_logger.setLevel(logging.INFO)
+        data_logger.propagate = False
+        data_logger.handlers.clear()
+        data_logger.addHandler(csv_handler)
+
+        # Ensure header on first write / after rotation
+        try:
+            if not os.path.exists(csv_path) or os.stat(csv_path).st_size == 0:
+                with open(csv_path, "a") as f:
+                    f.write(CSV_HEADER)
+        except Exception:
+            logger.exception("Failed to ensure CSV header")
+        return data_logger
+
+    # ---------- runtime ----------
+    def status(self):
+        """Latest reading and outputs, as published on the MQTT status topic."""
+        if self.reading is None:
+            return None
+        r = lambda v: None if v is None else round(v, 3)
+        t, o, c = self.reading
+        ctrl = self.controllers
+        # gas_units: already percent, so the monitor skips its fraction guess
+        out = {"temp_c": r(t), "o2_pct": r(o), "co2_pct": r(c), "gas_units": "percent",
+               "states": {"heater":    ctrl['heater'].state == GPIO.HIGH,
+                          "o2_valve":  ctrl['o2'].last_state == GPIO.HIGH,
+                          "co2_valve": ctrl['co2'].last_state == GPIO.HIGH}}
+        if self.recovery is not None and self.recovery.event is not None:
+            out["recovery"] = self.recovery.phase or "settling"
+        if self.usage is not None:
+            out["usage"] = self.usage.status()
+        return out
+
+    def setpoints(self):
+        # live targets: a remote set_* command changes these, not self.cfg
+        c = self.controllers
+        return {'temperature': c['heater'].setpt, 'o2': c['o2'].setpt, 'co2': c['co2'].setpt}
+
+    def tick(self, now):
+        sensors, controllers = self.sensors, self.controllers
+
+        adaptive = self.adaptive
+        fresh = adaptive is None or now >= self.next_read or self.reading is None
+        if fresh:
+            # 1) read sensors
+            t = sensors['temp'].read()
+            o = sensors['o2'].read()
+            c = sensors['co2'].read()
+            self.raw = (t, o, c)
+
+            # 2) smooth; controllers get the filtered value and slope
+            filters = self.filters
+            if filters is not None:
+                t = filters.push('temp', t, now)
+                o = filters.push('o2',   o, now)
+                c = filters.push('co2',  c, now)
+            self.reading = (t, o, c)
+
+            if adaptive is not None:
+                if adaptive.update(now, filters, self.setpoints()):
+                    self.next_log = now   # record the mode switch
+                self.next_read = now + adaptive.sample_period
+        else:
+            # between adaptive reads the controllers keep ticking on the last sample
+            t, o, c = self.reading
+
+        o_rate = c_rate = None
+        if self.filters is not None:
+            o_rate, c_rate = self.filters['o2'].slope, self.filters['co2'].slope
+
+        # 3) control; a door-open recovery overrides the band logic while
+        #    active (but not a remote override on a channel)
+        recovery = self.recovery
+        if recovery is not None and fresh:
+            recovery.update(now, self.filters, self.reading, controllers)
+        phase = recovery.phase if recovery is not None else None
+
+        heater = controllers['heater']
+        heater.update(t, now, recovery.heater_boost(t, heater) if recovery is not None else 0.0)
+
+        o2_ctrl, co2_ctrl = controllers['o2'], controllers['co2']
+        if phase == 'purge' and o2_ctrl.mode == 'auto':
+            o2_ctrl.force_on()
+        else:
+            o2_ctrl.update(o, now, o_rate)
+
+        if phase == 'purge' or o2_ctrl.is_continuous(o) or o2_ctrl.is_forced_on():
+            co2_ctrl.force_off()
+        elif phase == 'backfill' and co2_ctrl.mode == 'auto':
+            if recovery.backfill_open(c, c_rate, co2_ctrl):
+                co2_ctrl.force_on()
+            else:
+                co2_ctrl.force_off()   # let the gas already in flight reach the sensor
+        else:
+            co2_ctrl.update(c, now, c_rate)
+
+        # valve-open time and model fit for the dosing comparison
+        for ctrl, val in ((o2_ctrl, o), (co2_ctrl, c)):
+            if ctrl.dosing is not None:
+                ctrl.dosing.tick(now, ctrl.last_state == GPIO.HIGH,
+                                 val if fresh else None, ctrl.setpt)
+        if self.usage is not None:
+            on = heater.state == GPIO.HIGH
+            states = {f"heater_{p}": on for p in heater.pins}
+            states['o2']  = o2_ctrl.last_state == GPIO.HIGH
+            states['co2'] = co2_ctrl.last_state == GPIO.HIGH
+            self.usage.tick(now, states)
+
+        if not fresh:
+            return
+
+        # 4) 7-segment safe updates
+        for key, disp in self.displays.items():
+            if not disp:
+                continue
+            val = {'o2': o, 'co2': c, 'temp': t}[key]
+            try:
+                disp.safe_print(f"{val:05.2f}")
+            except Exception:
+                self.displays[key] = None
+
+        self.log(t, o, c, now)
+
+    def log(self, t, o, c, now):
+        # text log shows what the controllers acted on; the CSV keeps raw samples
+        controllers = self.controllers
+        heater_duty = controllers['heater'].duty
+
+        def gas_state(ctrl, val):
+            if ctrl.is_continuous(val):
+                return "CONT"
+            pulse = (val > ctrl.setpt * ctrl.th_puls) if ctrl.invert else (val < ctrl.setpt * ctrl.th_puls)
+            return "PULSE" if pulse else "OFF"
+
+        o2_state  = gas_state(controllers['o2'],  o)
+        co2_state = gas_state(controllers['co2'], c)
+
+        # adaptive mode: one row per log period, plus any band change
+        if self.adaptive is not None:
+            bands = (o2_state, co2_state)
+            if now < self.next_log and bands == self.last_bands:
+                return
+            self.last_bands = bands
+            self.next_log = now + self.adaptive.log_period
+
+        logger.info(
+            "%sDATA T=%.2fC O2=%.2f%% CO2=%.2f%% HeaterDuty=%.2f O2=%s CO2=%s",
+            self.label, t, o, c, heater_duty, o2_state, co2_state
+        )
+
+        # --- Structured logging for plotting ---
+        try:
+            heater_state = "ON" if GPIO.input(self.cfg['gpio']['heaters'][0]) == GPIO.HIGH else "OFF"
+        except Exception:
+            heater_state = "OFF"  # safe default if pin list empty
+
+        o2_state_txt  = "ON" if GPIO.input(self.cfg['gpio']['o2_pin'])  == GPIO.HIGH else "OFF"
+        co2_state_txt = "ON" if GPIO.input(self.cfg['gpio']['co2_pin']) == GPIO.HIGH else "OFF"
+
+        # Human-readable log line (unchanged style)
+        logger.info(
+            "%sDATA T=%.2fC O2=%.2f%% CO2=%.2f%% Heater=%s O2=%s CO2=%s",
+            self.label, t, o, c, heater_state, o2_state_txt, co2_state_txt
+        )
+
+        # CSV row (timestamp comes from handler’s formatter)
+        self.data_logger.info(
+            "%.2f,%.2f,%.2f,%s,%s,%s",
+            *self.raw, heater_state, o2_state_txt, co2_state_txt
+        )
+
+    def all_off(self):
+        for p in self.pins:
+            GPIO.output(p, GPIO.LOW)
+        if self.usage is not None:
+            self.usage.save()
@@ -0,0 +1,244 @@
+# commands.py
+#
+# Remote command ingestion. A background MQTT subscriber queues commands
+# published by the Discord monitor (`/control`) and the control loop applies
+# them between ticks, so nothing here ever blocks regulation. The same
+# connection publishes each chamber's status for the monitor to read.
+
+import json, time, queue, logging
+from datetime import datetime, timezone
+
+try:
+    import paho.mqtt.client as mqtt  # optional; remote control disabled without it
+except Exception:  # pragma: no cover
+    mqtt = None
+
+logger = logging.getLogger("incubator.commands")
+
+SETPOINT_KEYS = {'set_temp': ('heater', 'temperature'),
+                 'set_o2':   ('o2',     'o2'),
+                 'set_co2':  ('co2',    'co2')}
+MODE_KEYS     = {'mode_heater': 'heater', 'mode_o2': 'o2', 'mode_co2': 'co2'}
+MODES         = ('auto', 'off', 'on')
+REFILL_KEYS   = {'co2': 'co2', 'n2': 'o2', 'o2': 'o2'}   # cylinder -> valve channel
+
+
+class CommandError(ValueError):
+    pass
+
+
+def _parse_ts(ts):
+    """Sender timestamps are naive UTC isoformat (datetime.utcnow())."""
+    if not isinstance(ts, str):
+        return None
+    try:
+        dt = datetime.fromisoformat(ts)
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+class CommandListener:
+    def __init__(self, mqtt_cfg):
+        self.host          = mqtt_cfg.get('host', 'localhost')
+        self.port          = int(mqtt_cfg.get('port', 1883))
+        self.username      = mqtt_cfg.get('username')
+        self.password      = mqtt_cfg.get('password')
+        self.client_id     = mqtt_cfg.get('client_id', 'incubator')
+        self.command_topic = mqtt_cfg.get('command_topic', 'incubator/command')
+        self.ack_topic     = mqtt_cfg.get('ack_topic', 'incubator/command/ack')
+        self.max_override_s = float(mqtt_cfg.get('max_override_s', 600))
+        self.max_command_age_s = float(mqtt_cfg.get('max_command_age_s', 120))
+        self.status_topic  = mqtt_cfg.get('status_topic', 'incubator/status')
+        self.status_s      = float(mqtt_cfg.get('status_s', 5))
+        self.next_status   = 0.0
+        self.pending       = queue.Queue(maxsize=100)
+        self.client        = None
+
+    # ---------- background subscriber (paho network thread) ----------
+    def start(self):
+        if mqtt is None:
+            logger.warning("paho-mqtt not installed; remote commands disabled")
+            return False
+        if hasattr(mqtt, 'CallbackAPIVersion'):   # paho-mqtt >= 2.0
+            self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=self.client_id)
+        else:
+            self.client = mqtt.Client(client_id=self.client_id)
+        if self.username:
+            self.client.username_pw_set(self.username, self.password)
+        self.client.on_connect = self._on_connect
+        self.client.on_message = self._on_message
+        self.client.reconnect_delay_set(min_delay=1, max_delay=60)
+        self.client.connect_async(self.host, self.port, keepalive=30)
+        self.client.loop_start()
+        logger.info("Command listener on %s:%d topic %s", self.host, self.port, self.command_topic)
+        return True
+
+    def stop(self):
+        if self.client is not None:
+            self.client.loop_stop()
+            self.client.disconnect()
+            self.client = None
+
+    def _on_connect(self, client, userdata, *args):
+        client.subscribe(self.command_topic, qos=1)
+
+    def _on_message(self, client, userdata, msg):
+        received = time.time()
+        try:
+            payload = json.loads(msg.payload.decode())
+            if not isinstance(payload, dict):
+                raise ValueError("payload is not an object")
+        except Exception as e:
+            logger.warning("Bad command payload: %s", e)
+            return
+        try:
+            self.pending.put_nowait((payload, received))
+        except queue.Full:
+            self._ack(payload, received, ok=False, error="command queue full")
+
+    # ---------- applied from the control loop ----------
+    def apply_pending(self, chambers, now):
+        """Drain queued commands without blocking.
+
+        chambers: {name: Chamber}; a command names its target with "chamber",
+        which may be omitted when only one chamber runs. `now` is the engine clock.
+        """
+        while True:
+            try:
+                payload, received = self.pending.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                self._check_age(payload, received)
+                detail = self._apply(payload, self._target(payload, chambers), now)
+                logger.info("Command %s=%s applied (%s)", payload.get('command'), payload.get('value'), detail)
+                self._ack(payload, received, ok=True, detail=detail)
+            except CommandError as e:
+                logger.warning("Command %s rejected: %s", payload.get('command'), e)
+                self._ack(payload, received, ok=False, error=str(e))
+            except Exception as e:
+                logger.exception("Command %s failed", payload.get('command'))
+                self._ack(payload, received, ok=False, error=str(e))
+
+    def _check_age(self, payload, received):
+        # a command delayed by a broker outage must not fire hours later
+        sent = _parse_ts(payload.get('ts'))
+        if sent is not None and self.max_command_age_s > 0 and received - sent > self.max_command_age_s:
+            raise CommandError(f"stale command ({received - sent:.0f}s old, limit {self.max_command_age_s:.0f}s)")
+
+    def _target(self, payload, chambers):
+        name = payload.get('chamber')
+        if name is None:
+            if len(chambers) != 1:
+                raise CommandError(f"name a chamber: {', '.join(chambers)}")
+            return next(iter(chambers.values()))
+        if name not in chambers:
+            raise CommandError(f"unknown chamber {name!r}")
+        return chambers[name]
+
+    def _apply(self, payload, chamber, now):
+        controllers = chamber.controllers
+        cmd = str(payload.get('command') or '').strip().lower()
+        val = payload.get('value')
+
+        if cmd in SETPOINT_KEYS:
+            ctrl_key, max_key = SETPOINT_KEYS[cmd]
+            try:
+                v = float(val)
+            except (TypeError, ValueError):
+                raise CommandError(f"{cmd} needs a number, got {val!r}")
+            hi = float(chamber.cfg['max_values'][max_key])
+            if not 0.0 < v <= hi:
+                raise CommandError(f"{cmd} {v} outside (0, {hi}]")
+            controllers[ctrl_key].set_setpoint(v)
+            return f"setpoint={v}"
+
+        if cmd == 'purge':
+            # N₂ valve fully open for N seconds, then back to automatic control
+            secs = self._duration(val, cmd)
+            controllers['o2'].set_mode('on', now, secs)
+            return f"purge {secs:.0f}s"
+
+        if cmd in MODE_KEYS:
+            parts = str(val or '').split()
+            mode = parts[0].lower() if parts else ''
+            if mode not in MODES:
+                raise CommandError(f"{cmd} needs one of {'/'.join(MODES)}")
+            ctrl = controllers[MODE_KEYS[cmd]]
+            if mode == 'on':
+                if cmd == 'mode_heater':
+                    raise CommandError("heater cannot be forced on")
+                # forcing a valve open always expires
+                secs = self._duration(parts[1] if len(parts) > 1 else None, cmd)
+                ctrl.set_mode(mode, now, secs)
+                return f"mode=on {secs:.0f}s"
+            ctrl.set_mode(mode, now)
+            return f"mode={mode}"
+
+        if cmd in ('refill', 'usage'):
+            if chamber.usage is None:
+                raise CommandError("usage accounting is not enabled")
+            if cmd == 'usage':
+                return chamber.usage.summary()
+            gas = REFILL_KEYS.get(str(val or '').strip().lower())
+            if gas is None:
+                raise CommandError("refill needs co2 or n2")
+            used = chamber.usage.mark_refill(gas)
+            return f"refill {gas} ({used:.0f} L drawn from the old cylinder)"
+
+        raise CommandError(f"unknown command {cmd!r}")
+
+    def _duration(self, val, cmd):
+        try:
+            secs = float(val)
+        except (TypeError, ValueError):
+            raise CommandError(f"{cmd} needs a duration in seconds")
+        if not 0.0 < secs <= self.max_override_s:
+            raise CommandError(f"{cmd} duration must be in (0, {self.max_override_s:.0f}] s")
+        return secs
+
+    # ---------- status out (from the control loop) ----------
+    def publish_status(self, chambers, now):
+        """Every `status_s`, publish each chamber's status to
+        <status_topic>/<name>. paho only queues it for its network thread."""
+        if self.client is None or self.status_s <= 0 or now < self.next_status:
+            return
+        self.next_status = now + self.status_s
+        ts = datetime.utcnow().isoformat()
+        for ch in chambers:
+            status = ch.status()
+            if status is None:
+                continue
+            status["timestamp"] = ts
+            try:
+                self.client.publish(f"{self.status_topic}/{ch.name}", json.dumps(status), qos=0)
+            except Exception:
+                logger.exception("Failed to publish status")
+
+    def _ack(self, payload, received, ok, detail=None, error=None):
+        if self.client is None:
+            return
+        acked = time.time()
+        sent = _parse_ts(payload.get('ts'))
+        ack = {
+            "command": payload.get('command'),
+            "value":   payload.get('value'),
+            "chamber": payload.get('chamber'),
+            "id":      payload.get('id', payload.get('ts')),
+            "ok":      ok,
+            "detail":  detail,
+            "error":   error,
+            "ts":      datetime.utcnow().isoformat(),
+            "latency_ms": {
+                "transit": round((received - sent) * 1000, 1) if sent else None,
+                "queued":  round((acked - received) * 1000, 1),
+                "total":   round((acked - sent) * 1000, 1) if sent else None,
+            },
+        }
+        try:
+            self.client.publish(self.ack_topic, json.dumps(ack), qos=1)
+        except Exception:
+            logger.exception("Failed to publish ack")
@@ -0,0 +1,239 @@
+# config_watch.py
+#
+# Hot-reload of config.yaml. A background thread watches the file (inotify,
+# with a stat() fallback), validates every new version, and hands it to the
+# control loop, which applies the differences to the running controllers in
+# place. Nothing is re-initialised, so GPIO state, the CO₂ startup window and
+# the heater PID integrator survive a tuning change.
+
+import os, time, threading, logging
+import yaml
+
+try:
+    from inotify_simple import INotify, flags  # optional; falls back to stat polling
+except Exception:  # pragma: no cover
+    INotify = None
+
+logger = logging.getLogger("incubator.config")
+
+# Sections that can change while running. Everything else (gpio, serial, i2c,
+# log paths, mqtt) is bound to hardware or threads and needs a restart.
+RELOADABLE = ('setpoints', 'thresholds', 'pid', 'max_values', 'read_interval')
+
+
+class ConfigError(ValueError):
+    pass
+
+
+def _num(cfg, *path, positive=False):
+    cur = cfg
+    for k in path:
+        if not isinstance(cur, dict) or k not in cur:
+            raise ConfigError(f"missing {'.'.join(path)}")
+        cur = cur[k]
+    if isinstance(cur, bool) or not isinstance(cur, (int, float)):
+        raise ConfigError(f"{'.'.join(path)} must be a number, got {cur!r}")
+    if positive and cur <= 0:
+        raise ConfigError(f"{'.'.join(path)} must be > 0")
+    return float(cur)
+
+
+def _merge(base, override):
+    out = dict(base)
+    for k, v in override.items():
+        if isinstance(v, dict) and isinstance(out.get(k), dict):
+            out[k] = _merge(out[k], v)
+        else:
+            out[k] = v
+    return out
+
+
+def chamber_configs(cfg):
+    """Split a config into per-chamber configs, keyed by chamber name.
+
+    Without a `chambers:` list the file describes a single chamber. With one,
+    the top-level sections are defaults and each entry overrides them (pins,
+    ports, displays, setpoints, ...). Each chamber logs into its own
+    sub-directory next to the top-level `log_file` unless it sets one.
+    """
+    entries = cfg.get('chambers')
+    if not entries:
+        return {cfg.get('name', 'main'): cfg}
+    base = {k: v for k, v in cfg.items() if k != 'chambers'}
+    out = {}
+    for entry in entries:
+        if not isinstance(entry, dict) or not entry.get('name'):
+            raise ConfigError("every chambers entry needs a name")
+        name = str(entry['name'])
+        if name in out:
+            raise ConfigError(f"duplicate chamber name {name!r}")
+        merged = _merge(base, entry)
+        if 'log_file' not in entry:
+            log_file = base.get('log_file', 'metrics_regulation_log.txt')
+            merged['log_file'] = os.path.join(os.path.dirname(log_file), name,
+                                              os.path.basename(log_file))
+        out[name] = merged
+    return out
+
+
+def validate(cfg):
+    """Raise ConfigError if any chamber in `cfg` cannot safely run."""
+    if not isinstance(cfg, dict):
+        raise ConfigError("config is not a mapping")
+    used = {}
+    for name, ccfg in chamber_configs(cfg).items():
+        try:
+            validate_chamber(ccfg)
+        except ConfigError as e:
+            raise ConfigError(f"chamber {name}: {e}")
+        for pin in chamber_pins(ccfg):
+            if pin in used:
+                raise ConfigError(f"GPIO {pin} used by both {used[pin]} and {name}")
+            used[pin] = name
+    return cfg
+
+
+def chamber_pins(ccfg):
+    gpio = ccfg['gpio']
+    return list(gpio['heaters']) + [gpio['o2_pin'], gpio['co2_pin']]
+
+
+def validate_chamber(cfg):
+    if not isinstance(cfg.get('gpio'), dict):
+        raise ConfigError("missing gpio")
+    _num(cfg, 'read_interval', positive=True)
+    for key in ('temperature', 'o2', 'co2'):
+        sp = _num(cfg, 'setpoints', key, positive=True)
+        hi = _num(cfg, 'max_values', key, positive=True)
+        if sp > hi:
+            raise ConfigError(f"setpoints.{key} {sp} above max_values.{key} {hi}")
+    _num(cfg, 'thresholds', 'temperature', positive=True)
+    for gas in ('o2', 'co2'):
+        cont, puls, stop = (_num(cfg, 'thresholds', gas, k, positive=True)
+                            for k in ('continuous', 'pulse', 'stop'))
+        # O₂ purges when high (bands descend), CO₂ doses when low (bands ascend)
+        ordered = (cont > puls > stop) if gas == 'o2' else (cont < puls < stop)
+        if not ordered:
+            raise ConfigError(f"thresholds.{gas} bands out of order: {cont}/{puls}/{stop}")
+    for k in ('Kp', 'Ki', 'Kd'):
+        if _num(cfg, 'pid', 'heater', k) < 0:
+            raise ConfigError(f"pid.heater.{k} must be >= 0")
+
+
+def load(path):
+    with open(path) as f:
+        return validate(yaml.safe_load(f))
+
+
+def apply_config(controllers, cfg, new):
+    """Apply the reloadable differences between one chamber's `cfg` and `new`.
+
+    Only sections that changed are pushed, so runtime overrides (e.g. a remote
+    setpoint) survive reloads that don't touch them. Returns a list of
+    human-readable changes.
+    """
+    changes = []
+    old_sp, new_sp = cfg.get('setpoints', {}), new['setpoints']
+    old_th, new_th = cfg.get('thresholds', {}), new['thresholds']
+
+    heater = controllers['heater']
+    if old_sp.get('temperature') != new_sp['temperature']:
+        heater.set_setpoint(new_sp['temperature'])
+        changes.append(f"temperature setpoint {old_sp.get('temperature')} -> {new_sp['temperature']}")
+    if old_th.get('temperature') != new_th['temperature']:
+        heater.thresh = new_th['temperature']
+        changes.append(f"temperature threshold -> {new_th['temperature']}")
+    if cfg.get('pid', {}).get('heater') != new['pid']['heater']:
+        kept = heater.retune(new['pid']['heater'])
+        changes.append(f"heater PID -> {new['pid']['heater']} (integrator {'kept' if kept else 'reset'})")
+
+    for gas in ('o2', 'co2'):
+        ctrl = controllers[gas]
+        if old_sp.get(gas) != new_sp[gas]:
+            ctrl.set_setpoint(new_sp[gas])
+            changes.append(f"{gas} setpoint {old_sp.get(gas)} -> {new_sp[gas]}")
+        if old_th.get(gas) != new_th[gas]:
+            ctrl.set_thresholds(new_th[gas])
+            changes.append(f"{gas} thresholds -> {new_th[gas]}")
+
+    for key in ('max_values', 'read_interval'):
+        if cfg.get(key) != new[key]:
+            changes.append(f"{key} -> {new[key]}")
+
+    for key in set(cfg) | set(new):
+        if key not in RELOADABLE and cfg.get(key) != new.get(key):
+            logger.warning("Config section '%s' changed; restart required to apply it", key)
+
+    # keep the shared dict current for the UI and a restarted curses loop
+    for key in RELOADABLE:
+        cfg[key] = new[key]
+    return changes
+
+
+class ConfigWatcher:
+    def __init__(self, path, poll_s=1.0, debounce_s=0.3):
+        self.path       = os.path.abspath(path)
+        self.poll_s     = poll_s
+        self.debounce_s = debounce_s
+        self._lock      = threading.Lock()
+        self._pending   = None
+        self._stop      = threading.Event()
+        self._thread    = None
+
+    def start(self):
+        target = self._run_inotify if INotify is not None else self._run_stat
+        self._thread = threading.Thread(target=target, name="config-watch", daemon=True)
+        self._thread.start()
+        logger.info("Watching %s for changes (%s)", self.path,
+                    "inotify" if INotify is not None else "stat polling")
+
+    def stop(self):
+        self._stop.set()
+
+    def poll(self):
+        """Return the newest validated config, or None (non-blocking)."""
+        with self._lock:
+            new, self._pending = self._pending, None
+        return new
+
+    def _reload(self):
+        try:
+            new = load(self.path)
+        except FileNotFoundError:
+            return  # mid-replace; the next event picks up the new file
+        except Exception as e:
+            logger.error("Rejected %s: %s (keeping running config)", self.path, e)
+            return
+        with self._lock:
+            self._pending = new
+
+    def _run_inotify(self):
+        # Watch the directory: editors and `cp` often replace the file rather
+        # than writing it in place, which would orphan a watch on the file.
+        ino = INotify()
+        ino.add_watch(os.path.dirname(self.path),
+                      flags.CLOSE_WRITE | flags.MOVED_TO | flags.CREATE)
+        name = os.path.basename(self.path)
+        while not self._stop.is_set():
+            events = ino.read(timeout=1000)
+            if not any(ev.name == name for ev in events):
+                continue
+            # let a burst of events from one save settle
+            while ino.read(timeout=int(self.debounce_s * 1000)):
+                pass
+            self._reload()
+
+    def _run_stat(self):
+        def sig():
+            try:
+                st = os.stat(self.path)
+                return (st.st_mtime_ns, st.st_size, st.st_ino)
+            except OSError:
+                return None
+        last = sig()
+        while not self._stop.wait(self.poll_s):
+            cur = sig()
+            if cur is not None and cur != last:
+                time.sleep(self.debounce_s)
+                last = sig()
+                self._reload()
@@ -12,10 +12,44 @@ class HeaterController:
         self.pid         = PID(**pid_cfg)
         self.pid.setpoint = setpt
         self.pid.output_limits = (0,1)
+        self.mode        = 'auto'   # 'auto' or 'off' (remote override)
+        self.duty        = 0.0      # last PID output, for logging
+        self.state       = GPIO.LOW # pin level set on the last tick (usage.py)
 
-    def update(self, temp, now):
-        duty  = self.pid(temp)  # 0..1
-        state = GPIO.HIGH if (now % 1.0) < duty else GPIO.LOW
+    def set_setpoint(self, setpt):
+        self.setpt = setpt
+        self.pid.setpoint = setpt
+
+    def retune(self, pid_cfg):
+        """Apply new PID gains without rebuilding the PID.
+
+        simple_pid keeps its integral already scaled by Ki, so a gain change is
+        bumpless and the integrator is kept. It is only cleared when Ki drops
+        to 0, where a frozen integral would never unwind. Returns True if kept.
+        """
+        ki = pid_cfg['Ki']
+        self.pid.tunings = (pid_cfg['Kp'], ki, pid_cfg['Kd'])
+        if 'sample_time' in pid_cfg:
+            self.pid.sample_time = pid_cfg['sample_time']
+        if ki == 0:
+            self.pid.reset()
+            return False
+        return True
+
+    def set_mode(self, mode, now=None, duration=None):
+        if mode not in ('auto', 'off'):
+            raise ValueError(f"HeaterController: bad mode {mode!r}")
+        self.mode = mode
+
+    def update(self, temp, now, boost=0.0):
+        # boost: minimum duty (door-open recovery); the PID keeps running
+        if self.mode == 'off':
+            self.duty, self.state = 0.0, GPIO.LOW
+            for p in self.pins:
+                GPIO.output(p, GPIO.LOW)
+            return
+        duty  = self.duty = max(self.pid(temp), boost)  # 0..1
+        state = self.state = GPIO.HIGH if (now % 1.0) < duty else GPIO.LOW
         for p in self.pins:
             GPIO.output(p, state)
 
@@ -36,7 +70,8 @@ class GasController:
                  startup_pulse_on_s=0.06,
                  startup_settle_s=8.0,
                  # rate limit:
-                 rise_suppression=0.20   # if dC/dt > 0.20 %/s, suppress pulses
+                 rise_suppression=0.20,  # if dC/dt > 0.20 %/s, suppress pulses
+                 dosing=None             # optional DoseEngine (dosing.py) for pulse timing
                  ):
         """
         thresholds: dict with keys 'continuous', 'pulse', 'stop'
@@ -46,12 +81,7 @@ class GasController:
         self.setpt   = setpt
         self.invert  = invert
 
-        for k in ('continuous','pulse','stop'):
-            if k not in thresholds:
-                raise KeyError(f"GasController: missing '{k}' threshold")
-        self.th_cont = thresholds['continuous']
-        self.th_puls = thresholds['pulse']
-        self.th_stop = thresholds['stop']
+        self.set_thresholds(thresholds)
 
         # anti-overshoot parameters
         self.pulse_on_s         = float(pulse_on_s)
@@ -60,15 +90,43 @@ class GasController:
         self.startup_pulse_on_s = float(startup_pulse_on_s)
         self.startup_settle_s   = float(startup_settle_s)
         self.rise_suppression   = float(rise_suppression)
+        self.dosing             = dosing
 
         # internal state
         self.last_pulse_end = 0.0   # time of last valve OFF
         self.last_val       = None  # last CO₂/O₂ measurement
         self.last_t         = None  # last timestamp
         self.last_state     = GPIO.LOW
+        # model-planned pulse/settle, latched per pulse (None = band timing)
+        self.plan_pulse_s   = None
+        self.plan_settle_s  = None
+
+        # remote override: 'auto', 'off' or 'on' (forced open until mode_until)
+        self.mode           = 'auto'
+        self.mode_until     = None
 
         GPIO.output(self.pin, GPIO.LOW)
 
+    def set_setpoint(self, setpt):
+        self.setpt = setpt
+
+    def set_thresholds(self, thresholds):
+        for k in ('continuous','pulse','stop'):
+            if k not in thresholds:
+                raise KeyError(f"GasController: missing '{k}' threshold")
+        self.th_cont = thresholds['continuous']
+        self.th_puls = thresholds['pulse']
+        self.th_stop = thresholds['stop']
+
+    def set_mode(self, mode, now=None, duration=None):
+        if mode not in ('auto', 'off', 'on'):
+            raise ValueError(f"GasController: bad mode {mode!r}")
+        self.mode       = mode
+        self.mode_until = (now + duration) if (duration and now is not None) else None
+
+    def is_forced_on(self):
+        return self.mode == 'on'
+
     def is_continuous(self, val):
         if self.invert:  # O₂ controller
             return val > self.setpt * self.th_cont
@@ -85,7 +143,25 @@ class GasController:
         GPIO.output(self.pin, GPIO.LOW)
         self.last_state = GPIO.LOW
 
-    def update(self, val, now):
+    def force_on(self):
+        GPIO.output(self.pin, GPIO.HIGH)
+        self.last_state = GPIO.HIGH
+
+    def update(self, val, now, rate=None):
+        """rate: filtered dV/dt (%/s) from filters.py; without it a
+        two-sample derivative is used for rise suppression."""
+        # Remote override (expires back to automatic control)
+        if self.mode_until is not None and now >= self.mode_until:
+            logger.info("Override '%s' on pin %d expired", self.mode, self.pin)
+            self.mode, self.mode_until = 'auto', None
+        if self.mode == 'off':
+            self.force_off()
+            return
+        if self.mode == 'on':
+            GPIO.output(self.pin, GPIO.HIGH)
+            self.last_state = GPIO.HIGH
+            return
+
         # 0) Continuous band wins (same as your current logic)
         if self.is_continuous(val):
             GPIO.output(self.pin, GPIO.HIGH)
@@ -98,9 +174,12 @@ class GasController:
             self.force_off()
             return
 
-        # 2) Compute rise rate dV/dt (simple derivative) for suppression
+        # 2) Rise rate dV/dt for suppression: filtered slope if we have one,
+        #    else a simple two-sample derivative
         dvdt = 0.0
-        if self.last_val is not None and self.last_t is not None:
+        if rate is not None:
+            dvdt = rate
+        elif self.last_val is not None and self.last_t is not None:
             dt = max(1e-3, now - self.last_t)
             dvdt = (val - self.last_val) / dt  # % per second
         self.last_val, self.last_t = val, now
@@ -120,6 +199,8 @@ class GasController:
         in_startup = (now < self.startup_soft_secs)
         on_len   = self.startup_pulse_on_s if in_startup else self.pulse_on_s
         settle   = self.startup_settle_s   if in_startup else self.settle_s
+        if not in_startup and self.plan_settle_s is not None:
+            settle = self.plan_settle_s
 
         time_since_pulse = now - self.last_pulse_end
         if time_since_pulse < settle:
@@ -131,7 +212,13 @@ class GasController:
         # We implement the micro-pulse by turning it on until (now - last_pulse_end) < on_len,
         # then turning it off and booking last_pulse_end = now.
         if self.last_state == GPIO.LOW and time_since_pulse >= settle:
-            # start a new pulse
+            # start a new pulse; the dosing model (if any) sizes it now
+            self.plan_pulse_s = self.plan_settle_s = None
+            if self.dosing is not None:
+                plan = None if in_startup else self.dosing.plan(val, self.setpt)
+                if plan is not None:
+                    self.plan_pulse_s, self.plan_settle_s = plan
+                self.dosing.pulse_started()
             GPIO.output(self.pin, GPIO.HIGH)
             self.last_state = GPIO.HIGH
             # record the moment we started the pulse using a latch
@@ -140,6 +227,8 @@ class GasController:
 
         # If valve is open, close it after on_len elapsed and enter settle
         if self.last_state == GPIO.HIGH:
+            if self.plan_pulse_s is not None:
+                on_len = self.plan_pulse_s
             if (now - getattr(self, 'pulse_started_at', now)) >= on_len:
                 GPIO.output(self.pin, GPIO.LOW)
                 self.last_state = GPIO.LOW
@@ -0,0 +1,193 @@
+# dosing.py
+#
+# Optional model-based dosing for the gas valves. Each gas gets a first-order
+# plant model fitted online by recursive least squares:
+#
+#     dy/dt = k0 + k1·y + g·u        (u = fraction of the interval the valve was open)
+#
+# k0 + k1·y is the drift toward ambient (leaks, cell respiration), with time
+# constant tau = -1/k1, and g is the valve gain in % per open-second (negative
+# for N₂ on O₂). From the model the engine sizes each pulse to land on the
+# setpoint (Δ / g) and times the next one from the drift rate, instead of the
+# fixed pulse_on_s / settle_s.
+#
+# It only replaces the pulse band: the continuous band, rise suppression and
+# the startup window stay with GasController. In `shadow` mode the model is
+# fitted and its plans are reported but the band timing still drives the
+# valve. Valve-open time, gas use and overshoot are reported per strategy
+# ("band" / "model") so the two can be compared.
+
+import logging
+
+logger = logging.getLogger("incubator.dosing")
+
+
+class FirstOrderModel:
+    def __init__(self, forget=0.998):
+        self.forget  = forget
+        self.theta   = [0.0, 0.0, 0.0]           # k0, k1, g
+        self.P       = [[1e3 if i == j else 0.0 for j in range(3)] for i in range(3)]
+        self.samples = 0
+        self.dosed   = 0                         # samples with the valve open
+
+    def update(self, y, u, dydt):
+        phi  = (1.0, y, u)
+        P    = self.P
+        Pphi = [sum(P[i][j] * phi[j] for j in range(3)) for i in range(3)]
+        den  = self.forget + sum(phi[i] * Pphi[i] for i in range(3))
+        K    = [v / den for v in Pphi]
+        err  = dydt - sum(self.theta[i] * phi[i] for i in range(3))
+        self.theta = [self.theta[i] + K[i] * err for i in range(3)]
+        P = self.P = [[(P[i][j] - K[i] * Pphi[j]) / self.forget for j in range(3)] for i in range(3)]
+        # keep P bounded while the valve sits closed (no excitation for g)
+        tr = P[0][0] + P[1][1] + P[2][2]
+        if tr > 1e6:
+            self.P = [[v * 1e6 / tr for v in row] for row in P]
+        self.samples += 1
+        self.dosed += u > 0
+
+    @property
+    def gain(self):
+        return self.theta[2]
+
+    @property
+    def tau(self):
+        k1 = self.theta[1]
+        return -1.0 / k1 if k1 < 0 else None
+
+    def drift(self, y):
+        return self.theta[0] + self.theta[1] * y
+
+
+class StrategyStats:
+    """Valve-open time and overshoot while one strategy was in charge."""
+    def __init__(self):
+        self.elapsed   = 0.0
+        self.open_s    = 0.0
+        self.pulses    = 0
+        self.over_max  = 0.0
+        self.over_area = 0.0   # ∫ overshoot dt
+
+    def per_hour(self, flow_lpm):
+        h = self.elapsed / 3600.0
+        if h <= 0:
+            return None
+        open_h = self.open_s / h
+        return {
+            'open_s_h':   open_h,
+            'litres_h':   open_h / 60.0 * flow_lpm if flow_lpm else None,
+            'pulses_h':   self.pulses / h,
+            'over_max':   self.over_max,
+            'over_mean':  self.over_area / self.elapsed,
+        }
+
+
+class DoseEngine:
+    def __init__(self, name, cfg, invert, label=""):
+        self.name         = name
+        self.label        = label
+        self.invert       = invert                 # True for O₂ (N₂ lowers it)
+        self.mode         = cfg.get('mode', 'shadow')
+        if self.mode not in ('shadow', 'on'):
+            raise ValueError(f"dosing.{name}.mode must be 'shadow' or 'on'")
+        self.min_pulse_s  = float(cfg.get('min_pulse_s', 0.05))
+        self.max_pulse_s  = float(cfg.get('max_pulse_s', 0.50))
+        self.min_settle_s = float(cfg.get('min_settle_s', 3.0))
+        self.max_settle_s = float(cfg.get('max_settle_s', 30.0))
+        self.deadband     = float(cfg.get('deadband', 0.05))   # fraction of setpoint
+        self.min_samples  = int(cfg.get('min_samples', 60))
+        self.min_dosed    = int(cfg.get('min_dosed', 5))
+        self.flow_lpm     = cfg.get('flow_lpm')
+        self.report_s     = float(cfg.get('report_s', 3600))
+        self.model        = FirstOrderModel(float(cfg.get('forget', 0.998)))
+
+        self.last_plan    = None
+        self._last_tick   = None
+        self._was_open    = False
+        self._open_acc    = 0.0      # open seconds since the last sample
+        self._prev        = None     # (t, y) of the last sample
+        self._last_report = None
+        self.stats        = {'band': StrategyStats(), 'model': StrategyStats()}
+
+    @property
+    def ready(self):
+        g = self.model.gain
+        right_sign = g < 0 if self.invert else g > 0
+        return (self.model.samples >= self.min_samples and
+                self.model.dosed >= self.min_dosed and right_sign and abs(g) > 1e-4)
+
+    @property
+    def strategy(self):
+        return 'model' if self.mode == 'on' and self.ready else 'band'
+
+    # ---------- fed by the chamber (every control tick) ----------
+    def tick(self, now, is_open, value=None, setpt=None):
+        """Book valve-open time up to `now` (the state set on the previous
+        tick held until now), fit the model if `value` is a fresh sample,
+        then remember the state the controller just set."""
+        if self._last_tick is not None and self._was_open:
+            dt = now - self._last_tick
+            self._open_acc += dt
+            self.stats[self.strategy].open_s += dt
+        self._last_tick, self._was_open = now, is_open
+        if value is not None:
+            self._sample(now, value, setpt)
+
+    def pulse_started(self):
+        self.stats[self.strategy].pulses += 1
+
+    def _sample(self, now, y, setpt):
+        if self._prev is not None:
+            t0, y0 = self._prev
+            dt = now - t0
+            if dt > 0:
+                u = min(self._open_acc / dt, 1.0)
+                self.model.update(y0, u, (y - y0) / dt)
+                st = self.stats[self.strategy]
+                st.elapsed += dt
+                over = max(0.0, (setpt - y) if self.invert else (y - setpt))
+                st.over_max = max(st.over_max, over)
+                st.over_area += over * dt
+        self._prev, self._open_acc = (now, y), 0.0
+
+        if self._last_report is None:
+            self._last_report = now
+        elif now - self._last_report >= self.report_s:
+            self._last_report = now
+            self.report()
+
+    # ---------- used by GasController in the pulse band ----------
+    def plan(self, y, setpt):
+        """(pulse_s, settle_s) from the model, or None to keep band timing."""
+        if not self.ready:
+            self.last_plan = None
+            return None
+        m = self.model
+        drift = m.drift(y)
+        # pulse: close the gap to setpoint in one dose
+        pulse = (setpt - y) / m.gain
+        pulse = min(max(pulse, self.min_pulse_s), self.max_pulse_s)
+        # settle: time until drift alone moves the value by half the deadband
+        band = self.deadband * setpt
+        settle = (0.5 * band / abs(drift)) if abs(drift) > 1e-6 else self.max_settle_s
+        settle = min(max(settle, self.min_settle_s), self.max_settle_s)
+        self.last_plan = (pulse, settle)
+        return self.last_plan if self.mode == 'on' else None
+
+    def report(self):
+        m = self.model
+        tau = f"{m.tau:.0f}s" if m.tau else "n/a"
+        plan = (f"{self.last_plan[0]*1000:.0f}ms/{self.last_plan[1]:.1f}s"
+                if self.last_plan else "n/a")
+        for name, st in self.stats.items():
+            r = st.per_hour(self.flow_lpm)
+            if r is None:
+                continue
+            litres = f" {r['litres_h']:.2f} L/h" if r['litres_h'] is not None else ""
+            logger.info("%s%s dosing [%s]: open %.1f s/h%s, %.0f pulses/h, overshoot max %.2f%% mean %.3f%%",
+                        self.label, self.name.upper(), name, r['open_s_h'], litres,
+                        r['pulses_h'], r['over_max'], r['over_mean'])
+            self.stats[name] = StrategyStats()
+        logger.info("%s%s model (%s, %s): g=%.3f %%/s tau=%s plan=%s",
+                    self.label, self.name.upper(), self.mode,
+                    "ready" if self.ready else "learning", m.gain, tau, plan)
@@ -0,0 +1,155 @@
+# engine.py
+#
+# Drives any number of Chambers from one process. A single scheduler keeps
+# every chamber's next due time in a heap and runs whichever is due, so ticks
+# of different chambers interleave instead of queueing behind each other.
+# Per-chamber loop metrics show how close the Pi is to saturation.
+
+import time, heapq, logging
+
+from config_watch import chamber_configs, apply_config
+
+logger = logging.getLogger("incubator.engine")
+
+
+class LoopStats:
+    """Tick timing for one chamber over the current reporting window."""
+    def __init__(self):
+        self.reset()
+        self.last_busy = 0.0
+
+    def reset(self):
+        self.ticks    = 0
+        self.busy     = 0.0   # s spent inside tick()
+        self.busy_max = 0.0
+        self.late     = 0.0   # s between due time and actual start
+        self.late_max = 0.0
+        self.overruns = 0     # ticks that ended after the next one was due
+        self.errors   = 0
+
+    def record(self, busy, late, overrun):
+        self.ticks    += 1
+        self.busy     += busy
+        self.busy_max  = max(self.busy_max, busy)
+        self.late     += late
+        self.late_max  = max(self.late_max, late)
+        self.overruns += overrun
+        self.last_busy = busy
+
+    def summary(self, elapsed):
+        n = max(self.ticks, 1)
+        return {
+            'ticks':        self.ticks,
+            'rate_hz':      self.ticks / elapsed if elapsed > 0 else 0.0,
+            'busy_ms':      1000 * self.busy / n,
+            'busy_max_ms':  1000 * self.busy_max,
+            'late_ms':      1000 * self.late / n,
+            'late_max_ms':  1000 * self.late_max,
+            'overruns':     self.overruns,
+            'errors':       self.errors,
+            'load':         self.busy / elapsed if elapsed > 0 else 0.0,
+        }
+
+
+class Engine:
+    def __init__(self, chambers, metrics_interval=60.0, target_load=0.8):
+        self.chambers         = list(chambers)
+        self.by_name          = {ch.name: ch for ch in self.chambers}
+        self.metrics_interval = metrics_interval
+        self.target_load      = target_load
+        self.start            = time.monotonic()
+        self.stats            = {ch.name: LoopStats() for ch in self.chambers}
+        self.report           = {}
+        self._window_start    = 0.0
+
+        # stagger first ticks across one interval so reads don't bunch up
+        n = len(self.chambers)
+        self._queue = [(i * ch.interval / n, i, ch) for i, ch in enumerate(self.chambers)]
+        heapq.heapify(self._queue)
+
+    @property
+    def pins(self):
+        return [p for ch in self.chambers for p in ch.pins]
+
+    def now(self):
+        # one clock for all chambers; survives a UI restart, so the CO₂
+        # startup window is not re-entered after a curses crash. Monotonic:
+        # a Pi has no RTC, and an NTP/fake-hwclock step back must neither
+        # stall the schedule nor hand the controllers a negative dt. Wall
+        # time is only for the CSV log and the status/ack timestamps.
+        return time.monotonic() - self.start
+
+    def next_due(self):
+        return max(0.0, self._queue[0][0] - self.now()) if self._queue else 1.0
+
+    def run_pending(self):
+        """Tick every chamber that is due. Returns the number of ticks run."""
+        ran = 0
+        while self._queue and self._queue[0][0] <= self.now():
+            due, seq, ch = heapq.heappop(self._queue)
+            stats = self.stats[ch.name]
+            started = self.now()
+            t0 = time.perf_counter()
+            try:
+                ch.tick(started)
+            except Exception:
+                # fail safe for this chamber only; the others keep regulating
+                stats.errors += 1
+                logger.exception("Chamber %s tick failed; outputs forced off", ch.name)
+                ch.all_off()
+            busy = time.perf_counter() - t0
+
+            nxt = due + ch.interval
+            overrun = nxt <= self.now()
+            if overrun:
+                nxt = self.now() + ch.interval   # skip missed slots, don't burst
+            stats.record(busy, started - due, overrun)
+            heapq.heappush(self._queue, (nxt, seq, ch))
+            ran += 1
+
+        if self.now() - self._window_start >= self.metrics_interval:
+            self._report()
+        return ran
+
+    def _report(self):
+        now = self.now()
+        elapsed = now - self._window_start
+        self._window_start = now
+        report = {}
+        for ch in self.chambers:
+            s = self.stats[ch.name].summary(elapsed)
+            self.stats[ch.name].reset()
+            report[ch.name] = s
+            logger.info(
+                "Chamber %s: %d ticks (%.1f Hz) busy %.1f/%.1f ms late %.1f/%.1f ms "
+                "overruns %d errors %d load %.1f%%",
+                ch.name, s['ticks'], s['rate_hz'], s['busy_ms'], s['busy_max_ms'],
+                s['late_ms'], s['late_max_ms'], s['overruns'], s['errors'], 100 * s['load'])
+        total = sum(s['load'] for s in report.values())
+        if report and total > 0:
+            per_chamber = total / len(report)
+            logger.info("Engine load %.1f%% for %d chamber(s); ~%d chambers fit at %.0f%% load",
+                        100 * total, len(report), int(self.target_load / per_chamber),
+                        100 * self.target_load)
+        self.report = report
+
+    def reload(self, new_cfg):
+        """Apply a validated config to every running chamber, in place."""
+        new_by_name = chamber_configs(new_cfg)
+        for ch in self.chambers:
+            ccfg = new_by_name.get(ch.name)
+            if ccfg is None:
+                logger.warning("Chamber %s removed from config; restart required", ch.name)
+                continue
+            for change in apply_config(ch.controllers, ch.cfg, ccfg):
+                logger.info("Config reload: %s%s", ch.label, change)
+            ch.interval = ch.cfg['read_interval']
+        for name in new_by_name.keys() - self.by_name.keys():
+            logger.warning("Chamber %s added to config; restart required", name)
+
+    def all_off(self):
+        for ch in self.chambers:
+            try:
+                ch.all_off()
+            except Exception:
+                logger.exception("Failed to force chamber %s off", ch.name)
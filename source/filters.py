@@ -0,0 +1,179 @@
+# filters.py
+#
+# Streaming signal stage between the sensors and their consumers
+# (controllers, curses bars, 7-segment displays).
+#
+# Each channel keeps a fixed-size ring of (time, value) samples plus running
+# moment sums, so ewma/savgol smoothing, slope and noise variance cost O(1)
+# per sample instead of a rescan of the window:
+#   ewma    exponentially weighted moving average
+#   median  running median of the window (kills single-sample spikes); a
+#           sorted copy of the window is kept, so each sample costs a binary
+#           search plus an O(window) list shift (negligible at window 15)
+#   savgol  Savitzky-Golay style quadratic least-squares fit, evaluated at
+#           the newest sample (smooths without lagging a ramp)
+#   none    raw value; slope/variance are still computed
+# The slope is a least-squares line through the window (units per second, on
+# real timestamps, so irregular sampling is fine). The variance is the noise
+# around that line, i.e. with the trend removed.
+
+import bisect
+
+METHODS = ('none', 'ewma', 'median', 'savgol')
+
+
+class RingBuffer:
+    """Fixed-size ring of floats; push() returns the evicted value (or None)."""
+    def __init__(self, size):
+        self.size  = size
+        self.data  = [0.0] * size
+        self.head  = 0      # next write position
+        self.count = 0
+
+    def push(self, v):
+        old = self.data[self.head] if self.count == self.size else None
+        self.data[self.head] = v
+        self.head = (self.head + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+        return old
+
+    def __iter__(self):
+        start = (self.head - self.count) % self.size
+        for i in range(self.count):
+            yield self.data[(start + i) % self.size]
+
+
+class ChannelFilter:
+    def __init__(self, window=15, method='ewma', alpha=0.3):
+        if method not in METHODS:
+            raise ValueError(f"filter method must be one of {METHODS}, got {method!r}")
+        if window < 3:
+            raise ValueError("filter window must be >= 3 samples")
+        self.window = int(window)
+        self.method = method
+        self.alpha  = float(alpha)
+        self.ts     = RingBuffer(self.window)
+        self.ys     = RingBuffer(self.window)
+        self.sorted = []     # window values in order (median only)
+        self._ewma  = None
+        self._rebase(None)
+
+        # outputs of the last push()
+        self.raw      = None
+        self.value    = None
+        self.slope    = 0.0   # units per second
+        self.variance = 0.0   # noise around the trend line
+
+    # ---------- running sums ----------
+    def _rebase(self, origin):
+        # Times are kept relative to a recent origin so the power sums stay
+        # small; recomputing them once per window keeps float drift bounded.
+        self.origin = origin
+        self.s = [0.0] * 9    # n, Σt, Σt², Σt³, Σt⁴, Σy, Σty, Σt²y, Σy²
+        self.pushes = 0
+        if origin is None:
+            return
+        for t, y in zip(self.ts, self.ys):
+            self._add(t - origin, y, 1.0)
+
+    def _add(self, t, y, sign):
+        t2 = t * t
+        s = self.s
+        s[0] += sign;         s[1] += sign * t;      s[2] += sign * t2
+        s[3] += sign * t2 * t; s[4] += sign * t2 * t2
+        s[5] += sign * y;     s[6] += sign * t * y;  s[7] += sign * t2 * y
+        s[8] += sign * y * y
+
+    def push(self, y, t):
+        """Add one sample taken at time `t` (s); returns the filtered value."""
+        if self.origin is None:
+            self.origin = t
+        old_t = self.ts.push(t)
+        old_y = self.ys.push(y)
+        if old_t is not None:
+            self._add(old_t - self.origin, old_y, -1.0)
+        self._add(t - self.origin, y, 1.0)
+
+        if self.method == 'median':
+            if old_y is not None:
+                del self.sorted[bisect.bisect_left(self.sorted, old_y)]
+            bisect.insort(self.sorted, y)
+
+        self.pushes += 1
+        if self.pushes >= self.window:
+            self._rebase(next(iter(self.ts)))
+
+        self.raw = y
+        self._update(y, t - self.origin)
+        return self.value
+
+    def _update(self, y, t_now):
+        n, st, st2, st3, st4, sy, sty, st2y, syy = self.s
+
+        # least-squares line through the window
+        sxx = st2 - st * st / n
+        if n >= 2 and sxx > 1e-12:
+            sxy = sty - st * sy / n
+            self.slope = sxy / sxx
+            if n >= 3:
+                resid = (syy - sy * sy / n) - sxy * sxy / sxx
+                self.variance = max(resid, 0.0) / (n - 2)
+        else:
+            self.slope, self.variance = 0.0, 0.0
+
+        if self.method == 'ewma':
+            self._ewma = y if self._ewma is None else self._ewma + self.alpha * (y - self._ewma)
+            self.value = self._ewma
+        elif self.method == 'median':
+            k = len(self.sorted)
+            mid = k // 2
+            self.value = self.sorted[mid] if k % 2 else 0.5 * (self.sorted[mid - 1] + self.sorted[mid])
+        elif self.method == 'savgol':
+            self.value = self._quadratic_at(t_now)
+            if self.value is None:
+                self.value = sy / n
+        else:
+            self.value = y
+
+    def _quadratic_at(self, t):
+        # normal equations for y = a + b·t + c·t², solved by Cramer's rule
+        n, st, st2, st3, st4, sy, sty, st2y, _ = self.s
+        if n < 3:
+            return None
+        det = (n * (st2 * st4 - st3 * st3) - st * (st * st4 - st3 * st2)
+               + st2 * (st * st3 - st2 * st2))
+        if abs(det) < 1e-12:
+            return None
+        a = (sy * (st2 * st4 - st3 * st3) - st * (sty * st4 - st3 * st2y)
+             + st2 * (sty * st3 - st2 * st2y)) / det
+        b = (n * (sty * st4 - st2y * st3) - sy * (st * st4 - st3 * st2)
+             + st2 * (st * st2y - sty * st2)) / det
+        c = (n * (st2 * st2y - st3 * sty) - st * (st * st2y - sty * st2)
+             + sy * (st * st3 - st2 * st2)) / det
+        return a + b * t + c * t * t
+
+
+class FilterBank:
+    """One ChannelFilter per signal, configured from the `filters:` section.
+
+    filters:
+      method: ewma        # defaults for every channel
+      window: 15
+      alpha:  0.3
+      o2:  {method: median}   # optional per-channel overrides
+    """
+    CHANNELS = ('temp', 'o2', 'co2')
+
+    def __init__(self, cfg):
+        base = {k: cfg[k] for k in ('method', 'window', 'alpha') if k in cfg}
+        self.channels = {}
+        for name in self.CHANNELS:
+            opts = dict(base)
+            opts.update(cfg.get(name) or {})
+            self.channels[name] = ChannelFilter(**opts)
+
+    def __getitem__(self, name):
+        return self.channels[name]
+
+    def push(self, name, value, now):
+        return self.channels[name].push(value, now)
@@ -11,8 +11,11 @@ import yaml
 import os
 import sys
 
-# Path to your config.yaml (adjust if needed)
-CONFIG_PATH = "/home/brennan/incubator/config.yaml"
+from config_watch import chamber_configs, chamber_pins
+
+# Path to your config.yaml (same resolution as main.py)
+CONFIG_PATH = (sys.argv[1] if len(sys.argv) > 1 else
+               os.environ.get("INCUBATOR_CONFIG", "/home/brennan/incubator/config.yaml"))
 
 def main():
     try:
@@ -24,7 +27,8 @@ def main():
         with open(CONFIG_PATH) as f:
             cfg = yaml.safe_load(f)
 
-        all_pins = cfg['gpio']['heaters'] + [cfg['gpio']['o2_pin'], cfg['gpio']['co2_pin']]
+        # every chamber's pins (just the top-level gpio for a single chamber)
+        all_pins = [p for ccfg in chamber_configs(cfg).values() for p in chamber_pins(ccfg)]
 
         GPIO.setmode(GPIO.BCM)
         for p in all_pins:
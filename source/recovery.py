@@ -0,0 +1,173 @@
+# recovery.py
+#
+# Door-open detection and fast recovery. Opening the lid shows up as O₂
+# rising while CO₂ and temperature fall, all at once. When enough of those
+# slopes (from filters.py) cross their limits, the chamber switches from the
+# normal band logic to a recovery profile:
+#
+#   purge     N₂ valve fully open, CO₂ closed (it would just be flushed out),
+#             until O₂ is back under `purge_exit` × setpoint
+#   backfill  N₂ back on normal control, CO₂ valve open until CO₂ reaches
+#             `backfill_exit` × setpoint. The sensor sees CO₂ only after a
+#             transport delay, so the valve is closed early whenever the
+#             current rise, carried `backfill_lead_s` ahead, would already
+#             reach the exit, or while it rises faster than the CO₂
+#             controller's rise suppression allows
+#   (done)    normal control again (pulses finish the last stretch)
+#
+# The heater is boosted to at least `boost_duty` for the whole event, until
+# the temperature is within `boost_margin` °C of its setpoint. Each event is
+# timed per signal and appended to recovery_events.csv.
+
+import os, logging
+from datetime import datetime
+
+logger = logging.getLogger("incubator.recovery")
+
+EVENTS_HEADER = ("start,trigger,duration_s,o2_recovered_s,co2_recovered_s,temp_recovered_s,"
+                 "purge_s,backfill_s,peak_o2,min_co2,min_temp,aborted\n")
+
+
+class RecoveryEvent:
+    def __init__(self, now, trigger, reading):
+        t, o, c = reading
+        self.start     = now
+        self.wall      = datetime.now()
+        self.trigger   = trigger
+        self.left      = {'o2': False, 'co2': False, 'temp': False}  # went out of band
+        self.recovered = {'o2': None, 'co2': None, 'temp': None}     # s after start, back in band
+        self.phase_s   = {'purge': 0.0, 'backfill': 0.0}
+        self.peak_o2, self.min_co2, self.min_temp = o, c, t
+        self.aborted   = False
+
+
+class DoorRecovery:
+    def __init__(self, cfg, log_dir=".", label=""):
+        self.label         = label
+        # detection: slopes per second from the filters
+        self.o2_rise       = float(cfg.get('o2_rise', 0.05))    # %/s
+        self.co2_drop      = float(cfg.get('co2_drop', 0.03))   # %/s
+        self.temp_drop     = float(cfg.get('temp_drop', 0.02))  # °C/s
+        self.min_signals   = int(cfg.get('min_signals', 2))
+        # profile
+        self.purge_exit    = float(cfg.get('purge_exit', 1.10))
+        self.backfill_exit = float(cfg.get('backfill_exit', 0.80))
+        self.backfill_lead_s = float(cfg.get('backfill_lead_s', 10.0))
+        self.boost_duty    = float(cfg.get('boost_duty', 1.0))
+        self.boost_margin  = float(cfg.get('boost_margin', 0.3))
+        self.max_s         = float(cfg.get('max_s', 900))
+        self.rearm_s       = float(cfg.get('rearm_s', 60))
+
+        self.events_path   = os.path.join(log_dir, "recovery_events.csv")
+        self.phase         = None    # None, 'purge' or 'backfill'
+        self.event         = None    # open until every signal is back in band
+        self.phase_start   = None
+        self.last_end      = -1e9
+
+    # ---------- detection ----------
+    def detect(self, filters):
+        hits = []
+        if filters['o2'].slope > self.o2_rise:
+            hits.append(f"O2 {filters['o2'].slope:+.3f}%/s")
+        if filters['co2'].slope < -self.co2_drop:
+            hits.append(f"CO2 {filters['co2'].slope:+.3f}%/s")
+        if filters['temp'].slope < -self.temp_drop:
+            hits.append(f"T {filters['temp'].slope:+.3f}C/s")
+        return hits if len(hits) >= self.min_signals else None
+
+    # ---------- state machine (on each fresh sample) ----------
+    def update(self, now, filters, reading, controllers):
+        t, o, c = reading
+        if self.event is None:
+            if now - self.last_end < self.rearm_s:
+                return
+            hits = self.detect(filters)
+            if hits:
+                self.event = RecoveryEvent(now, " ".join(hits), reading)
+                logger.warning("%sDoor opening detected (%s): recovery started",
+                               self.label, self.event.trigger)
+                self._enter('purge', now)
+            return
+
+        ev = self.event
+        ev.peak_o2  = max(ev.peak_o2, o)
+        ev.min_co2  = min(ev.min_co2, c)
+        ev.min_temp = min(ev.min_temp, t)
+
+        # per-signal recovery times, against the normal control bands
+        o2c, co2c, heat = controllers['o2'], controllers['co2'], controllers['heater']
+        in_band = {
+            'o2':   o <= o2c.setpt * o2c.th_puls,
+            'co2':  c >= co2c.setpt * co2c.th_puls,
+            'temp': t >= heat.setpt * heat.thresh,
+        }
+        for k, ok in in_band.items():
+            if not ok:
+                ev.left[k], ev.recovered[k] = True, None
+            elif ev.left[k] and ev.recovered[k] is None:
+                ev.recovered[k] = now - ev.start
+
+        if now - ev.start > self.max_s:
+            logger.error("%sRecovery exceeded %.0fs; handing back to normal control",
+                         self.label, self.max_s)
+            ev.aborted = True
+            self._finish(now)
+            return
+
+        # purge until O₂ has peaked and come back down (right after the trigger
+        # it is usually still low, which must not end the purge)
+        if self.phase == 'purge' and o <= o2c.setpt * self.purge_exit and filters['o2'].slope <= 0:
+            self._enter('backfill', now)
+        if self.phase == 'backfill' and c >= co2c.setpt * self.backfill_exit:
+            self._enter(None, now)
+        if self.phase is None and all(ev.recovered[k] is not None or not ev.left[k] for k in ev.left):
+            self._finish(now)
+
+    def _enter(self, phase, now):
+        if self.phase is not None:
+            self.event.phase_s[self.phase] += now - self.phase_start
+        if phase != self.phase:
+            logger.info("%sRecovery phase: %s", self.label, phase or "normal control")
+        self.phase, self.phase_start = phase, now
+
+    def _finish(self, now):
+        self._enter(None, now)
+        ev, self.event = self.event, None
+        self.last_end = now
+        duration = now - ev.start
+        r = ev.recovered
+        logger.info("%sRecovery done in %.0fs (O2 %s, CO2 %s, T %s; purge %.0fs, backfill %.0fs)",
+                    self.label, duration,
+                    *(f"{r[k]:.0f}s" if r[k] is not None else "n/a" for k in ('o2', 'co2', 'temp')),
+                    ev.phase_s['purge'], ev.phase_s['backfill'])
+        self._write_event(ev, duration)
+
+    def _write_event(self, ev, duration):
+        fmt = lambda v: "" if v is None else f"{v:.1f}"
+        row = ",".join([
+            ev.wall.isoformat(timespec='seconds'), ev.trigger.replace(",", ";"), fmt(duration),
+            fmt(ev.recovered['o2']), fmt(ev.recovered['co2']), fmt(ev.recovered['temp']),
+            fmt(ev.phase_s['purge']), fmt(ev.phase_s['backfill']),
+            f"{ev.peak_o2:.2f}", f"{ev.min_co2:.2f}", f"{ev.min_temp:.2f}", str(int(ev.aborted)),
+        ])
+        try:
+            new = not os.path.exists(self.events_path) or os.stat(self.events_path).st_size == 0
+            with open(self.events_path, "a") as f:
+                if new:
+                    f.write(EVENTS_HEADER)
+                f.write(row + "\n")
+        except Exception:
+            logger.exception("Failed to record recovery event")
+
+    # ---------- actuation (every control tick) ----------
+    def backfill_open(self, co2, rate, co2_ctrl):
+        """Whether the CO₂ valve may stay open during the back-fill."""
+        rate = rate or 0.0
+        if rate > co2_ctrl.rise_suppression:
+            return False
+        return co2 + max(rate, 0.0) * self.backfill_lead_s < co2_ctrl.setpt * self.backfill_exit
+
+    def heater_boost(self, temp, heater):
+        if self.event is None or temp >= heater.setpt - self.boost_margin:
+            return 0.0
+        return self.boost_duty
@@ -6,8 +6,12 @@ from w1thermsensor import W1ThermSensor
 log = logging.getLogger("incubator.sensors")
 
 class OneWireTemps:
-    def __init__(self):
-        self.sensors = W1ThermSensor.get_available_sensors()
+    def __init__(self, ids=None):
+        # ids: DS18B20 ids (e.g. "3c01d607d4ee") for this chamber; all probes on the bus if None
+        if ids:
+            self.sensors = [W1ThermSensor(sensor_id=i) for i in ids]
+        else:
+            self.sensors = W1ThermSensor.get_available_sensors()
     def read(self):
         vs = []
         for s in self.sensors:
@@ -0,0 +1,23 @@
+import os, sys, types
+
+# the incubator modules are plain scripts importing each other by name
+SOURCE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SOURCE)
+# w1thermsensor otherwise tries to load the 1-Wire kernel modules on import
+os.environ.setdefault("W1THERMSENSOR_NO_KERNEL_MODULE", "1")
+
+# off the Pi: a GPIO stand-in that records the last level per pin
+try:
+    import RPi.GPIO  # noqa: F401
+except ImportError:
+    gpio = types.ModuleType("RPi.GPIO")
+    gpio.BCM, gpio.OUT, gpio.LOW, gpio.HIGH = 11, 0, 0, 1
+    gpio.levels = {}
+    gpio.setmode = lambda mode: None
+    gpio.setwarnings = lambda flag: None
+    gpio.setup = lambda pin, mode, **kw: None
+    gpio.output = lambda pin, level: gpio.levels.__setitem__(pin, level)
+    gpio.cleanup = lambda *pins: gpio.levels.clear()
+    rpi = types.ModuleType("RPi")
+    rpi.GPIO = gpio
+    sys.modules["RPi"], sys.modules["RPi.GPIO"] = rpi, gpio
@@ -0,0 +1,117 @@
+import json, time
+from datetime import datetime, timedelta
+
+import pytest
+
+from commands import CommandError, CommandListener
+
+
+class FakeClient:
+    def __init__(self):
+        self.published = []
+
+    def publish(self, topic, payload, qos=0):
+        self.published.append((topic, json.loads(payload)))
+
+
+class FakeController:
+    def __init__(self, setpt):
+        self.setpt, self.mode, self.mode_until = setpt, 'auto', None
+
+    def set_setpoint(self, v):
+        self.setpt = v
+
+    def set_mode(self, mode, now=None, duration=None):
+        self.mode, self.mode_until = mode, (now + duration) if duration else None
+
+
+class FakeChamber:
+    def __init__(self, name):
+        self.name, self.usage = name, None
+        self.cfg = {'max_values': {'temperature': 50.0, 'o2': 25.0, 'co2': 20.0}}
+        self.controllers = {'heater': FakeController(37.0), 'o2': FakeController(3.0),
+                            'co2': FakeController(5.0)}
+
+
+@pytest.fixture
+def listener():
+    lst = CommandListener({'max_override_s': 600, 'max_command_age_s': 120})
+    lst.client = FakeClient()
+    return lst
+
+
+def send(lst, chambers, now=100.0, age=0.0, **payload):
+    payload.setdefault('ts', (datetime.utcnow() - timedelta(seconds=age)).isoformat())
+    lst.pending.put_nowait((payload, time.time()))
+    lst.apply_pending(chambers, now)
+    return lst.client.published[-1][1]
+
+
+def test_setpoint_applied_and_acked(listener):
+    ch = FakeChamber('main')
+    ack = send(listener, {'main': ch}, command='set_co2', value='5.5')
+    assert ack['ok'] and ack['detail'] == "setpoint=5.5"
+    assert ch.controllers['co2'].setpt == 5.5
+
+
+@pytest.mark.parametrize("command, value, error", [
+    ('set_temp', 60, "outside (0, 50.0]"),
+    ('set_o2', 'low', "needs a number"),
+    ('mode_heater', 'on 30', "cannot be forced on"),
+    ('mode_co2', 'turbo', "needs one of auto/off/on"),
+    ('mode_o2', 'on', "needs a duration"),
+    ('purge', 3600, "duration must be in (0, 600] s"),
+    ('refill', 'co2', "usage accounting is not enabled"),
+    ('reboot', None, "unknown command 'reboot'"),
+])
+def test_bad_commands_are_rejected(listener, command, value, error):
+    ch = FakeChamber('main')
+    ack = send(listener, {'main': ch}, command=command, value=value)
+    assert not ack['ok'] and error in ack['error']
+    assert [c.mode for c in ch.controllers.values()] == ['auto'] * 3
+
+
+def test_forced_valve_expires(listener):
+    ch = FakeChamber('main')
+    assert send(listener, {'main': ch}, now=50.0, command='mode_o2', value='on 30')['ok']
+    assert (ch.controllers['o2'].mode, ch.controllers['o2'].mode_until) == ('on', 80.0)
+    assert send(listener, {'main': ch}, now=60.0, command='purge', value=10)['detail'] == "purge 10s"
+
+
+def test_stale_command_is_rejected(listener):
+    ch = FakeChamber('main')
+    ack = send(listener, {'main': ch}, age=600, command='set_co2', value=6)
+    assert not ack['ok'] and "stale command" in ack['error']
+    assert ch.controllers['co2'].setpt == 5.0
+    listener.max_command_age_s = 0   # off
+    assert send(listener, {'main': ch}, age=600, command='set_co2', value=6)['ok']
+
+
+def test_command_without_ts_is_not_aged(listener):
+    listener.pending.put_nowait(({'command': 'set_co2', 'value': 6}, time.time()))
+    listener.apply_pending({'main': FakeChamber('main')}, 0.0)
+    assert listener.client.published[-1][1]['ok']
+
+
+def test_target_chamber(listener):
+    a, b = FakeChamber('a'), FakeChamber('b')
+    chambers = {'a': a, 'b': b}
+    ack = send(listener, chambers, command='set_co2', value=6)
+    assert not ack['ok'] and ack['error'] == "name a chamber: a, b"
+    assert not send(listener, chambers, command='set_co2', value=6, chamber='c')['ok']
+    ack = send(listener, chambers, command='set_co2', value=6, chamber='b')
+    assert ack['ok'] and ack['chamber'] == 'b'
+    assert (a.controllers['co2'].setpt, b.controllers['co2'].setpt) == (5.0, 6.0)
+
+
+def test_check_age_raises_command_error(listener):
+    with pytest.raises(CommandError):
+        listener._check_age({'ts': "2020-01-01T00:00:00"}, time.time())
+    listener._check_age({'ts': "not a time"}, time.time())
+
+
+def test_bad_payload_is_dropped(listener):
+    class Msg:
+        payload = b"[1, 2]"
+    listener._on_message(None, None, Msg())
+    assert listener.pending.empty()
@@ -0,0 +1,118 @@
+import copy, os
+
+import pytest
+import yaml
+
+import config_watch
+from config_watch import ConfigError, apply_config, chamber_configs, validate
+
+CONFIG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config.yaml")
+
+
+@pytest.fixture
+def cfg():
+    with open(CONFIG) as f:
+        return yaml.safe_load(f)
+
+
+def two_chambers(cfg, b_gpio):
+    cfg['chambers'] = [{'name': 'a'}, {'name': 'b', 'gpio': b_gpio}]
+    return cfg
+
+
+def test_shipped_config_is_valid(cfg):
+    assert validate(cfg) is cfg
+    assert list(chamber_configs(cfg)) == ['main']
+
+
+def test_chambers_inherit_and_get_their_own_log_dir(cfg):
+    cfg['log_file'] = "/var/log/incubator/metrics.txt"
+    cfg['chambers'] = [{'name': 'a'}, {'name': 'b', 'setpoints': {'co2': 6.0},
+                                       'gpio': {'o2_pin': 5, 'co2_pin': 6, 'heaters': [7]}}]
+    a, b = chamber_configs(cfg).values()
+    assert (a['setpoints']['co2'], b['setpoints']['co2']) == (5.0, 6.0)
+    assert b['setpoints']['o2'] == 3.0   # merged, not replaced
+    assert b['log_file'] == "/var/log/incubator/b/metrics.txt"
+    validate(cfg)
+
+
+def test_pin_shared_between_chambers_is_rejected(cfg):
+    two_chambers(cfg, {'o2_pin': 5, 'co2_pin': 6, 'heaters': [13]})
+    with pytest.raises(ConfigError, match="GPIO 13 used by both a and b"):
+        validate(cfg)
+
+
+@pytest.mark.parametrize("change, match", [
+    (lambda c: c['setpoints'].update(co2=25.0), "above max_values.co2"),
+    (lambda c: c['thresholds']['co2'].update(pulse=0.7), "co2 bands out of order"),
+    (lambda c: c['thresholds']['o2'].update(stop=1.2), "o2 bands out of order"),
+    (lambda c: c['pid']['heater'].update(Ki=-0.1), "pid.heater.Ki"),
+    (lambda c: c.update(read_interval="fast"), "read_interval must be a number"),
+    (lambda c: c['setpoints'].pop('o2'), "missing setpoints.o2"),
+])
+def test_unsafe_chamber_config_is_rejected(cfg, change, match):
+    change(cfg)
+    with pytest.raises(ConfigError, match=match):
+        validate(cfg)
+
+
+def test_chamber_errors_name_the_chamber(cfg):
+    cfg['chambers'] = [{'name': 'a', 'read_interval': 0}]
+    with pytest.raises(ConfigError, match="chamber a: read_interval must be > 0"):
+        validate(cfg)
+
+
+class FakeController:
+    def __init__(self, setpt):
+        self.setpt, self.thresholds = setpt, None
+
+    def set_setpoint(self, v):
+        self.setpt = v
+
+    def set_thresholds(self, th):
+        self.thresholds = th
+
+
+def test_apply_config_pushes_only_what_changed(cfg):
+    ctrls = {'heater': FakeController(37.0), 'o2': FakeController(3.0), 'co2': FakeController(5.0)}
+    ctrls['co2'].setpt = 5.5   # a remote set_co2 since the last reload
+    new = copy.deepcopy(cfg)
+    new['setpoints']['o2'] = 2.5
+    new['thresholds']['o2']['pulse'] = 1.05
+    changes = apply_config(ctrls, cfg, new)
+    assert ctrls['o2'].setpt == 2.5 and ctrls['o2'].thresholds['pulse'] == 1.05
+    assert ctrls['co2'].setpt == 5.5   # untouched section: the override survives
+    assert len(changes) == 2
+    assert cfg['setpoints']['o2'] == 2.5
+
+
+def test_apply_config_keeps_the_heater_integrator(cfg):
+    pytest.importorskip("simple_pid")
+    from controllers import HeaterController
+    heater = HeaterController([13], 37.0, 0.98, cfg['pid']['heater'])
+    for _ in range(50):
+        heater.pid(36.0)
+    integral = heater.pid._integral
+    ctrls = {'heater': heater, 'o2': FakeController(3.0), 'co2': FakeController(5.0)}
+    new = copy.deepcopy(cfg)
+    new['pid']['heater']['Kp'] = 3.0
+    assert apply_config(ctrls, cfg, new) == [f"heater PID -> {new['pid']['heater']} (integrator kept)"]
+    assert heater.pid._integral == integral and heater.pid.Kp == 3.0
+    new2 = copy.deepcopy(new)
+    new2['pid']['heater']['Ki'] = 0
+    apply_config(ctrls, cfg, new2)
+    assert heater.pid._integral == 0
+
+
+def test_watcher_only_hands_over_valid_configs(tmp_path, cfg):
+    path = tmp_path / "config.yaml"
+    watcher = config_watch.ConfigWatcher(str(path))
+    cfg['gpio']['o2_pin'] = cfg['gpio']['co2_pin']
+    path.write_text(yaml.safe_dump(cfg))
+    watcher._reload()
+    assert watcher.poll() is None   # rejected; the running config stays
+    cfg['gpio']['o2_pin'] = 20
+    path.write_text(yaml.safe_dump(cfg))
+    watcher._reload()
+    assert watcher.poll() == cfg
+    assert watcher.poll() is None
@@ -0,0 +1,58 @@
+import random
+
+import pytest
+
+from dosing import DoseEngine, FirstOrderModel
+
+
+def simulate(engine, seconds, k0=0.02, k1=-0.01, g=0.5, dt=1.0, seed=0):
+    """CO₂-like plant dy/dt = k0 + k1·y + g·u, a valve pulse every 10 s."""
+    rng, y, t = random.Random(seed), 4.0, 0.0
+    while t < seconds:
+        is_open = int(t) % 10 == 0
+        u = 0.2 if is_open else 0.0
+        engine.tick(t, u > 0)
+        if u:
+            engine.tick(t + u * dt, False)
+        y += (k0 + k1 * y + g * u) * dt + rng.gauss(0, 1e-4)
+        t += dt
+        engine.tick(t, False, y, 5.0)
+    return y
+
+
+def test_rls_recovers_a_first_order_plant():
+    m = FirstOrderModel(forget=0.999)
+    rng, y = random.Random(2), 4.0
+    for i in range(2000):
+        u = 1.0 if i % 7 == 0 else 0.0
+        dydt = 0.02 - 0.01 * y + 0.5 * u
+        m.update(y, u, dydt + rng.gauss(0, 1e-3))
+        y += dydt
+    assert m.theta == pytest.approx([0.02, -0.01, 0.5], abs=5e-3)
+    assert m.tau == pytest.approx(100, rel=0.3)
+
+
+def test_covariance_stays_bounded_without_excitation():
+    m = FirstOrderModel(forget=0.9)
+    for _ in range(2000):
+        m.update(5.0, 0.0, 0.0)
+    assert sum(m.P[i][i] for i in range(3)) <= 1e6 * (1 + 1e-9)
+
+
+def test_engine_learns_then_plans_pulses():
+    eng = DoseEngine('co2', {'mode': 'on', 'min_samples': 60, 'report_s': 1e9}, invert=False)
+    assert eng.plan(4.5, 5.0) is None and eng.strategy == 'band'
+    simulate(eng, 300)
+    assert eng.ready and eng.strategy == 'model'
+    assert eng.model.gain == pytest.approx(0.5, rel=0.1)
+    pulse, settle = eng.plan(4.9, 5.0)
+    assert pulse == pytest.approx(0.2, rel=0.15)   # (5.0 - 4.9) / g
+    assert eng.min_settle_s <= settle <= eng.max_settle_s
+    assert sum(st.open_s for st in eng.stats.values()) == pytest.approx(30 * 0.2)   # booked per strategy
+
+
+def test_shadow_mode_never_drives_the_valve():
+    eng = DoseEngine('co2', {'mode': 'shadow', 'min_samples': 60, 'report_s': 1e9}, invert=False)
+    simulate(eng, 300)
+    assert eng.ready and eng.strategy == 'band'
+    assert eng.plan(4.9, 5.0) is None and eng.last_plan is not None
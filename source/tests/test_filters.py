@@ -0,0 +1,73 @@
+import math, random
+
+import pytest
+
+from filters import ChannelFilter, FilterBank, RingBuffer
+
+
+def feed(f, samples):
+    for t, y in samples:
+        f.push(y, t)
+    return f
+
+
+def test_ring_buffer_evicts_oldest():
+    r = RingBuffer(3)
+    assert [r.push(v) for v in (1.0, 2.0, 3.0, 4.0, 5.0)] == [None, None, None, 1.0, 2.0]
+    assert list(r) == [3.0, 4.0, 5.0]
+
+
+def test_ewma():
+    f = ChannelFilter(window=5, method='ewma', alpha=0.5)
+    assert f.push(10.0, 0.0) == 10.0
+    assert f.push(20.0, 1.0) == 15.0
+    assert f.push(20.0, 2.0) == 17.5
+
+
+def test_median_rejects_a_single_spike():
+    f = feed(ChannelFilter(window=5, method='median'), [(i, 3.0 + 0.01 * i) for i in range(10)])
+    assert f.push(20.9, 10.0) == pytest.approx(3.08)
+    assert f.raw == 20.9
+    assert sorted(f.ys) == f.sorted   # evictions keep the sorted copy in step
+
+
+def test_slope_and_variance_on_irregular_timestamps():
+    rng, t = random.Random(0), 0.0
+    f = ChannelFilter(window=15, method='none')
+    for _ in range(100):   # several rebases
+        t += rng.uniform(0.1, 0.5)
+        f.push(5.0 - 0.02 * t, t)
+    assert f.slope == pytest.approx(-0.02)
+    assert f.variance == pytest.approx(0.0, abs=1e-9)
+    assert f.value == f.raw
+
+
+def test_variance_is_noise_around_the_trend():
+    rng = random.Random(1)
+    f = ChannelFilter(window=200, method='none')
+    for i in range(200):
+        f.push(37.0 + 0.01 * i + rng.gauss(0, 0.1), i * 0.2)
+    assert f.slope == pytest.approx(0.05, rel=0.1)
+    assert math.sqrt(f.variance) == pytest.approx(0.1, rel=0.2)
+
+
+def test_savgol_tracks_a_ramp_without_lag():
+    ramp = [(i * 0.2, 1.0 + 0.5 * (i * 0.2) ** 2) for i in range(40)]
+    sg = feed(ChannelFilter(window=15, method='savgol'), ramp)
+    ew = feed(ChannelFilter(window=15, method='ewma', alpha=0.3), ramp)
+    assert sg.value == pytest.approx(ramp[-1][1], rel=1e-6)
+    assert ew.value < ramp[-1][1] - 1.0
+
+
+def test_rejects_bad_settings():
+    with pytest.raises(ValueError):
+        ChannelFilter(method='kalman')
+    with pytest.raises(ValueError):
+        ChannelFilter(window=2)
+
+
+def test_filter_bank_per_channel_overrides():
+    bank = FilterBank({'method': 'ewma', 'window': 9, 'o2': {'method': 'median'}})
+    assert (bank['temp'].method, bank['o2'].method, bank['co2'].method) == ('ewma', 'median', 'ewma')
+    assert bank['o2'].window == 9
+    assert bank.push('co2', 5.0, 0.0) == 5.0
@@ -0,0 +1,51 @@
+from types import SimpleNamespace as NS
+
+from recovery import DoorRecovery
+
+
+def slopes(o2=0.0, co2=0.0, temp=0.0):
+    return {'o2': NS(slope=o2), 'co2': NS(slope=co2), 'temp': NS(slope=temp)}
+
+
+CONTROLLERS = {'o2': NS(setpt=3.0, th_puls=1.10), 'co2': NS(setpt=5.0, th_puls=0.90, rise_suppression=0.2),
+               'heater': NS(setpt=37.0, thresh=0.98)}
+
+
+def test_door_event_runs_purge_backfill_and_is_logged(tmp_path):
+    rec = DoorRecovery({'rearm_s': 60}, str(tmp_path))
+    rec.update(0.0, slopes(o2=0.1), (37.0, 3.0, 5.0), CONTROLLERS)
+    assert rec.event is None   # one signal is not enough
+    rec.update(1.0, slopes(o2=0.1, co2=-0.05), (36.8, 4.0, 4.5), CONTROLLERS)
+    assert rec.phase == 'purge'
+    rec.update(5.0, slopes(o2=0.2), (36.0, 12.0, 2.0), CONTROLLERS)
+    rec.update(20.0, slopes(o2=-0.3), (36.5, 3.2, 2.5), CONTROLLERS)   # O₂ peaked and back
+    assert rec.phase == 'backfill'
+    rec.update(40.0, slopes(), (37.0, 3.0, 4.2), CONTROLLERS)           # ≥ 0.80 × setpoint
+    assert rec.phase is None and rec.event is not None                 # CO₂ still below its band
+    rec.update(50.0, slopes(), (37.0, 3.0, 4.6), CONTROLLERS)
+    assert rec.event is None
+    rows = (tmp_path / "recovery_events.csv").read_text().splitlines()
+    assert len(rows) == 2
+    row = dict(zip(rows[0].split(","), rows[1].split(",")))
+    assert (row['duration_s'], row['o2_recovered_s'], row['co2_recovered_s']) == ("49.0", "19.0", "49.0")
+    assert (row['purge_s'], row['backfill_s'], row['aborted']) == ("19.0", "20.0", "0")
+    # re-arms only after rearm_s
+    rec.update(60.0, slopes(o2=0.1, co2=-0.05), (37.0, 4.0, 4.5), CONTROLLERS)
+    assert rec.event is None
+
+
+def test_overlong_event_is_aborted(tmp_path):
+    rec = DoorRecovery({'max_s': 30}, str(tmp_path))
+    rec.update(0.0, slopes(o2=0.1, co2=-0.05), (37.0, 4.0, 4.5), CONTROLLERS)
+    rec.update(31.0, slopes(o2=0.1), (37.0, 9.0, 4.5), CONTROLLERS)
+    assert rec.event is None and rec.phase is None
+    assert (tmp_path / "recovery_events.csv").read_text().splitlines()[1].endswith(",1")
+
+
+def test_backfill_closes_early_on_a_fast_or_projected_rise():
+    rec = DoorRecovery({'backfill_exit': 0.8, 'backfill_lead_s': 10})
+    co2 = CONTROLLERS['co2']   # exit at 4.0 %
+    assert rec.backfill_open(2.0, 0.05, co2)
+    assert not rec.backfill_open(3.6, 0.05, co2)   # 3.6 + 10 × 0.05 reaches the exit
+    assert not rec.backfill_open(2.0, 0.3, co2)    # faster than rise suppression
+    assert rec.backfill_open(3.9, None, co2)
@@ -0,0 +1,50 @@
+import os, sys
+
+import pytest
+
+for mod in ("simple_pid", "serial", "w1thermsensor", "adafruit_ht16k33", "pydantic"):
+    pytest.importorskip(mod)
+
+from chamber import Chamber
+from commands import CommandListener
+from controllers import GasController, HeaterController
+
+# the Discord monitor's parser, as it reads MQTT_STATUS_TOPIC
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                                "discord-monitor"))
+from src.payload import PayloadExtractor  # noqa: E402
+
+FIELD_MAP = {"temp_c": "temp_c", "co2_pct": "co2_pct", "o2_pct": "o2_pct", "states": "states"}
+
+
+class FakeClient:
+    def __init__(self):
+        self.published = []
+
+    def publish(self, topic, payload, qos=0):
+        self.published.append((topic, payload))
+
+
+def chamber(reading):
+    ch = Chamber.__new__(Chamber)   # no sensors/displays: only what status() reads
+    ch.name, ch.reading, ch.recovery, ch.usage = "a", reading, None, None
+    ch.controllers = {
+        'heater': HeaterController([13], 37.0, 0.98, {'Kp': 2.0, 'Ki': 0.1, 'Kd': 0.05}),
+        'o2':  GasController(20, 3.0, {'continuous': 1.25, 'pulse': 1.10, 'stop': 0.90}, invert=True),
+        'co2': GasController(21, 5.0, {'continuous': 0.75, 'pulse': 0.90, 'stop': 1.10}),
+    }
+    return ch
+
+
+@pytest.mark.parametrize("reading", [(36.9, 1.2, 0.04), (37.0, 3.0, 5.0), (37.1, 20.9, 1.5)])
+def test_status_survives_the_monitor_parser(reading):
+    listener = CommandListener({})
+    listener.client = FakeClient()
+    listener.publish_status([chamber(reading)], now=10.0)
+    (topic, raw), = listener.client.published
+    assert topic == "incubator/status/a"
+
+    st = PayloadExtractor(FIELD_MAP, {}).parse(raw, device=topic.rsplit("/", 1)[1])
+    assert (st.device, st.temp_c, st.o2_pct, st.co2_pct) == ("a", *reading)
+    assert st.states == {"heater": False, "o2_valve": False, "co2_valve": False}
+    assert "gas_units" not in st.extra
@@ -0,0 +1,43 @@
+import pytest
+
+from usage import UsageLedger
+
+CFG = {'flow_lpm': {'co2': 2.0, 'o2': 6.0}, 'cylinder_litres': {'co2': 100.0}}
+
+
+def run(ledger, seconds, states, t0=0.0, dt=0.5):
+    t = t0
+    while t < t0 + seconds:
+        ledger.tick(t, states)
+        t += dt
+    ledger.tick(t, states)
+    return t
+
+
+def test_books_open_time_litres_and_projection(tmp_path):
+    led = UsageLedger(CFG, ['o2', 'co2', 'heater_13'], str(tmp_path / "usage.json"))
+    run(led, 60, {'o2': False, 'co2': True, 'heater_13': True})
+    assert led.total['co2'] == pytest.approx(60) and led.total['o2'] == 0
+    assert led.total['heater_13'] == pytest.approx(60)
+    assert led.litres('co2', led.total['co2']) == pytest.approx(2.0)
+    assert led.remaining('co2') == pytest.approx(98.0)
+    assert led.remaining('o2') is None   # no cylinder size configured
+    assert led.hours_left('co2') == pytest.approx(98.0 / led.rate_lph('co2'))
+    st = led.status()
+    assert st['gas']['CO2']['litres'] == 2.0 and st['gas']['N2']['hours_left'] is None
+    assert st['heater_on_s'] == {'heater_13': 60.0}
+    assert "CO2" in st['summary']
+
+
+def test_refill_and_restart(tmp_path):
+    path = str(tmp_path / "usage.json")
+    led = UsageLedger(CFG, ['o2', 'co2'], path)
+    run(led, 30, {'o2': True, 'co2': True})
+    assert led.mark_refill('co2') == pytest.approx(1.0)
+    assert led.remaining('co2') == 100.0
+    with pytest.raises(KeyError):
+        led.mark_refill('heater_13')
+    led.save()
+    again = UsageLedger(CFG, ['o2', 'co2'], path)
+    assert again.total == pytest.approx({'o2': 30.0, 'co2': 30.0})
+    assert again.refill == {'o2': pytest.approx(30.0), 'co2': 0.0}
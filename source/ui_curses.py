@@ -2,22 +2,66 @@
 
 import time, curses, logging
 
-import RPi.GPIO as GPIO
-
 
 logger = logging.getLogger("incubator.ui")
-data_logger = logging.getLogger("incubator.data")
+
+ROWS_PER_CHAMBER = 7
+
+def _labels(vmax, unit):
+    return [f"{x:.0f}{unit}" for x in (0, vmax/4, vmax/2, 3*vmax/4, vmax)]
+
+def draw_chamber(stdscr, ch, stats, base, half_w, max_x):
+    t, o, c = ch.reading
+    controllers = ch.controllers
+    o2_max   = ch.cfg['max_values']['o2']
+    co2_max  = ch.cfg['max_values']['co2']
+    temp_max = ch.cfg['max_values']['temperature']
+
+    # ─── chamber header: name + loop timing
+    header = f"{ch.name}  tick {1000*stats.last_busy:5.1f} ms  every {ch.interval:.2f}s"
+    if ch.adaptive is not None:
+        header += f"  sampling {ch.adaptive.sample_period:.1f}s ({ch.adaptive.reason})"
+    if ch.recovery is not None and ch.recovery.event is not None:
+        header += f"  DOOR RECOVERY: {ch.recovery.phase or 'settling'}"
+    stdscr.addstr(base, 1, header, curses.color_pair(4))
+
+    # ─── O₂ bar row 1
+    stdscr.addstr(base+1,1, f"O₂: {o:5.2f}%", curses.color_pair(4))
+    wo = min(int(o / o2_max * half_w), half_w)
+    stdscr.addnstr(base+1, 12, "█"*wo, half_w,
+                   controllers['o2'].color(o))
+    for i, lbl in enumerate(_labels(o2_max, "%")):
+        x = 12 + int(i*(half_w/4))
+        if x < max_x: stdscr.addstr(base+2, x, lbl, curses.color_pair(4))
+
+    # ─── CO₂ bar row 1 (right side)
+    offset = 12 + half_w + 5
+    stdscr.addstr(base+1, offset, f"CO₂: {c:5.2f}%", curses.color_pair(4))
+    wc = min(int(c / co2_max * half_w), half_w)
+    stdscr.addnstr(base+1, offset+7, "█"*wc, half_w,
+                   controllers['co2'].color(c))
+    for i, lbl in enumerate(_labels(co2_max, "%")):
+        x = offset+7 + int(i*(half_w/4))
+        if x < max_x: stdscr.addstr(base+2, x, lbl, curses.color_pair(4))
+
+    # ─── Temp bar row 4
+    stdscr.addstr(base+4,1, f"T: {t:5.2f}°C", curses.color_pair(4))
+    wt = min(int(t / temp_max * half_w), half_w)
+    stdscr.addnstr(base+4, 12, "█"*wt, half_w,
+                   controllers['heater'].color(t))
+    for i, lbl in enumerate(_labels(temp_max, "")):
+        x = 12 + int(i*(half_w/4))
+        if x < max_x: stdscr.addstr(base+5, x, lbl, curses.color_pair(4))
+
+    # ─── gas use / cylinder projection
+    if ch.usage is not None:
+        stdscr.addnstr(base+6, 1, "Use: " + ch.usage.summary(), max_x - 2, curses.color_pair(4))
 
 def curses_main(stdscr,
-                sensors,
-                controllers,
-                displays,
-                cfg):
-    o2_max = cfg['max_values']['o2']
-    co2_max = cfg['max_values']['co2']
-    temp_max = cfg['max_values']['temperature']
-    read_interval = cfg['read_interval']
-    
+                engine,
+                commands=None,
+                config_watch=None):
+
     # 1) init
     curses.curs_set(0)
     stdscr.nodelay(True)
@@ -42,123 +86,37 @@ def curses_main(stdscr,
     max_y, max_x = stdscr.getmaxyx()
     usable = max_x - 20
     half_w = max(usable // 2, 10)
-    start = time.time()
-
-    # precompute tick labels
-    o2_ticks  = [0, o2_max/4,  o2_max/2,  3*o2_max/4,  o2_max]
-    lbl_o2    = [f"{x:.0f}%" for x in o2_ticks]
-
-    co2_ticks = [0, co2_max/4, co2_max/2, 3*co2_max/4, co2_max]
-    lbl_co2   = [f"{x:.0f}%" for x in co2_ticks]
-
-    tmp_ticks = [0, temp_max/4, temp_max/2, 3*temp_max/4, temp_max]
-    lbl_tmp   = [f"{x:.0f}" for x in tmp_ticks]
 
     while True:
-        # 2) read sensors
-        now = time.time() - start
-        t   = sensors['temp'].read()
-        o   = sensors['o2'].read()
-        c   = sensors['co2'].read()
-
-        # 3) control
-        controllers['heater'].update(t, now)
-
-        o2_ctrl = controllers['o2']
-        o2_ctrl.update(o, now)
-
-        if o2_ctrl.is_continuous(o):
-            controllers['co2'].force_off()
-        else:
-            controllers['co2'].update(c, now)
-
-        # 4) draw
-        stdscr.erase()
-
-        # ─── O₂ bar row 1
-        stdscr.addstr(1,1, f"O₂: {o:5.2f}%", curses.color_pair(4))
-        wo = min(int(o / o2_max * half_w), half_w)
-        stdscr.addnstr(1, 12, "█"*wo, half_w,
-                       controllers['o2'].color(o))
-        for i, lbl in enumerate(lbl_o2):
-            x = 12 + int(i*(half_w/4))
-            if x < max_x: stdscr.addstr(2, x, lbl, curses.color_pair(4))
-
-        # ─── CO₂ bar row 1 (right side)
-        offset = 12 + half_w + 5
-        stdscr.addstr(1, offset, f"CO₂: {c:5.2f}%", curses.color_pair(4))
-        wc = min(int(c / co2_max * half_w), half_w)
-        stdscr.addnstr(1, offset+7, "█"*wc, half_w,
-                       controllers['co2'].color(c))
-        for i, lbl in enumerate(lbl_co2):
-            x = offset+7 + int(i*(half_w/4))
-            if x < max_x: stdscr.addstr(2, x, lbl, curses.color_pair(4))
-
-        # ─── Temp bar row 4
-        stdscr.addstr(4,1, f"T: {t:5.2f}°C", curses.color_pair(4))
-        wt = min(int(t / temp_max * half_w), half_w)
-        stdscr.addnstr(4, 12, "█"*wt, half_w,
-                       controllers['heater'].color(t))
-        for i, lbl in enumerate(lbl_tmp):
-            x = 12 + int(i*(half_w/4))
-            if x < max_x: stdscr.addstr(5, x, lbl, curses.color_pair(4))
-
-        # ─── 7-segment safe updates
-        for key, disp in displays.items():
-            if not disp:
-                continue
-            val = {'o2': o, 'co2': c, 'temp': t}[key]
-            try:
-                disp.safe_print(f"{val:05.2f}")
-            except Exception:
-                displays[key] = None
-
-        stdscr.addstr(max_y-2, 1, "Press 'q' to quit.", curses.color_pair(4))
-        stdscr.refresh()
-
-        # --- Log measurement data ---
-        heater_duty = controllers['heater'].pid(t)  # correct usage
-
-        def gas_state(ctrl, val):
-            if ctrl.is_continuous(val):
-                return "CONT"
-            pulse = (val > ctrl.setpt * ctrl.th_puls) if ctrl.invert else (val < ctrl.setpt * ctrl.th_puls)
-            return "PULSE" if pulse else "OFF"
-
-        o2_state  = gas_state(controllers['o2'],  o)
-        co2_state = gas_state(controllers['co2'], c)
-
-        logger.info(
-            "DATA T=%.2fC O2=%.2f%% CO2=%.2f%% HeaterDuty=%.2f O2=%s CO2=%s",
-            t, o, c, heater_duty, o2_state, co2_state
-        )
-
-        # if you want CSV too, ensure data_logger is imported from main
-        # data_logger.info(...)
-
-        # --- Structured logging for plotting ---
-        try:
-            heater_pin = cfg['gpio']['heaters'][0]
-            heater_state = "ON" if GPIO.input(heater_pin) == GPIO.HIGH else "OFF"
-        except Exception:
-            heater_state = "OFF"  # safe default if pin list empty
-
-        o2_state_txt  = "ON" if GPIO.input(cfg['gpio']['o2_pin'])  == GPIO.HIGH else "OFF"
-        co2_state_txt = "ON" if GPIO.input(cfg['gpio']['co2_pin']) == GPIO.HIGH else "OFF"
-
-        # Human-readable log line (unchanged style)
-        logger.info(
-            "DATA T=%.2fC O2=%.2f%% CO2=%.2f%% Heater=%s O2=%s CO2=%s",
-            t, o, c, heater_state, o2_state_txt, co2_state_txt
-        )
-
-        # CSV row (timestamp comes from handler’s formatter)
-        data_logger.info(
-            "%.2f,%.2f,%.2f,%s,%s,%s",
-            t, o, c, heater_state, o2_state_txt, co2_state_txt
-        )
-
-        # 5) exit or wait
+        now = engine.now()
+
+        # 2) apply queued remote commands between ticks (never blocks)
+        if commands is not None:
+            commands.apply_pending(engine.by_name, now)
+
+        # ... and any validated config.yaml edit, in place
+        if config_watch is not None:
+            new_cfg = config_watch.poll()
+            if new_cfg is not None:
+                engine.reload(new_cfg)
+
+        # 3) read + control + log every chamber that is due
+        if engine.run_pending():
+            if commands is not None:
+                commands.publish_status(engine.chambers, now)
+            # 4) draw
+            stdscr.erase()
+            for idx, ch in enumerate(engine.chambers):
+                base = idx * ROWS_PER_CHAMBER
+                if base + ROWS_PER_CHAMBER > max_y - 2:
+                    break   # terminal too small for the rest
+                if ch.reading is not None:
+                    draw_chamber(stdscr, ch, engine.stats[ch.name], base, half_w, max_x)
+
+            stdscr.addstr(max_y-2, 1, "Press 'q' to quit.", curses.color_pair(4))
+            stdscr.refresh()
+
+        # 5) exit or wait for the next due chamber
         if stdscr.getch() == ord('q'):
             break
-        time.sleep(read_interval)
+        time.sleep(min(engine.next_due(), 0.1))
@@ -0,0 +1,204 @@
+# usage.py
+#
+# Valve and heater duty accounting. Each control tick books how long every
+# valve was open and every heater channel energized, into hourly buckets
+# (wall-clock hour) plus running totals. Valve time becomes litres through the
+# configured flow rate, and the litres drawn since the last cylinder change
+# give the remaining gas and a projection of when it runs out.
+#
+# The ledger is saved to usage.json in the chamber's log directory (every
+# `save_s`, at each hour rollover and on shutdown) and reloaded at start, so
+# totals survive restarts. Mark a new cylinder with the `refill` command.
+# status() goes into the chamber's MQTT status payload (commands.py).
+
+import os, json, time, logging
+
+logger = logging.getLogger("incubator.usage")
+
+GAS_NAMES = {'o2': 'N2', 'co2': 'CO2'}   # the "o2" valve doses N₂
+
+
+def _hour_key(wall):
+    return time.strftime("%Y-%m-%dT%H", time.localtime(wall))
+
+
+class UsageLedger:
+    def __init__(self, cfg, channels, path, label=""):
+        self.label      = label
+        self.channels   = list(channels)             # e.g. ['o2', 'co2', 'heater_17']
+        self.flow_lpm   = {k: float(v) for k, v in (cfg.get('flow_lpm') or {}).items()}
+        self.cylinder   = {k: float(v) for k, v in (cfg.get('cylinder_litres') or {}).items()}
+        self.warn_hours = float(cfg.get('warn_hours', 48))
+        self.rate_hours = int(cfg.get('rate_hours', 24))
+        self.keep_hours = int(cfg.get('keep_hours', 24 * 14))
+        self.save_s     = float(cfg.get('save_s', 600))
+        self.path       = path
+
+        self.total      = {ch: 0.0 for ch in self.channels}   # seconds, all time
+        self.refill     = {}                                   # gas -> seconds since cylinder change
+        self.refill_at  = {}                                   # gas -> ISO time of the change
+        self.hours      = {}                                   # 'YYYY-MM-DDTHH' -> {channel: seconds}
+        self._load()
+
+        self._hour      = None
+        self._hour_end  = 0.0
+        self._states    = None
+        self._last      = None
+        self._next_save = 0.0
+        self._warned    = set()
+
+    # ---------- persistence ----------
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception:
+            logger.exception("%sCould not read %s; starting a new usage ledger", self.label, self.path)
+            return
+        for ch, v in data.get('total', {}).items():
+            self.total[ch] = float(v)
+        self.refill    = {k: float(v) for k, v in data.get('refill', {}).items()}
+        self.refill_at = dict(data.get('refill_at', {}))
+        self.hours     = {h: {ch: float(v) for ch, v in b.items()}
+                          for h, b in data.get('hours', {}).items()}
+        logger.info("%sUsage ledger restored (%d hourly buckets)", self.label, len(self.hours))
+
+    def save(self):
+        data = {'total': self.total, 'refill': self.refill,
+                'refill_at': self.refill_at, 'hours': self.hours}
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(tmp, self.path)    # never leave a half-written ledger
+        except Exception:
+            logger.exception("%sFailed to save usage ledger", self.label)
+
+    # ---------- accounting (every control tick) ----------
+    def tick(self, now, states):
+        """states: {channel: True if open/energized}, as just set by the
+        controllers; the previous tick's states are booked up to `now`."""
+        wall = time.time()
+        if wall >= self._hour_end:
+            self._rollover(wall)
+        if self._last is not None:
+            dt = now - self._last
+            bucket = self.hours[self._hour]
+            for ch, on in self._states.items():
+                if on:
+                    bucket[ch] = bucket.get(ch, 0.0) + dt
+                    self.total[ch] = self.total.get(ch, 0.0) + dt
+                    if ch in self.flow_lpm:
+                        self.refill[ch] = self.refill.get(ch, 0.0) + dt
+        self._last, self._states = now, states
+        if now >= self._next_save:
+            self._next_save = now + self.save_s
+            self.save()
+
+    def _rollover(self, wall):
+        finished = self._hour
+        self._hour = _hour_key(wall)
+        lt = time.localtime(wall)
+        self._hour_end = wall - lt.tm_min * 60 - lt.tm_sec - (wall % 1) + 3600
+        self.hours.setdefault(self._hour, {})
+        for h in sorted(self.hours)[:-self.keep_hours]:
+            del self.hours[h]
+        if finished is not None and finished in self.hours:
+            logger.info("%sUsage %s: %s", self.label, finished, self._hour_line(self.hours[finished]))
+            self._check_depletion()
+            self.save()
+
+    # ---------- reporting ----------
+    def litres(self, gas, seconds):
+        return seconds / 60.0 * self.flow_lpm.get(gas, 0.0)
+
+    def rate_lph(self, gas):
+        """Mean litres/hour over the last `rate_hours` buckets (incl. the current one)."""
+        keys = sorted(self.hours)[-self.rate_hours:]
+        if not keys:
+            return 0.0
+        secs = sum(self.hours[h].get(gas, 0.0) for h in keys)
+        # the current hour only counts for the part that has elapsed
+        span = len(keys) - 1 + (1.0 - max(0.0, self._hour_end - time.time()) / 3600.0)
+        return self.litres(gas, secs) / max(span, 1.0 / 60)
+
+    def remaining(self, gas):
+        if gas not in self.cylinder:
+            return None
+        return max(0.0, self.cylinder[gas] - self.litres(gas, self.refill.get(gas, 0.0)))
+
+    def hours_left(self, gas):
+        left, rate = self.remaining(gas), self.rate_lph(gas)
+        if left is None or rate <= 0:
+            return None
+        return left / rate
+
+    def _check_depletion(self):
+        for gas in self.cylinder:
+            h = self.hours_left(gas)
+            if h is not None and h < self.warn_hours:
+                if gas not in self._warned:
+                    logger.warning("%s%s cylinder low: %.0f L left, ~%.0f h at %.1f L/h",
+                                   self.label, GAS_NAMES.get(gas, gas), self.remaining(gas),
+                                   h, self.rate_lph(gas))
+                    self._warned.add(gas)
+            else:
+                self._warned.discard(gas)
+
+    def _hour_line(self, bucket):
+        parts = []
+        for ch in self.channels:
+            s = bucket.get(ch, 0.0)
+            if ch in self.flow_lpm:
+                parts.append(f"{GAS_NAMES.get(ch, ch)} {s:.1f}s {self.litres(ch, s):.2f}L")
+            else:
+                parts.append(f"{ch} {100 * s / 3600:.0f}%")
+        return ", ".join(parts)
+
+    def summary(self):
+        """One line for status outputs: rate, cylinder level and time left per gas."""
+        parts = []
+        for gas in self.flow_lpm:
+            txt = f"{GAS_NAMES.get(gas, gas)} {self.rate_lph(gas):.2f} L/h"
+            left = self.remaining(gas)
+            if left is not None:
+                txt += f" {100 * left / self.cylinder[gas]:.0f}%"
+                h = self.hours_left(gas)
+                if h is not None:
+                    txt += f" ~{h / 24:.1f}d" if h >= 48 else f" ~{h:.0f}h"
+            parts.append(txt)
+        heaters = [ch for ch in self.channels if ch not in self.flow_lpm]
+        if heaters and self._hour in self.hours:
+            elapsed = max(1.0, 3600.0 - max(0.0, self._hour_end - time.time()))
+            duty = max(self.hours[self._hour].get(ch, 0.0) for ch in heaters) / elapsed
+            parts.append(f"heat {100 * min(duty, 1.0):.0f}%")
+        return " | ".join(parts)
+
+    def status(self):
+        """Totals for the MQTT status payload (the monitor shows `summary`)."""
+        gases = {}
+        for gas in self.flow_lpm:
+            secs, left, h = self.total.get(gas, 0.0), self.remaining(gas), self.hours_left(gas)
+            gases[GAS_NAMES.get(gas, gas)] = {
+                'open_s':      round(secs, 1),
+                'litres':      round(self.litres(gas, secs), 1),
+                'rate_lph':    round(self.rate_lph(gas), 3),
+                'remaining_l': None if left is None else round(left, 1),
+                'hours_left':  None if h is None else round(h, 1),
+            }
+        heaters = {ch: round(self.total.get(ch, 0.0), 1) for ch in self.channels if ch not in self.flow_lpm}
+        return {'gas': gases, 'heater_on_s': heaters, 'summary': self.summary()}
+
+    def mark_refill(self, gas):
+        if gas not in self.flow_lpm:
+            raise KeyError(gas)
+        used = self.litres(gas, self.refill.get(gas, 0.0))
+        self.refill[gas] = 0.0
+        self.refill_at[gas] = time.strftime("%Y-%m-%dT%H:%M:%S")
+        self._warned.discard(gas)
+        logger.info("%s%s cylinder replaced (%.0f L drawn from the last one)",
+                    self.label, GAS_NAMES.get(gas, gas), used)
+        self.save()
+        return used